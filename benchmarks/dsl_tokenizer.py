@@ -0,0 +1,200 @@
+"""
+Скорость токенизации выражений фильтра: мастер-регулярное выражение
+(DSLTranslator._tokenize) против прежнего посимвольного разбора.
+
+    uv run python -m benchmarks.dsl_tokenizer --conditions 10 100 1000
+
+Выражения генерируются как у машинных фильтров: длинные цепочки &&/||
+по вложенным путям со строками, числами и скобками. Для каждого размера
+печатается лучшее время одного прохода в миллисекундах.
+"""
+
+import argparse
+import random
+import time
+from typing import Any
+
+from json_storage.services.dsl_translator import DSLTranslator
+
+
+def generate_expression(conditions: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    parts: list[str] = []
+    for i in range(conditions):
+        path = rnd.choice(
+            ['$.status', '$.user.id', '$.items[*].productId', '$.order.items[*].price']
+        )
+        op = rnd.choice(['==', '!=', '>', '>=', '<', '<='])
+        value = rnd.choice(
+            [f'"value-{i}"', str(rnd.randint(-(10**6), 10**6)), f'{rnd.random():.6f}']
+        )
+        condition = f'{path} {op} {value}'
+        if rnd.random() < 0.2:
+            condition = f'!({condition})'
+        parts.append(condition)
+        if i < conditions - 1:
+            parts.append(rnd.choice(['&&', '||']))
+    return ' '.join(parts)
+
+
+# прежняя реализация DSLTranslator._tokenize — для сравнения
+def tokenize_legacy(s: str) -> list[tuple[str, Any]]:
+    tokens: list[tuple[str, Any]] = []
+    i = 0
+    n = len(s)
+
+    def peek2(i: int) -> str:
+        return s[i : i + 2]
+
+    while i < n:
+        ch = s[i]
+        if ch.isspace():
+            i += 1
+            continue
+
+        if ch == '$':
+            start = i
+            i += 1
+            while i < n:
+                if s[i].isspace():
+                    break
+                if s[i] in ('(', ')', '!', '>', '<'):
+                    break
+                two = peek2(i)
+                if two in ('==', '!=', '>=', '<=', '&&', '||'):
+                    break
+                i += 1
+            path = s[start:i]
+            tokens.append(('PATH', path))
+            continue
+
+        two = peek2(i)
+
+        if two == '&&':
+            tokens.append(('AND', '&&'))
+            i += 2
+            continue
+        if two == '||':
+            tokens.append(('OR', '||'))
+            i += 2
+            continue
+
+        if two == '!=':
+            tokens.append(('OP', '!='))
+            i += 2
+            continue
+        if ch == '!':
+            tokens.append(('NOT', '!'))
+            i += 1
+            continue
+
+        if two == '==':
+            tokens.append(('OP', '=='))
+            i += 2
+            continue
+        if two == '>=':
+            tokens.append(('OP', '>='))
+            i += 2
+            continue
+        if two == '<=':
+            tokens.append(('OP', '<='))
+            i += 2
+            continue
+        if ch == '>':
+            tokens.append(('OP', '>'))
+            i += 1
+            continue
+        if ch == '<':
+            tokens.append(('OP', '<'))
+            i += 1
+            continue
+
+        if ch == '(':
+            tokens.append(('LPAREN', ch))
+            i += 1
+            continue
+        if ch == ')':
+            tokens.append(('RPAREN', ch))
+            i += 1
+            continue
+
+        if ch == '"':
+            j = i + 1
+            buf = []
+            while j < n and s[j] != '"':
+                buf.append(s[j])
+                j += 1
+            if j >= n or s[j] != '"':
+                raise ValueError('Unterminated string literal')
+            value = ''.join(buf)
+            tokens.append(('STRING', value))
+            i = j + 1
+            continue
+
+        if ch.isdigit() or (ch == '-' and i + 1 < n and s[i + 1].isdigit()):
+            j = i
+            has_dot = False
+            while j < n and (s[j].isdigit() or s[j] in ('.', 'e', 'E', '+', '-')):
+                if s[j] == '.':
+                    has_dot = True
+                j += 1
+            num_str = s[i:j]
+            try:
+                number = float(num_str) if has_dot else int(num_str)
+            except ValueError:
+                raise ValueError(f'Invalid number literal: {num_str!r}')
+            tokens.append(('NUMBER', number))
+            i = j
+            continue
+
+        if ch.isalpha():
+            j = i
+            while j < n and s[j].isalpha():
+                j += 1
+            word = s[i:j]
+            if word == 'true':
+                tokens.append(('BOOL', True))
+            elif word == 'false':
+                tokens.append(('BOOL', False))
+            elif word == 'null':
+                tokens.append(('NULL', None))
+            else:
+                raise ValueError(f'Unexpected identifier: {word!r}')
+            i = j
+            continue
+
+        raise ValueError(f'Unexpected character: {ch!r}')
+
+    return tokens
+
+
+def best_of(tokenize: Any, expr: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        tokenize(expr)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(conditions: list[int], repeat: int) -> None:
+    print(
+        f'{"conditions":>10} {"bytes":>9} {"legacy ms":>10} {"regex ms":>10} {"x":>6}'
+    )
+    for count in conditions:
+        expr = generate_expression(count)
+        assert DSLTranslator._tokenize(expr) == tokenize_legacy(expr)
+        legacy = best_of(tokenize_legacy, expr, repeat)
+        current = best_of(DSLTranslator._tokenize, expr, repeat)
+        print(
+            f'{count:>10} {len(expr):>9} {legacy * 1000:>10.3f}'
+            f' {current * 1000:>10.3f} {legacy / current:>6.1f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conditions', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    main(args.conditions, args.repeat)
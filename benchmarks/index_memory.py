@@ -0,0 +1,113 @@
+"""
+Пиковое потребление памяти (RSS) воркером при индексации одного большого
+документа: текущий путь (сырые байты в Elasticsearch) против прежнего
+(bytearray + json.loads + повторная сериализация клиентом).
+
+    uv run python -m benchmarks.index_memory --size 500
+    uv run python -m benchmarks.index_memory --size 500 --legacy
+
+Размер — в мегабайтах. ru_maxrss — максимум за жизнь процесса, поэтому каждый
+замер — отдельный запуск. Документ — массив мелких объектов, как типичная
+выгрузка: у такого JSON граф Python-объектов в разы больше самих байт.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import time
+
+import uuid_extensions
+
+from json_storage.container import ContainerManager, get_container
+from json_storage.repositories import ElasticSearchDBRepository, PostgresDBRepository
+from json_storage.settings import settings
+from json_storage.tasks import _index_document_to_elastic_impl
+
+MIB = 1024 * 1024
+
+
+def peak_rss_mib() -> float:
+    # на Linux ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def generate_body(size: int):
+    yield b'{"items":['
+    sent = 0
+    i = 0
+    batch: list[bytes] = []
+    while sent < size:
+        item = b'{"id":%d,"name":"item-%d","tags":["a","b"],"price":%d.5}' % (i, i, i)
+        if i:
+            item = b',' + item
+        batch.append(item)
+        sent += len(item)
+        i += 1
+        if len(batch) == 1024:
+            yield b''.join(batch)
+            batch.clear()
+    if batch:
+        yield b''.join(batch)
+    yield b']}'
+
+
+async def index_legacy(namespace: str, object_id: str) -> None:
+    async with get_container() as container:
+        postgres = await container.get(PostgresDBRepository)
+        elastic = await container.get(ElasticSearchDBRepository)
+        meta = await postgres.get_document_meta(namespace, object_id)
+        assert meta is not None
+        await elastic.ensure_index(index=namespace)
+        buf = bytearray()
+        async for chunk in postgres.iter_chunks_by_id(object_id, codec=meta.codec):
+            buf.extend(chunk)
+        await elastic.insert_document(
+            index=namespace, doc_id=object_id, document=json.loads(buf)
+        )
+
+
+async def main(size_mb: int, legacy: bool) -> None:
+    namespace = f'bench_{uuid_extensions.uuid7().hex[:8]}'
+    async with get_container() as container:
+        postgres = await container.get(PostgresDBRepository)
+        await postgres.register_namespace(namespace)
+        doc = await postgres.create_document_stream(
+            namespace=namespace,
+            document_name='bench',
+            body=generate_body(size_mb * MIB),
+        )
+
+    before = peak_rss_mib()
+    started = time.perf_counter()
+    try:
+        if legacy:
+            await index_legacy(namespace, doc.id)
+        else:
+            await _index_document_to_elastic_impl(namespace, doc.id)
+    finally:
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mib()
+        async with get_container() as container:
+            postgres = await container.get(PostgresDBRepository)
+            elastic = await container.get(ElasticSearchDBRepository)
+            await elastic.delete_document(namespace, doc.id, refresh=None)
+            await postgres.delete_object_by_id(namespace, doc.id)
+            await postgres.drop_meta_table_by_namespace(namespace)
+        await ContainerManager.close()
+
+    mode = 'legacy' if legacy else 'raw'
+    print(
+        f'{mode}: document {doc.content_length / MIB:.0f} MiB, '
+        f'peak RSS {before:.0f} -> {peak:.0f} MiB '
+        f'(+{peak - before:.0f} MiB, x{(peak - before) * MIB / doc.content_length:.2f}), '
+        f'{elapsed:.1f} s; max_document_bytes={settings.indexing.max_document_bytes}'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=500)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+    asyncio.run(main(args.size, args.legacy))
@@ -0,0 +1,87 @@
+"""
+Сравнение путей записи create_document_stream: COPY FROM STDIN (binary)
+против executemany по одной строке на часть.
+
+    uv run python -m benchmarks.ingest_copy --sizes 10 100 1024
+
+Размеры — в мегабайтах. Тело генерируется на лету частями chunk_size,
+поэтому 1 ГБ не требует гигабайта памяти у клиента.
+"""
+
+import argparse
+import asyncio
+import time
+
+import psycopg
+import uuid_extensions
+
+from json_storage.repositories import PostgresDBRepository
+from json_storage.settings import settings
+
+MIB = 1024 * 1024
+
+
+async def generate_body(size: int, chunk_size: int):
+    chunk = b'x' * chunk_size
+    yield b'{"k":"'
+    sent = 0
+    while sent < size:
+        n = min(chunk_size, size - sent)
+        yield chunk if n == chunk_size else chunk[:n]
+        sent += n
+    yield b'"}'
+
+
+async def run_once(
+    repo: PostgresDBRepository,
+    namespace: str,
+    size: int,
+    chunk_size: int,
+    use_copy: bool,
+) -> float:
+    started = time.perf_counter()
+    doc = await repo.create_document_stream(
+        namespace=namespace,
+        document_name='bench',
+        body=generate_body(size, chunk_size),
+        use_copy=use_copy,
+    )
+    elapsed = time.perf_counter() - started
+    await repo.delete_object_by_id(namespace, doc.id)
+    return elapsed
+
+
+async def main(sizes_mb: list[int], chunk_size: int, repeat: int) -> None:
+    repo = PostgresDBRepository(dsn=settings.postgres.dsn)
+    namespace = f'bench_{uuid_extensions.uuid7().hex[:8]}'
+    await repo.create_chunks_table()
+    await repo.create_meta_table_by_namespace(namespace)
+
+    try:
+        print(f'{"size":>8} {"mode":>12} {"seconds":>10} {"MiB/s":>10}')
+        for size_mb in sizes_mb:
+            size = size_mb * MIB
+            for mode, use_copy in (('executemany', False), ('copy', True)):
+                best = min(
+                    [
+                        await run_once(repo, namespace, size, chunk_size, use_copy)
+                        for _ in range(repeat)
+                    ]
+                )
+                print(
+                    f'{size_mb:>6}MB {mode:>12} {best:>10.2f} {size_mb / best:>10.1f}'
+                )
+    finally:
+        await repo.drop_meta_table_by_namespace(namespace)
+        await repo.aclose()
+        with psycopg.connect(settings.postgres.dsn, autocommit=True) as conn:
+            conn.execute('vacuum json_chunks')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1024])
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.chunk_size, args.repeat))
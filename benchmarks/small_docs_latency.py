@@ -0,0 +1,100 @@
+"""
+Задержка записи и чтения небольших документов: одна строка json_buffer
+(create_document_inline) против частей json_chunks (create_document_stream).
+
+    uv run python -m benchmarks.small_docs_latency --sizes 256 1024 4096
+
+Размеры — в байтах. Для каждого размера печатаются p50 и p99 одного
+запроса в миллисекундах отдельно для записи и для чтения тела.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import uuid_extensions
+
+from json_storage.repositories import PostgresDBRepository
+from json_storage.settings import settings
+
+
+def make_body(size: int) -> bytes:
+    return b'{"k":"' + b'x' * max(size - 8, 0) + b'"}'
+
+
+async def single_chunk(body: bytes):
+    yield body
+
+
+def percentiles(samples: list[float]) -> tuple[float, float]:
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+async def run(
+    repo: PostgresDBRepository,
+    namespace: str,
+    body: bytes,
+    inline: bool,
+    requests: int,
+) -> tuple[list[float], list[float]]:
+    writes: list[float] = []
+    reads: list[float] = []
+    ids: list[str] = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        if inline:
+            doc = await repo.create_document_inline(namespace, 'bench', body)
+        else:
+            doc = await repo.create_document_stream(
+                namespace=namespace,
+                document_name='bench',
+                body=single_chunk(body),
+            )
+        writes.append(time.perf_counter() - started)
+        ids.append(doc.id)
+
+    for doc_id in ids:
+        started = time.perf_counter()
+        meta = await repo.get_document_meta(namespace, doc_id)
+        assert meta is not None
+        b''.join([chunk async for chunk in repo.iter_body(meta)])
+        reads.append(time.perf_counter() - started)
+
+    for doc_id in ids:
+        await repo.delete_object_by_id(namespace, doc_id)
+    return writes, reads
+
+
+async def main(sizes: list[int], requests: int) -> None:
+    repo = PostgresDBRepository(dsn=settings.postgres.dsn)
+    namespace = f'bench_{uuid_extensions.uuid7().hex[:8]}'
+    await repo.register_namespace(namespace)
+
+    try:
+        print(
+            f'{"size":>8} {"mode":>8} {"write p50":>10} {"write p99":>10}'
+            f' {"read p50":>10} {"read p99":>10}'
+        )
+        for size in sizes:
+            body = make_body(size)
+            for mode, inline in (('chunks', False), ('inline', True)):
+                writes, reads = await run(repo, namespace, body, inline, requests)
+                w50, w99 = percentiles(writes)
+                r50, r99 = percentiles(reads)
+                print(
+                    f'{size:>7}B {mode:>8} {w50:>10.2f} {w99:>10.2f}'
+                    f' {r50:>10.2f} {r99:>10.2f}'
+                )
+    finally:
+        await repo.drop_meta_table_by_namespace(namespace)
+        await repo.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1024, 4096])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.requests))
@@ -1,4 +1,16 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from contextlib import (
+    AbstractAsyncContextManager,
+    AsyncExitStack,
+    asynccontextmanager,
+)
+
 from aio_pika import ExchangeType
+from dishka import AsyncContainer
+from elasticsearch import AsyncElasticsearch
+from psycopg_pool import AsyncConnectionPool
+from taskiq import TaskiqEvents, TaskiqState
 
 from .depends import provider
 from taskiq_aio_pika import AioPikaBroker
@@ -9,10 +21,62 @@ from dishka.integrations.fastapi import FastapiProvider
 from dishka.integrations.taskiq import setup_dishka as taskiq_setup_dishka
 from dishka.integrations.taskiq import TaskiqProvider
 from .container import ContainerManager
+from .services import MultiRepositoryService
+from .settings import settings
+
+
+async def open_resources(container: AsyncContainer) -> None:
+    """
+    Открывает долгоживущие ресурсы APP-скоупа (пул Postgres, клиент Elasticsearch)
+    до первого запроса или задачи. Закрываются они вместе с контейнером.
+    """
+    await container.get(AsyncConnectionPool)
+    await container.get(AsyncElasticsearch)
+
+
+@asynccontextmanager
+async def catalog_sync(container: AsyncContainer) -> AsyncIterator[None]:
+    """
+    Загружает каталог (неймспейсы) в память процесса и держит его актуальным
+    фоновой подпиской LISTEN/NOTIFY, пока открыт контекст.
+    """
+    async with container() as request_container:
+        service = await request_container.get(MultiRepositoryService)
+        await service.load_catalog()
+        watcher = asyncio.create_task(service.watch_catalog())
+        try:
+            yield
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
 
+@asynccontextmanager
+async def upload_gc(container: AsyncContainer) -> AsyncIterator[None]:
+    """Фоновая уборка брошенных сессий загрузки по частям, пока открыт контекст."""
+    async with container() as request_container:
+        service = await request_container.get(MultiRepositoryService)
+        collector = asyncio.create_task(
+            service.collect_abandoned_uploads(
+                settings.uploads.session_ttl, settings.uploads.gc_interval
+            )
+        )
+        try:
+            yield
+        finally:
+            collector.cancel()
+            await asyncio.gather(collector, return_exceptions=True)
 
-def create_fastapi_app() -> FastAPI:
-    app = FastAPI(title='json-storage', docs_url='/docs', openapi_url='/docs.json')
+
+def create_fastapi_app(
+    lifespan: Callable[[FastAPI], AbstractAsyncContextManager[None]] | None = None,
+) -> FastAPI:
+    app = FastAPI(
+        title='json-storage',
+        docs_url='/docs',
+        openapi_url='/docs.json',
+        lifespan=lifespan,
+    )
     app.include_router(router)
     application_providers = [FastapiProvider(), provider]
     container = ContainerManager.create(application_providers)
@@ -29,8 +93,21 @@ def create_taskiq_broker() -> AioPikaBroker:
         declare_exchange=True,
         declare_queues=True,
         routing_key='taskiq',
+        qos=settings.indexing.prefetch,
     )
     application_providers = [TaskiqProvider(), provider]
     container = ContainerManager.create(application_providers)
     taskiq_setup_dishka(container, broker)
+
+    async def _worker_startup(state: TaskiqState) -> None:
+        await open_resources(container)
+        state.resources = AsyncExitStack()
+        await state.resources.enter_async_context(catalog_sync(container))
+
+    async def _worker_shutdown(state: TaskiqState) -> None:
+        await state.resources.aclose()
+        await ContainerManager.close()
+
+    broker.add_event_handler(TaskiqEvents.WORKER_STARTUP, _worker_startup)
+    broker.add_event_handler(TaskiqEvents.WORKER_SHUTDOWN, _worker_shutdown)
     return broker
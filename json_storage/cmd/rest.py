@@ -1,14 +1,32 @@
-from json_storage.bootstrap import create_fastapi_app
-from json_storage.cmd.taskiq_broker import taskiq_broker
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from dishka import AsyncContainer
+from fastapi import FastAPI
 
-app = create_fastapi_app()
+from json_storage.bootstrap import (
+    catalog_sync,
+    create_fastapi_app,
+    open_resources,
+    upload_gc,
+)
+from json_storage.cmd.taskiq_broker import taskiq_broker
+from json_storage.container import ContainerManager
 
 
-@app.on_event("startup")
-async def _startup() -> None:
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    container: AsyncContainer = app.state.dishka_container
+    # пул и клиенты открываются один раз на процесс и прогреваются до первого запроса
+    await open_resources(container)
     await taskiq_broker.startup()
+    try:
+        async with catalog_sync(container), upload_gc(container):
+            yield
+    finally:
+        await taskiq_broker.shutdown()
+        # через менеджер: иначе он продолжит отдавать уже закрытый контейнер
+        await ContainerManager.close()
 
 
-@app.on_event("shutdown")
-async def _shutdown() -> None:
-    await taskiq_broker.shutdown()
+app = create_fastapi_app(lifespan=lifespan)
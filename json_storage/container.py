@@ -14,6 +14,12 @@ class ContainerManager:
             cls.container = make_async_container(*application_providers)
         return cls.container
 
+    @classmethod
+    async def close(cls) -> None:
+        if cls.container is not None:
+            await cls.container.close()
+            cls.container = None
+
 
 @asynccontextmanager
 async def get_container(
@@ -1,21 +1,122 @@
+from collections.abc import AsyncIterator
+
 from dishka import Provider, Scope, provide
+from elasticsearch import AsyncElasticsearch
+from psycopg_pool import AsyncConnectionPool
+
 from .repositories import PostgresDBRepository, ElasticSearchDBRepository
-from .services import MultiRepositoryService
+from .services import BulkIndexer, MultiRepositoryService, RefreshPolicy
 from .settings import settings
 
 
 class DataBaseProvider(Provider):
     scope = Scope.REQUEST
 
+    @provide(scope=Scope.APP)
+    @staticmethod
+    async def get_postgres_pool() -> AsyncIterator[AsyncConnectionPool]:
+        pool = AsyncConnectionPool(
+            conninfo=settings.postgres.dsn,
+            min_size=settings.postgres.pool_min_size,
+            max_size=settings.postgres.pool_max_size,
+            max_lifetime=settings.postgres.pool_max_lifetime,
+            max_idle=settings.postgres.pool_max_idle,
+            timeout=settings.postgres.pool_timeout,
+            open=False,
+        )
+        await pool.open(
+            wait=settings.postgres.pool_prewarm,
+            timeout=settings.postgres.pool_timeout,
+        )
+        try:
+            yield pool
+        finally:
+            await pool.close()
+
     @provide(scope=Scope.REQUEST)
     @staticmethod
-    def get_postgres_db() -> PostgresDBRepository:
-        return PostgresDBRepository(dsn=settings.postgres.dsn)
+    def get_postgres_db(pool: AsyncConnectionPool) -> PostgresDBRepository:
+        return _postgres_repository(pool)
+
+    @provide(scope=Scope.APP)
+    @staticmethod
+    async def get_elasticsearch_client() -> AsyncIterator[AsyncElasticsearch]:
+        client = AsyncElasticsearch(
+            settings.elastic_search.dsn,
+            connections_per_node=settings.elastic_search.connections_per_node,
+            request_timeout=settings.elastic_search.request_timeout,
+            max_retries=settings.elastic_search.max_retries,
+            retry_on_timeout=settings.elastic_search.retry_on_timeout,
+        )
+        try:
+            yield client
+        finally:
+            await client.close()
 
     @provide(scope=Scope.REQUEST)
     @staticmethod
-    def get_elasticsearch_db() -> ElasticSearchDBRepository:
-        return ElasticSearchDBRepository(url=settings.elastic_search.dsn)
+    def get_elasticsearch_db(client: AsyncElasticsearch) -> ElasticSearchDBRepository:
+        return _elasticsearch_repository(client)
+
+    @provide(scope=Scope.APP)
+    @staticmethod
+    async def get_refresh_policy(
+        client: AsyncElasticsearch,
+    ) -> AsyncIterator[RefreshPolicy]:
+        policy = RefreshPolicy(
+            elastic=_elasticsearch_repository(client),
+            default=settings.indexing.refresh,
+            namespaces=settings.indexing.refresh_namespaces,
+            period=settings.indexing.refresh_period,
+        )
+        try:
+            yield policy
+        finally:
+            await policy.aclose()
+
+    @provide(scope=Scope.APP)
+    @staticmethod
+    async def get_bulk_indexer(
+        pool: AsyncConnectionPool,
+        client: AsyncElasticsearch,
+        refresh_policy: RefreshPolicy,
+    ) -> AsyncIterator[BulkIndexer]:
+        indexer = BulkIndexer(
+            postgres=_postgres_repository(pool),
+            elastic=_elasticsearch_repository(client),
+            batch_size=settings.indexing.batch_size,
+            batch_window=settings.indexing.batch_window,
+            batch_bytes=settings.indexing.batch_bytes,
+            max_document_bytes=settings.indexing.max_document_bytes,
+            refresh_policy=refresh_policy,
+        )
+        try:
+            yield indexer
+        finally:
+            await indexer.aclose()
+
+
+def _postgres_repository(pool: AsyncConnectionPool) -> PostgresDBRepository:
+    return PostgresDBRepository(
+        dsn=settings.postgres.dsn,
+        pool=pool,
+        part_size=settings.postgres.part_size,
+        ingest_queue_depth=settings.postgres.ingest_queue_depth,
+        compression=settings.postgres.compression,
+        compression_namespaces=settings.postgres.compression_namespaces,
+        compression_level=settings.postgres.compression_level,
+        body_storage=settings.postgres.body_storage,
+        body_storage_namespaces=settings.postgres.body_storage_namespaces,
+        inline_threshold=settings.postgres.inline_threshold,
+    )
+
+
+def _elasticsearch_repository(client: AsyncElasticsearch) -> ElasticSearchDBRepository:
+    return ElasticSearchDBRepository(
+        url=settings.elastic_search.dsn,
+        client=client,
+        pit_keep_alive=settings.elastic_search.pit_keep_alive,
+    )
 
 
 provider = DataBaseProvider()
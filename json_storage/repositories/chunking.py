@@ -0,0 +1,153 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from typing import TypeVar
+
+try:
+    from compression import zstd
+except ImportError:  # интерпретатор собран без libzstd
+    zstd = None  # type: ignore[assignment]
+
+T = TypeVar('T')
+
+IDENTITY = 'identity'
+ZSTD = 'zstd'
+CODECS = (IDENTITY, ZSTD)
+
+PartEncoder = Callable[[memoryview], bytes]
+PartDecoder = Callable[[bytes], bytes]
+
+
+class _End:
+    """Маркер конца очереди prefetch; exc — ошибка производителя, если была."""
+
+    __slots__ = ('exc',)
+
+    def __init__(self, exc: BaseException | None = None) -> None:
+        self.exc = exc
+
+
+async def coalesce_parts(
+    body: AsyncIterator[bytes],
+    part_size: int,
+    *,
+    buffers: int = 1,
+) -> AsyncGenerator[memoryview, None]:
+    """
+    Перенарезает произвольный поток байт на части ровно по part_size
+    (последняя может быть короче).
+
+    Куски накапливаются в переиспользуемых буферах без bytes(chunk) на каждый
+    кусок; если кусок сам покрывает целую часть, она отдаётся срезом без копирования.
+    Буферы используются по кругу: отданный memoryview действителен, пока
+    не будут отданы ещё buffers частей. При buffers=1 потребитель должен записать
+    или скопировать часть до следующей итерации.
+    """
+    if part_size <= 0:
+        raise ValueError('part_size must be positive')
+    if buffers <= 0:
+        raise ValueError('buffers must be positive')
+
+    ring = [memoryview(bytearray(part_size)) for _ in range(buffers)]
+    current = 0
+    view = ring[current]
+    filled = 0
+
+    async for chunk in body:
+        if not chunk:
+            continue
+        data = memoryview(chunk)
+
+        while data:
+            if filled == 0 and len(data) >= part_size:
+                yield data[:part_size]
+                data = data[part_size:]
+                continue
+
+            n = min(part_size - filled, len(data))
+            view[filled : filled + n] = data[:n]
+            filled += n
+            data = data[n:]
+
+            if filled == part_size:
+                yield view
+                filled = 0
+                current = (current + 1) % buffers
+                view = ring[current]
+
+    if filled:
+        yield view[:filled]
+
+
+async def prefetch(source: AsyncIterator[T], depth: int) -> AsyncGenerator[T, None]:
+    """
+    Читает source в отдельной задаче на depth элементов вперёд через ограниченную
+    очередь: пока потребитель занят (пишет в БД), производитель уже принимает
+    следующие данные, а при заполненной очереди ждёт (backpressure).
+
+    Ошибка производителя пробрасывается потребителю; закрытие генератора
+    отменяет производителя. depth=0 отключает опережающее чтение.
+    """
+    if depth <= 0:
+        async for item in source:
+            yield item
+        return
+
+    queue: asyncio.Queue[T | _End] = asyncio.Queue(maxsize=depth)
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as exc:
+            await queue.put(_End(exc))
+        else:
+            await queue.put(_End())
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            entry = await queue.get()
+            if isinstance(entry, _End):
+                if entry.exc is not None:
+                    raise entry.exc
+                return
+            yield entry
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def _require_zstd() -> None:
+    if zstd is None:
+        raise RuntimeError('zstd codec requires Python built with compression.zstd')
+
+
+def part_encoder(codec: str, level: int = 3) -> PartEncoder | None:
+    """
+    Возвращает функцию сжатия одной части или None для identity.
+
+    Компрессор один на документ (контекст переиспользуется), но каждая часть
+    закрывается отдельным кадром zstd — части остаются независимыми и могут
+    распаковываться по одной, без чтения документа с начала.
+    """
+    if codec == IDENTITY:
+        return None
+    if codec == ZSTD:
+        _require_zstd()
+        compressor = zstd.ZstdCompressor(level=level)
+
+        def encode(part: memoryview) -> bytes:
+            return compressor.compress(part, mode=zstd.ZstdCompressor.FLUSH_FRAME)
+
+        return encode
+    raise ValueError(f'Unsupported codec: {codec!r}')
+
+
+def part_decoder(codec: str) -> PartDecoder | None:
+    """Функция распаковки одной части или None для identity."""
+    if codec == IDENTITY:
+        return None
+    if codec == ZSTD:
+        _require_zstd()
+        return zstd.decompress
+    raise ValueError(f'Unsupported codec: {codec!r}')
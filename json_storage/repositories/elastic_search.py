@@ -3,6 +3,7 @@ from __future__ import annotations
 import uuid
 from dataclasses import dataclass, field
 from typing import Any, Optional
+from urllib.parse import quote
 
 from elasticsearch import AsyncElasticsearch, NotFoundError
 
@@ -10,18 +11,30 @@ from elasticsearch import AsyncElasticsearch, NotFoundError
 JSONType = dict[str, Any]
 MappingsType = dict[str, Any]
 
+# ключ _meta маппинга, где лежит refresh_interval индекса на время массовой загрузки
+REFRESH_INTERVAL_META = 'json_storage_refresh_interval'
+
 
 @dataclass
 class ElasticSearchDBRepository:
     url: str
+    # общий клиент процесса (см. depends.py); если не передан — репозиторий
+    # лениво создаёт собственный клиент и сам отвечает за его закрытие
+    client: AsyncElasticsearch | None = None
+    # сколько живёт point-in-time постраничного поиска между запросами страниц
+    pit_keep_alive: str = '1m'
     _client: AsyncElasticsearch | None = field(init=False, default=None)
 
     async def _get_client(self) -> AsyncElasticsearch:
+        if self.client is not None:
+            return self.client
+
         if self._client is None:
             self._client = AsyncElasticsearch(self.url)
         return self._client
 
     async def aclose(self) -> None:
+        # общий клиент закрывается контейнером при остановке процесса
         if self._client is not None:
             await self._client.close()
             self._client = None
@@ -171,17 +184,33 @@ class ElasticSearchDBRepository:
         self,
         index: str,
         doc_id: str,
-        document: JSONType,
+        document: JSONType | bytes,
         refresh: str | None = 'wait_for',
     ) -> bool:
         client = await self._get_client()
-        resp = await client.index(
-            index=index,
-            id=doc_id,
-            document=document,
-            refresh=refresh,
-        )
-        return resp.get('result') in ('created', 'updated')
+        if isinstance(document, bytes):
+            # готовый JSON уходит в Elasticsearch без повторной сериализации;
+            # client.index принимает только Mapping, поэтому запрос собирается сам
+            resp = await client.perform_request(
+                'PUT',
+                f'/{quote(index, safe="")}/_doc/{quote(doc_id, safe="")}',
+                params={} if refresh is None else {'refresh': refresh},
+                headers={
+                    'accept': 'application/json',
+                    'content-type': 'application/json',
+                },
+                body=document,
+                endpoint_id='index',
+                path_parts={'index': index, 'id': doc_id},
+            )
+        else:
+            resp = await client.index(
+                index=index,
+                id=doc_id,
+                document=document,
+                refresh=refresh,
+            )
+        return resp.body.get('result') in ('created', 'updated')
 
     async def get_document(
         self,
@@ -195,6 +224,21 @@ class ElasticSearchDBRepository:
             return None
         return resp.get('_source')
 
+    async def mget(
+        self,
+        index: str,
+        doc_ids: list[str],
+    ) -> dict[str, JSONType]:
+        """Несколько документов одним _mget; ненайденных в результате нет."""
+        if not doc_ids:
+            return {}
+        client = await self._get_client()
+        try:
+            resp = await client.mget(index=index, ids=doc_ids)
+        except NotFoundError:
+            return {}
+        return {doc['_id']: doc['_source'] for doc in resp['docs'] if doc.get('found')}
+
     async def delete_document(
         self,
         index: str,
@@ -212,9 +256,130 @@ class ElasticSearchDBRepository:
             return False
         return resp.get('result') == 'deleted'
 
+    async def refresh(self, index: str | list[str]) -> None:
+        client = await self._get_client()
+        await client.indices.refresh(index=index, ignore_unavailable=True)
+
+    async def suspend_refresh(self, index: str) -> None:
+        """
+        Отключает периодический refresh индекса (refresh_interval=-1) на время
+        массовой загрузки. Документы не видны в поиске до resume_refresh.
+        Прежнее значение сохраняется в _meta маппинга индекса, так что вернуть
+        его может любой процесс; повторный вызов сохранённое не затирает.
+        """
+        client = await self._get_client()
+        resp = await client.indices.get_settings(
+            index=index, name='index.refresh_interval'
+        )
+        interval = None
+        for index_settings in resp.body.values():
+            interval = (
+                index_settings['settings'].get('index', {}).get('refresh_interval')
+            )
+        if interval != '-1':
+            meta = await self._mapping_meta(index)
+            meta[REFRESH_INTERVAL_META] = interval
+            await client.indices.put_mapping(index=index, meta=meta)
+        await client.indices.put_settings(
+            index=index, settings={'index': {'refresh_interval': '-1'}}
+        )
+
+    async def resume_refresh(self, index: str) -> None:
+        """
+        Возвращает refresh_interval, сохранённый suspend_refresh (None — значение
+        Elasticsearch по умолчанию), и сразу делает refresh, чтобы загруженное
+        стало видно.
+        """
+        client = await self._get_client()
+        meta = await self._mapping_meta(index)
+        interval = meta.pop(REFRESH_INTERVAL_META, None)
+        await client.indices.put_settings(
+            index=index, settings={'index': {'refresh_interval': interval}}
+        )
+        await client.indices.put_mapping(index=index, meta=meta)
+        await client.indices.refresh(index=index)
+
+    async def _mapping_meta(self, index: str) -> JSONType:
+        client = await self._get_client()
+        resp = await client.indices.get_mapping(index=index)
+        meta: JSONType = {}
+        for index_mapping in resp.body.values():
+            meta = dict(index_mapping['mappings'].get('_meta', {}))
+        return meta
+
+    async def bulk(
+        self,
+        operations: list[Any],
+        refresh: str | None = None,
+    ) -> list[JSONType]:
+        """
+        Один запрос _bulk. Возвращает результаты операций в порядке
+        их следования: {'_id', 'status', 'error'?} для каждой.
+        Ошибки отдельных операций не поднимаются — их разбирает вызывающий.
+        Документы можно передавать готовыми строками NDJSON (bytes без переводов строк).
+        """
+        client = await self._get_client()
+        resp = await client.bulk(operations=operations, refresh=refresh)
+        return [next(iter(item.values())) for item in resp['items']]
+
     async def search_in_index(
         self, index: str, body: dict, size: int = 10, from_: int = 0
     ) -> list[Any]:
         client = await self._get_client()
         resp = await client.search(index=index, body=body, size=size, from_=from_)
         return [hit['_source'] for hit in resp.body['hits']['hits']]
+
+    async def search_ids(
+        self, index: str, body: dict, size: int = 10, from_: int = 0
+    ) -> list[str]:
+        """Поиск без _source: только id найденных документов в порядке выдачи."""
+        client = await self._get_client()
+        resp = await client.search(
+            index=index, body=body, size=size, from_=from_, source=False
+        )
+        return [hit['_id'] for hit in resp.body['hits']['hits']]
+
+    async def open_point_in_time(self, index: str) -> str:
+        client = await self._get_client()
+        resp = await client.open_point_in_time(
+            index=index, keep_alive=self.pit_keep_alive
+        )
+        return resp['id']
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        client = await self._get_client()
+        try:
+            await client.close_point_in_time(id=pit_id)
+        except NotFoundError:
+            pass
+
+    async def search_after(
+        self,
+        pit_id: str,
+        body: dict,
+        sort: list[Any],
+        size: int,
+        after: list[Any] | None = None,
+        source: bool = True,
+    ) -> tuple[list[JSONType], str] | None:
+        """
+        Страница поиска в point-in-time после ключей сортировки after:
+        hits (_id, sort и _source при source) и id PIT для следующей
+        страницы. None — PIT истёк или закрыт.
+        """
+        client = await self._get_client()
+        request = {
+            **body,
+            'pit': {'id': pit_id, 'keep_alive': self.pit_keep_alive},
+            'sort': sort,
+            'size': size,
+            '_source': source,
+            'track_total_hits': False,
+        }
+        if after is not None:
+            request['search_after'] = after
+        try:
+            resp = await client.search(body=request)
+        except NotFoundError:
+            return None
+        return resp.body['hits']['hits'], resp.body.get('pit_id', pit_id)
@@ -1,29 +1,115 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
-from collections.abc import AsyncGenerator, AsyncIterator
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Collection,
+    Mapping,
+    Sequence,
+)
+from contextlib import aclosing, asynccontextmanager
 from dataclasses import dataclass, field
 from typing import Any, Optional
 
 import json
 import uuid
 import uuid_extensions
-from psycopg import sql
+from psycopg import AsyncConnection, AsyncCursor, Notify, sql
+from psycopg.errors import UndefinedColumn, UndefinedTable
 
 from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
 from psycopg_pool import AsyncConnectionPool
 
-from json_storage.schemas import DocumentSchema, DocumentListSchema
+from json_storage.schemas import (
+    DocumentSchema,
+    DocumentListSchema,
+    UploadPartSchema,
+    UploadSessionSchema,
+)
+
+from .chunking import (
+    IDENTITY,
+    ZSTD,
+    PartEncoder,
+    coalesce_parts,
+    part_decoder,
+    part_encoder,
+    prefetch,
+)
+
+
+# каналы NOTIFY о новых неймспейсах и изменённых схемах поиска, payload — имя неймспейса
+NAMESPACES_CHANNEL = 'json_storage_namespaces'
+SEARCH_SCHEMAS_CHANNEL = 'json_storage_search_schemas'
+BULK_LOAD_CHANNEL = 'json_storage_bulk_load'
+
+# частей json_chunks за один FETCH при потоковом чтении тела
+CHUNK_FETCH_ROWS = 4
+
+# части загрузки по сессии: часть загрузки N занимает строки json_chunks
+# с part от N * UPLOAD_PART_STRIDE, так что части пишутся независимо и в любом порядке
+UPLOAD_PART_STRIDE = 65536
+UPLOAD_MAX_PARTS = 10000
+
+# колонки метаданных, добавленные после первых версий, и их определения:
+# таблицы, созданные раньше, догоняются при старте (create_catalog_tables)
+META_COLUMNS = {
+    'part_size': 'integer',
+    'codec': "text not null default 'identity'",
+    'storage': "text not null default 'elastic'",
+    'inline': 'boolean not null default false',
+}
+
+# место хранения тела документа (колонка storage метаданных)
+STORAGE_ELASTIC = 'elastic'
+STORAGE_POSTGRES = 'postgres'
+
+
+async def _limit_parts(
+    parts: AsyncIterator[memoryview],
+    limit: int,
+) -> AsyncGenerator[memoryview, None]:
+    count = 0
+    async for part in parts:
+        count += 1
+        if count > limit:
+            raise ValueError('Upload part is too large')
+        yield part
 
 
 @dataclass
 class PostgresDBRepository:
     # TODO: хочу кастомный контекстный менеджер вместо вложенных with connection, with pool и тд
     dsn: str
+    # общий пул приложения (см. depends.py); если не передан — репозиторий
+    # лениво открывает собственный пул и сам отвечает за его закрытие
+    pool: AsyncConnectionPool | None = None
+    # размер одной строки json_chunks; поток запроса перенарезается на части этого размера
+    part_size: int = 1024 * 1024
+    # сколько готовых частей может ждать записи, пока принимаются следующие
+    ingest_queue_depth: int = 4
+    # кодек частей json_chunks по умолчанию, переопределения по неймспейсам и уровень zstd
+    compression: str = IDENTITY
+    compression_namespaces: Mapping[str, str] = field(default_factory=dict)
+    compression_level: int = 3
+    # где хранится каноническое тело новых документов: elastic — в _source,
+    # части удаляются после индексации; postgres — части остаются, в индекс
+    # уходит только проекция на схему поиска
+    body_storage: str = STORAGE_ELASTIC
+    body_storage_namespaces: Mapping[str, str] = field(default_factory=dict)
+    # байты; тело не больше порога хранится одной строкой json_buffer
+    # (см. create_document_inline), 0 — всегда частями
+    inline_threshold: int = 0
 
     _pool: AsyncConnectionPool | None = field(init=False, default=None)
 
     async def _get_pool(self) -> AsyncConnectionPool:
+        if self.pool is not None:
+            return self.pool
+
         if self._pool is None:
             self._pool = AsyncConnectionPool(conninfo=self.dsn)
 
@@ -31,6 +117,7 @@ class PostgresDBRepository:
 
     # TODO: без этой штуки не умирает коннекшен в тестах, скорее всего и в реальной работе тоже умирать не будет
     async def aclose(self) -> None:
+        # общий пул закрывается контейнером при остановке приложения
         if self._pool is not None:
             await self._pool.close()
             self._pool = None
@@ -39,38 +126,463 @@ class PostgresDBRepository:
         pool = await self._get_pool()
         async with pool.connection() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
-                    """
-                    create table if not exists json_buffer (
-                        id uuid primary key,
-                        content bytea not null
-                    );
-                    """
-                )
+                await self._create_buffer_table(cur)
             await conn.commit()
 
+    @staticmethod
+    async def _create_buffer_table(cur: AsyncCursor) -> None:
+        await cur.execute(
+            """
+            create table if not exists json_buffer (
+                id uuid primary key,
+                content bytea not null
+            );
+            """
+        )
+
     async def create_chunks_table(self) -> None:
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await self._create_chunks_table(cur)
+            await conn.commit()
+
+    async def _create_chunks_table(self, cur: AsyncCursor) -> None:
+        await cur.execute(
+            """
+            create table if not exists json_chunks (
+                id uuid not null,
+                part integer not null,
+                data bytea not null,
+                byte_offset bigint,
+                primary key (id, part)
+            );
+            """
+        )
+        # части, сжатые zstd, pglz повторно не сожмёт, только потратит время:
+        # при включённом zstd храним out-of-line без сжатия TOAST (external),
+        # иначе — обычное extended, и pglz по-прежнему сжимает identity-части.
+        # Таблица общая, так что zstd хотя бы в одном неймспейсе отключает pglz
+        # и для identity-неймспейсов. Новый режим действует на новые строки;
+        # alter берёт эксклюзивную блокировку, поэтому только если режим другой
+        wanted = 'e' if self.uses_zstd() else 'x'
+        await cur.execute(
+            """
+            select attstorage
+            from pg_attribute
+            where attrelid = 'json_chunks'::regclass
+              and attname = 'data'
+            """
+        )
+        (storage,) = await cur.fetchone()
+        if storage != wanted:
+            mode = 'external' if wanted == 'e' else 'extended'
+            await cur.execute(
+                f'alter table json_chunks alter column data set storage {mode}'
+            )
+
+    @staticmethod
+    async def _migrate_chunks_table(cur: AsyncCursor) -> None:
+        # смещение части в исходном теле: Range-чтение находит первую нужную
+        # часть поиском по индексу. У частей, записанных раньше, его нет.
+        # alter и create index блокируют запись в json_chunks, поэтому
+        # только если колонки или индекса ещё нет
+        await cur.execute(
+            """
+            select
+                exists (
+                    select 1
+                    from information_schema.columns
+                    where table_schema = current_schema()
+                      and table_name = 'json_chunks'
+                      and column_name = 'byte_offset'
+                ),
+                to_regclass('json_chunks_offset_idx') is not null
+            """
+        )
+        has_column, has_index = await cur.fetchone()
+        if not has_column:
+            await cur.execute('alter table json_chunks add column byte_offset bigint')
+        if not has_index:
+            await cur.execute(
+                """
+                create index if not exists json_chunks_offset_idx
+                    on json_chunks (id, byte_offset)
+                """
+            )
+
+    async def create_catalog_tables(self) -> None:
+        """
+        Каталог неймспейсов и схем поиска, общий для всех процессов,
+        и таблицы тел (json_chunks и однострочная json_buffer), которые читают
+        и удаляют все неймспейсы.
+        Выполняется при старте процесса: дописывает в каталог неймспейсы,
+        созданные до его появления, и догоняет их таблицы до текущей схемы.
+        """
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await self._create_catalog_tables(cur)
+                await self._create_buffer_table(cur)
+                await self._create_chunks_table(cur)
+                await self._migrate_chunks_table(cur)
+                await self._seed_namespaces(cur)
+                await self._migrate_meta_tables(cur)
+            await conn.commit()
+
+    @staticmethod
+    async def _create_catalog_tables(cur: AsyncCursor) -> None:
+        await cur.execute(
+            """
+            create table if not exists json_namespaces (
+                name text primary key,
+                created_at timestamptz not null default now()
+            );
+            alter table json_namespaces
+                add column if not exists bulk_load boolean not null default false;
+            create table if not exists json_search_schemas (
+                namespace text primary key,
+                schema jsonb not null,
+                version bigint not null default 1,
+                updated_at timestamptz not null default now()
+            );
+            """
+        )
+
+    @staticmethod
+    async def _seed_namespaces(cur: AsyncCursor) -> None:
+        # неймспейсы, созданные до каталога, есть только как таблицы <ns>_metadata
+        await cur.execute(
+            """
+            insert into json_namespaces (name)
+            select left(t.table_name, -length('_metadata'))
+            from information_schema.tables t
+            where t.table_schema = current_schema()
+              and t.table_type = 'BASE TABLE'
+              and t.table_name like %s
+              and exists (
+                  select 1
+                  from information_schema.columns c
+                  where c.table_schema = t.table_schema
+                    and c.table_name = t.table_name
+                    and c.column_name = 'content_hash'
+              )
+            on conflict (name) do nothing
+            returning name
+            """,
+            (r'%\_metadata',),
+        )
+        for (namespace,) in await cur.fetchall():
+            await cur.execute(
+                'select pg_notify(%s, %s)', (NAMESPACES_CHANNEL, namespace)
+            )
+
+    @staticmethod
+    async def _migrate_meta_tables(cur: AsyncCursor) -> None:
+        """
+        Догоняет таблицы метаданных всех неймспейсов каталога до текущей схемы.
+        Колонки читаются одним запросом, alter (эксклюзивная блокировка)
+        выполняется только там, где чего-то не хватает.
+        """
+        await cur.execute(
+            """
+            select c.table_name, c.column_name, c.data_type
+            from json_namespaces n
+            join information_schema.columns c
+              on c.table_schema = current_schema()
+             and c.table_name = n.name || '_metadata'
+            """
+        )
+        columns: dict[str, dict[str, str]] = {}
+        for table, column, data_type in await cur.fetchall():
+            columns.setdefault(table, {})[column] = data_type
+
+        for table, existing in columns.items():
+            missing = [name for name in META_COLUMNS if name not in existing]
+            if missing:
+                await cur.execute(
+                    sql.SQL('alter table {} ').format(sql.Identifier(table))
+                    + sql.SQL(', ').join(
+                        sql.SQL('add column if not exists {} ').format(
+                            sql.Identifier(name)
+                        )
+                        + sql.SQL(META_COLUMNS[name])
+                        for name in missing
+                    )
+                )
+            if 'inline' in missing:
+                # однострочные документы, записанные до колонки: тело у них
+                # в json_buffer. У старых документов из частей part_size тоже
+                # пуст, но строки в json_buffer нет
+                await cur.execute(
+                    sql.SQL(
+                        """
+                        update {} m
+                        set inline = true
+                        from json_buffer b
+                        where b.id = m.id
+                          and m.part_size is null
+                        """
+                    ).format(sql.Identifier(table))
+                )
+            # документы из частей бывают больше 2 ГиБ; alter переписывает
+            # таблицу, поэтому только если колонка ещё integer
+            if existing.get('content_length') == 'integer':
+                await cur.execute(
+                    sql.SQL(
+                        'alter table {} alter column content_length type bigint'
+                    ).format(sql.Identifier(table))
+                )
+
+    @staticmethod
+    async def _create_upload_tables(cur: AsyncCursor) -> None:
+        await cur.execute(
+            """
+            create table if not exists json_upload_sessions (
+                id uuid primary key,
+                namespace text not null,
+                document_name text not null,
+                part_size integer not null,
+                codec text not null,
+                storage text not null,
+                created_at timestamptz not null default now()
+            );
+            create table if not exists json_upload_parts (
+                session_id uuid not null
+                    references json_upload_sessions (id) on delete cascade,
+                part_number integer not null,
+                content_length bigint not null default 0,
+                content_hash text not null default '',
+                uploaded_at timestamptz not null default now(),
+                primary key (session_id, part_number)
+            );
+            """
+        )
+
+    async def list_namespaces(self) -> list[str]:
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute('select name from json_namespaces order by name')
+                except UndefinedTable:
+                    # каталог ещё не создан — значит, и неймспейсов нет
+                    await conn.rollback()
+                    return []
+                rows = await cur.fetchall()
+        return [name for (name,) in rows]
+
+    async def namespace_exists(self, namespace: str) -> bool:
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        'select 1 from json_namespaces where name = %s', (namespace,)
+                    )
+                except UndefinedTable:
+                    await conn.rollback()
+                    return False
+                row = await cur.fetchone()
+        return row is not None
+
+    async def register_namespace(self, namespace: str) -> None:
+        """
+        Создаёт таблицы неймспейса и записывает его в каталог одной транзакцией.
+        О новом неймспейсе остальные процессы узнают через NOTIFY (см. listen),
+        уведомление уходит только после коммита.
+        """
+        table = namespace + '_metadata'
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    await self._create_chunks_table(cur)
+                    await self._create_catalog_tables(cur)
+                    await self._create_upload_tables(cur)
+                    await self._create_buffer_table(cur)
+                    await self._create_meta_table(cur, table)
+                    await cur.execute(
+                        """
+                        insert into json_namespaces (name)
+                        values (%s)
+                        on conflict (name) do nothing
+                        """,
+                        (namespace,),
+                    )
+                    if cur.rowcount > 0:
+                        await cur.execute(
+                            'select pg_notify(%s, %s)',
+                            (NAMESPACES_CHANNEL, namespace),
+                        )
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def set_bulk_load(self, namespace: str, enabled: bool) -> bool:
+        """
+        Включает/выключает режим массовой загрузки неймспейса в каталоге.
+        Возвращает False, если неймспейса нет. Процессы узнают об этом через NOTIFY.
+        """
         pool = await self._get_pool()
         async with pool.connection() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     """
-                    create table if not exists json_chunks (
-                        id uuid not null,
-                        part integer not null,
-                        data bytea not null,
-                        primary key (id, part)
-                    );
-                    """
+                    update json_namespaces
+                    set bulk_load = %s
+                    where name = %s
+                    """,
+                    (enabled, namespace),
                 )
+                updated = cur.rowcount > 0
+                if updated:
+                    await cur.execute(
+                        'select pg_notify(%s, %s)', (BULK_LOAD_CHANNEL, namespace)
+                    )
             await conn.commit()
+        return updated
 
-    async def iter_chunks_by_id(self, doc_id: str) -> AsyncGenerator[bytes, None]:
+    async def list_bulk_load_namespaces(self) -> list[str]:
         pool = await self._get_pool()
-        uid = uuid.UUID(doc_id)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        'select name from json_namespaces where bulk_load order by name'
+                    )
+                except (UndefinedColumn, UndefinedTable):
+                    await conn.rollback()
+                    return []
+                rows = await cur.fetchall()
+        return [name for (name,) in rows]
 
+    async def save_search_schema(
+        self,
+        namespace: str,
+        search_schema: dict[str, Any],
+    ) -> int:
+        """
+        Сохраняет схему поиска неймспейса и возвращает её новую версию.
+        Остальные процессы получают NOTIFY после коммита.
+        """
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    await self._create_catalog_tables(cur)
+                    await cur.execute(
+                        """
+                        insert into json_search_schemas (namespace, schema)
+                        values (%s, %s)
+                        on conflict (namespace) do update
+                            set schema = excluded.schema,
+                                version = json_search_schemas.version + 1,
+                                updated_at = now()
+                        returning version
+                        """,
+                        (namespace, Jsonb(search_schema)),
+                    )
+                    (version,) = await cur.fetchone()
+                    await cur.execute(
+                        'select pg_notify(%s, %s)',
+                        (SEARCH_SCHEMAS_CHANNEL, namespace),
+                    )
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+        return version
+
+    async def get_search_schema(
+        self,
+        namespace: str,
+    ) -> tuple[dict[str, Any], int] | None:
+        """Схема поиска неймспейса и её версия или None, если схема не задана."""
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        """
+                        select schema, version
+                        from json_search_schemas
+                        where namespace = %s
+                        """,
+                        (namespace,),
+                    )
+                except UndefinedTable:
+                    await conn.rollback()
+                    return None
+                row = await cur.fetchone()
+
+        if row is None:
+            return None
+        schema, version = row
+        return schema, version
+
+    async def list_search_schemas(self) -> dict[str, tuple[dict[str, Any], int]]:
+        pool = await self._get_pool()
         async with pool.connection() as conn:
             async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        'select namespace, schema, version from json_search_schemas'
+                    )
+                except UndefinedTable:
+                    await conn.rollback()
+                    return {}
+                rows = await cur.fetchall()
+
+        return {namespace: (schema, version) for namespace, schema, version in rows}
+
+    @asynccontextmanager
+    async def listen(self, *channels: str) -> AsyncIterator[AsyncIterator[Notify]]:
+        """
+        Подписывается на каналы NOTIFY на отдельном соединении (не из пула:
+        оно занято всё время подписки) и отдаёт поток уведомлений.
+        Всё, что пришло до входа в контекст, теряется — после подписки
+        состояние нужно перечитать.
+        """
+        conn = await AsyncConnection.connect(self.dsn, autocommit=True)
+        try:
+            for channel in channels:
+                await conn.execute(sql.SQL('listen {}').format(sql.Identifier(channel)))
+            yield conn.notifies()
+        finally:
+            await conn.close()
+
+    def codec_for(self, namespace: str) -> str:
+        return self.compression_namespaces.get(namespace, self.compression)
+
+    def uses_zstd(self) -> bool:
+        """Сжимает ли zstd части хотя бы одного неймспейса."""
+        return ZSTD in (self.compression, *self.compression_namespaces.values())
+
+    def storage_for(self, namespace: str) -> str:
+        return self.body_storage_namespaces.get(namespace, self.body_storage)
+
+    async def iter_chunks_by_id(
+        self,
+        doc_id: str,
+        *,
+        codec: str = IDENTITY,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Отдаёт тело документа по частям в исходном виде.
+        codec — кодек из метаданных документа, части распаковываются на лету.
+        """
+        pool = await self._get_pool()
+        uid = uuid.UUID(doc_id)
+        decode = part_decoder(codec)
+
+        # серверный курсор: клиентский получил бы весь результат (всё тело
+        # документа) в память libpq ещё до первой итерации
+        async with pool.connection() as conn, conn.transaction():
+            async with conn.cursor(name='json_chunks_by_id', binary=True) as cur:
+                cur.itersize = CHUNK_FETCH_ROWS
                 await cur.execute(
                     """
                     select data
@@ -82,7 +594,117 @@ class PostgresDBRepository:
                 )
                 async for row in cur:
                     (data,) = row
-                    yield bytes(data)
+                    if decode is None:
+                        yield bytes(data)
+                    else:
+                        yield await asyncio.to_thread(decode, data)
+
+    async def iter_chunks_by_ids(
+        self,
+        codecs: Mapping[str, str],
+    ) -> AsyncGenerator[tuple[str, bytes], None]:
+        """
+        Части нескольких документов одним запросом: пары (id, часть)
+        в порядке id, part. codecs — кодек каждого документа по его id.
+        """
+        if not codecs:
+            return
+        pool = await self._get_pool()
+        decoders = {doc_id: part_decoder(codec) for doc_id, codec in codecs.items()}
+        uids = [uuid.UUID(doc_id) for doc_id in codecs]
+
+        async with pool.connection() as conn, conn.transaction():
+            async with conn.cursor(name='json_chunks_by_ids', binary=True) as cur:
+                cur.itersize = CHUNK_FETCH_ROWS
+                await cur.execute(
+                    """
+                    select id, data
+                    from json_chunks
+                    where id = any(%s)
+                    order by id, part
+                    """,
+                    (uids,),
+                )
+                async for row in cur:
+                    uid, data = row
+                    doc_id = str(uid)
+                    decode = decoders[doc_id]
+                    if decode is None:
+                        yield doc_id, bytes(data)
+                    else:
+                        yield doc_id, await asyncio.to_thread(decode, data)
+
+    async def iter_chunk_range(
+        self,
+        doc_id: str,
+        start: int,
+        end: int,
+        *,
+        codec: str = IDENTITY,
+        part_size: int | None = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Байты тела с start по end включительно. Первая нужная часть ищется
+        по индексу смещений, дальше части читаются по порядку, пока не
+        покроют диапазон; распаковываются только они.
+
+        part_size из метаданных нужен для частей без byte_offset,
+        записанных до появления колонки: их смещение — part * part_size.
+        """
+        pool = await self._get_pool()
+        uid = uuid.UUID(doc_id)
+        decode = part_decoder(codec)
+
+        async with pool.connection() as conn, conn.transaction():
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    select part, byte_offset
+                    from json_chunks
+                    where id = %s
+                      and byte_offset <= %s
+                    order by byte_offset desc
+                    limit 1
+                    """,
+                    (uid, start),
+                )
+                row = await cur.fetchone()
+            if row is not None:
+                first_part, offset = row
+            elif part_size:
+                first_part = start // part_size
+                offset = first_part * part_size
+            else:
+                first_part, offset = 0, 0
+
+            async with conn.cursor(name='json_chunks_range', binary=True) as cur:
+                cur.itersize = CHUNK_FETCH_ROWS
+                await cur.execute(
+                    """
+                    select byte_offset, data
+                    from json_chunks
+                    where id = %s
+                      and part >= %s
+                    order by part
+                    """,
+                    (uid, first_part),
+                )
+                async for row in cur:
+                    byte_offset, data = row
+                    if byte_offset is not None:
+                        offset = byte_offset
+                    if offset > end:
+                        break
+                    chunk = (
+                        bytes(data)
+                        if decode is None
+                        else await asyncio.to_thread(decode, data)
+                    )
+                    lo = max(start - offset, 0)
+                    hi = min(end + 1 - offset, len(chunk))
+                    if lo < hi:
+                        yield chunk[lo:hi]
+                    offset += len(chunk)
 
     async def delete_chunks_by_id(self, doc_id: str) -> bool:
         pool = await self._get_pool()
@@ -103,6 +725,27 @@ class PostgresDBRepository:
 
         return deleted_rows > 0
 
+    async def delete_chunks_by_ids(self, doc_ids: Collection[str]) -> int:
+        if not doc_ids:
+            return 0
+        pool = await self._get_pool()
+        uids = [uuid.UUID(doc_id) for doc_id in doc_ids]
+
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    delete
+                    from json_chunks
+                    where id = any(%s)
+                    """,
+                    (uids,),
+                )
+                deleted_rows = cur.rowcount
+            await conn.commit()
+
+        return deleted_rows
+
     async def create_document_stream(
         self,
         namespace: str,
@@ -110,78 +753,770 @@ class PostgresDBRepository:
         body: AsyncIterator[bytes],
         *,
         max_batch_bytes: int = 1024 * 1024,
+        use_copy: bool = True,
+        part_size: int | None = None,
+        codec: str | None = None,
     ) -> DocumentSchema:
+        """
+        Пишет тело документа в json_chunks по мере поступления и создаёт метаданные
+        в той же транзакции. Поток перенарезается на части фиксированного размера
+        part_size (по умолчанию self.part_size), размер части сохраняется в метаданных.
+
+        Приём тела, подсчёт SHA-256 и запись в Postgres перекрываются: чтение идёт
+        в отдельной задаче на ingest_queue_depth частей вперёд, хеш считается
+        в потоке параллельно с отправкой части в COPY.
+
+        codec (по умолчанию — настроенный для неймспейса) сжимает каждую часть
+        отдельным кадром; кодек записывается в метаданные, хеш и длина считаются
+        по исходным байтам. В метаданные попадает и место хранения тела
+        (см. storage_for): от него зависят индексация и чтение документа.
+
+        По умолчанию части уходят через COPY FROM STDIN (binary) — без round trip
+        на каждую строку. use_copy=False оставляет старый путь через executemany
+        пачками по max_batch_bytes (нужен для сравнения в benchmarks/).
+        """
         pool = await self._get_pool()
         table = namespace + '_metadata'
 
         doc_id = uuid_extensions.uuid7()
         hasher = hashlib.sha256()
+        part_size = part_size or self.part_size
+        codec = codec or self.codec_for(namespace)
+        encode = part_encoder(codec, self.compression_level)
+        storage = self.storage_for(namespace)
+        depth = self.ingest_queue_depth
+        # буферов на 2 больше глубины очереди: один заполняется, один пишется
+        parts = prefetch(coalesce_parts(body, part_size, buffers=depth + 2), depth)
+
+        async with pool.connection() as conn, aclosing(parts):
+            try:
+                async with conn.cursor() as cur:
+                    if use_copy:
+                        total = await self._copy_chunks(
+                            cur, doc_id, parts, hasher, encode
+                        )
+                    else:
+                        total = await self._insert_chunks(
+                            cur, doc_id, parts, hasher, encode, max_batch_bytes
+                        )
+
+                    content_hash = hasher.hexdigest()
+
+                    await cur.execute(
+                        sql.SQL(
+                            """
+                            insert into {} (id, document_name, content_length, content_hash, part_size, codec, storage)
+                            values (%s, %s, %s, %s, %s, %s, %s)
+                            returning created_at, updated_at
+                            """
+                        ).format(sql.Identifier(table)),
+                        (
+                            doc_id,
+                            document_name,
+                            total,
+                            content_hash,
+                            part_size,
+                            codec,
+                            storage,
+                        ),
+                    )
+                    created_at, updated_at = await cur.fetchone()
+
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+        return DocumentSchema(
+            id=str(doc_id),
+            document_name=document_name,
+            created_at=created_at,
+            updated_at=updated_at,
+            content_length=total,
+            content_hash=content_hash,
+            part_size=part_size,
+            codec=codec,
+            storage=storage,
+        )
+
+    @staticmethod
+    async def _copy_chunks(
+        cur: AsyncCursor,
+        doc_id: uuid.UUID,
+        parts: AsyncIterator[memoryview],
+        hasher: Any,
+        encode: PartEncoder | None,
+        first_part: int = 0,
+    ) -> int:
+        total = 0
+        part = first_part
+
+        async with cur.copy(
+            'copy json_chunks (id, part, data, byte_offset) from stdin (format binary)'
+        ) as copy:
+            copy.set_types(['uuid', 'int4', 'bytea', 'int8'])
+            async for chunk in parts:
+                offset = total
+                total += len(chunk)
+                # hashlib и zstd отпускают GIL на больших буферах, так что хеш
+                # считается параллельно со сжатием или отправкой части в COPY
+                if encode is None:
+                    await asyncio.gather(
+                        asyncio.to_thread(hasher.update, chunk),
+                        copy.write_row((doc_id, part, chunk, offset)),
+                    )
+                else:
+                    data, _ = await asyncio.gather(
+                        asyncio.to_thread(encode, chunk),
+                        asyncio.to_thread(hasher.update, chunk),
+                    )
+                    await copy.write_row((doc_id, part, data, offset))
+                part += 1
+
+        return total
+
+    @staticmethod
+    async def _insert_chunks(
+        cur: AsyncCursor,
+        doc_id: uuid.UUID,
+        parts: AsyncIterator[memoryview],
+        hasher: Any,
+        encode: PartEncoder | None,
+        max_batch_bytes: int,
+    ) -> int:
         total = 0
         part = 0
-        batch: list[tuple[uuid.UUID, int, bytes]] = []
+        batch: list[tuple[uuid.UUID, int, bytes, int]] = []
         batch_bytes = 0
 
+        async for chunk in parts:
+            # executemany держит пачку целиком, поэтому часть копируется из буфера
+            offset = total
+            total += len(chunk)
+            hasher.update(chunk)
+            b = bytes(chunk) if encode is None else encode(chunk)
+            batch.append((doc_id, part, b, offset))
+            batch_bytes += len(b)
+            part += 1
+
+            if batch_bytes >= max_batch_bytes:
+                await cur.executemany(
+                    """
+                    insert into json_chunks (id, part, data, byte_offset)
+                    values (%s, %s, %s, %s)
+                    """,
+                    batch,
+                )
+                batch.clear()
+                batch_bytes = 0
+
+        if batch:
+            await cur.executemany(
+                """
+                insert into json_chunks (id, part, data, byte_offset)
+                values (%s, %s, %s, %s)
+                """,
+                batch,
+            )
+
+        return total
+
+    async def create_document_inline(
+        self,
+        namespace: str,
+        document_name: str,
+        body: bytes,
+    ) -> DocumentSchema:
+        """
+        Небольшой документ одной строкой json_buffer: метаданные и тело
+        пишутся одним запросом, без частей в json_chunks. Тело так и остаётся
+        в json_buffer и читается оттуда (у такого документа inline=true),
+        а в индекс уходит по тем же правилам storage, что и тело из частей.
+        """
+        pool = await self._get_pool()
+        table = namespace + '_metadata'
+        doc_id = uuid_extensions.uuid7()
+        content_hash = hashlib.sha256(body).hexdigest()
+        storage = self.storage_for(namespace)
+
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    sql.SQL(
+                        """
+                        with body as (
+                            insert into json_buffer (id, content)
+                            values (%(id)s, %(body)s)
+                        )
+                        insert into {} (id, document_name, content_length, content_hash, storage, inline)
+                        values (%(id)s, %(name)s, %(length)s, %(hash)s, %(storage)s, true)
+                        returning created_at, updated_at
+                        """
+                    ).format(sql.Identifier(table)),
+                    {
+                        'id': doc_id,
+                        'body': body,
+                        'name': document_name,
+                        'length': len(body),
+                        'hash': content_hash,
+                        'storage': storage,
+                    },
+                )
+                created_at, updated_at = await cur.fetchone()
+            await conn.commit()
+
+        return DocumentSchema(
+            id=str(doc_id),
+            document_name=document_name,
+            created_at=created_at,
+            updated_at=updated_at,
+            content_length=len(body),
+            content_hash=content_hash,
+            storage=storage,
+            inline=True,
+        )
+
+    async def iter_body(self, meta: DocumentSchema) -> AsyncGenerator[bytes, None]:
+        """Тело документа оттуда, где оно лежит: json_buffer или json_chunks."""
+        if meta.inline:
+            data = await self.get_data_by_id(meta.id)
+            if data is not None:
+                yield data
+            return
+        async for chunk in self.iter_chunks_by_id(meta.id, codec=meta.codec):
+            yield chunk
+
+    async def iter_bodies(
+        self,
+        metas: Collection[DocumentSchema],
+    ) -> AsyncGenerator[tuple[str, bytes], None]:
+        """
+        Тела нескольких документов парами (id, часть): однострочные — одним
+        запросом к json_buffer, затем остальные — одним запросом к json_chunks.
+        """
+        inline = [uuid.UUID(meta.id) for meta in metas if meta.inline]
+        if inline:
+            pool = await self._get_pool()
+            async with pool.connection() as conn:
+                async with conn.cursor(binary=True) as cur:
+                    await cur.execute(
+                        """
+                        select id, content
+                        from json_buffer
+                        where id = any(%s)
+                        """,
+                        (inline,),
+                    )
+                    rows = await cur.fetchall()
+            for uid, content in rows:
+                yield str(uid), bytes(content)
+
+        async for item in self.iter_chunks_by_ids(
+            {meta.id: meta.codec for meta in metas if not meta.inline}
+        ):
+            yield item
+
+    async def create_documents_bulk(
+        self,
+        namespace: str,
+        documents: Sequence[tuple[str, bytes]],
+    ) -> list[DocumentSchema]:
+        """
+        Пачка небольших документов (имя, тело) одной транзакцией: части всех
+        документов уходят одним COPY в json_chunks, метаданные — вторым COPY
+        в таблицу неймспейса. Хеши и сжатие считаются в потоке для всей пачки.
+        """
+        pool = await self._get_pool()
+        table = namespace + '_metadata'
+        part_size = self.part_size
+        codec = self.codec_for(namespace)
+        storage = self.storage_for(namespace)
+        encode = part_encoder(codec, self.compression_level)
+
+        def prepare() -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]]]:
+            chunk_rows: list[tuple[Any, ...]] = []
+            meta_rows: list[tuple[Any, ...]] = []
+            for document_name, body in documents:
+                doc_id = uuid_extensions.uuid7()
+                view = memoryview(body)
+                for part, offset in enumerate(range(0, len(body), part_size)):
+                    chunk = view[offset : offset + part_size]
+                    data = chunk if encode is None else encode(chunk)
+                    chunk_rows.append((doc_id, part, data, offset))
+                meta_rows.append(
+                    (
+                        doc_id,
+                        document_name,
+                        len(body),
+                        hashlib.sha256(body).hexdigest(),
+                        part_size,
+                        codec,
+                        storage,
+                    )
+                )
+            return chunk_rows, meta_rows
+
+        chunk_rows, meta_rows = await asyncio.to_thread(prepare)
+
         async with pool.connection() as conn:
             try:
                 async with conn.cursor() as cur:
-                    async for chunk in body:
-                        if not chunk:
-                            continue
-                        b = bytes(chunk)
-                        total += len(b)
-                        hasher.update(b)
-                        batch.append((doc_id, part, b))
-                        batch_bytes += len(b)
-                        part += 1
-
-                        if batch_bytes >= max_batch_bytes:
-                            await cur.executemany(
-                                """
-                                insert into json_chunks (id, part, data)
-                                values (%s, %s, %s)
-                                """,
-                                batch,
-                            )
-                            batch.clear()
-                            batch_bytes = 0
-
-                    if batch:
-                        await cur.executemany(
+                    # default now() метаданных — время начала транзакции
+                    await cur.execute('select now()')
+                    (created_at,) = await cur.fetchone()
+                    async with cur.copy(
+                        'copy json_chunks (id, part, data, byte_offset) from stdin (format binary)'
+                    ) as copy:
+                        copy.set_types(['uuid', 'int4', 'bytea', 'int8'])
+                        for row in chunk_rows:
+                            await copy.write_row(row)
+                    async with cur.copy(
+                        sql.SQL(
+                            """
+                            copy {} (id, document_name, content_length, content_hash, part_size, codec, storage)
+                            from stdin (format binary)
                             """
-                            insert into json_chunks (id, part, data)
-                            values (%s, %s, %s)
-                            """,
-                            batch,
+                        ).format(sql.Identifier(table))
+                    ) as copy:
+                        copy.set_types(
+                            ['uuid', 'text', 'int8', 'text', 'int4', 'text', 'text']
                         )
+                        for row in meta_rows:
+                            await copy.write_row(row)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
 
-                    content_hash = hasher.hexdigest()
+        return [
+            DocumentSchema(
+                id=str(doc_id),
+                document_name=document_name,
+                created_at=created_at,
+                updated_at=created_at,
+                content_length=content_length,
+                content_hash=content_hash,
+                part_size=part_size,
+                codec=codec,
+                storage=storage,
+            )
+            for (
+                doc_id,
+                document_name,
+                content_length,
+                content_hash,
+                _,
+                _,
+                _,
+            ) in meta_rows
+        ]
+
+    async def create_upload_session(
+        self,
+        namespace: str,
+        document_name: str,
+    ) -> UploadSessionSchema:
+        """
+        Открывает сессию загрузки документа по частям. Размер строки json_chunks,
+        кодек и место хранения фиксируются при открытии и не зависят
+        от настроек, действующих к моменту завершения.
+        """
+        pool = await self._get_pool()
+        session_id = uuid_extensions.uuid7()
+
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    insert into json_upload_sessions
+                        (id, namespace, document_name, part_size, codec, storage)
+                    values (%s, %s, %s, %s, %s, %s)
+                    returning created_at
+                    """,
+                    (
+                        session_id,
+                        namespace,
+                        document_name,
+                        self.part_size,
+                        self.codec_for(namespace),
+                        self.storage_for(namespace),
+                    ),
+                )
+                (created_at,) = await cur.fetchone()
+            await conn.commit()
+
+        return UploadSessionSchema(
+            id=str(session_id),
+            document_name=document_name,
+            created_at=created_at,
+        )
 
+    async def get_upload_session(
+        self,
+        namespace: str,
+        session_id: str,
+    ) -> UploadSessionSchema | None:
+        pool = await self._get_pool()
+        uid = uuid.UUID(session_id)
+
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    """
+                    select id, document_name, created_at
+                    from json_upload_sessions
+                    where id = %s
+                      and namespace = %s
+                    """,
+                    (uid, namespace),
+                )
+                row = await cur.fetchone()
+                if row is None:
+                    return None
+                await cur.execute(
+                    """
+                    select part_number, content_length, content_hash, uploaded_at
+                    from json_upload_parts
+                    where session_id = %s
+                    order by part_number
+                    """,
+                    (uid,),
+                )
+                parts = await cur.fetchall()
+
+        return UploadSessionSchema(
+            id=str(row['id']),
+            document_name=row['document_name'],
+            created_at=row['created_at'],
+            parts=[UploadPartSchema(**part) for part in parts],
+        )
+
+    async def write_upload_part(
+        self,
+        namespace: str,
+        session_id: str,
+        part_number: int,
+        body: AsyncIterator[bytes],
+    ) -> UploadPartSchema | None:
+        """
+        Пишет часть загрузки в json_chunks своей транзакцией; части одной сессии
+        можно грузить параллельно. Повторная загрузка того же номера заменяет
+        часть целиком. None — сессии нет (завершена, отменена или удалена).
+
+        Смещения строк пишутся относительно начала части, абсолютными
+        они становятся при завершении сессии.
+        """
+        if not 1 <= part_number <= UPLOAD_MAX_PARTS:
+            raise ValueError(f'part_number must be in 1..{UPLOAD_MAX_PARTS}')
+        pool = await self._get_pool()
+        uid = uuid.UUID(session_id)
+        hasher = hashlib.sha256()
+        first_part = part_number * UPLOAD_PART_STRIDE
+
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    # key share не мешает параллельным частям, но не даёт
+                    # завершить или отменить сессию, пока часть пишется
+                    await cur.execute(
+                        """
+                        select part_size, codec
+                        from json_upload_sessions
+                        where id = %s
+                          and namespace = %s
+                        for key share
+                        """,
+                        (uid, namespace),
+                    )
+                    row = await cur.fetchone()
+                    if row is None:
+                        await conn.rollback()
+                        return None
+                    part_size, codec = row
+
+                    # блокировка строки части: повтор того же номера ждёт этот
+                    await cur.execute(
+                        """
+                        insert into json_upload_parts (session_id, part_number)
+                        values (%s, %s)
+                        on conflict (session_id, part_number)
+                            do update set uploaded_at = now()
+                        """,
+                        (uid, part_number),
+                    )
+                    await cur.execute(
+                        """
+                        delete
+                        from json_chunks
+                        where id = %s
+                          and part >= %s
+                          and part < %s
+                        """,
+                        (uid, first_part, first_part + UPLOAD_PART_STRIDE),
+                    )
+
+                    depth = self.ingest_queue_depth
+                    parts = prefetch(
+                        _limit_parts(
+                            coalesce_parts(body, part_size, buffers=depth + 2),
+                            UPLOAD_PART_STRIDE,
+                        ),
+                        depth,
+                    )
+                    async with aclosing(parts):
+                        total = await self._copy_chunks(
+                            cur,
+                            uid,
+                            parts,
+                            hasher,
+                            part_encoder(codec, self.compression_level),
+                            first_part,
+                        )
+
+                    await cur.execute(
+                        """
+                        update json_upload_parts
+                        set content_length = %s,
+                            content_hash = %s,
+                            uploaded_at = now()
+                        where session_id = %s
+                          and part_number = %s
+                        returning uploaded_at
+                        """,
+                        (total, hasher.hexdigest(), uid, part_number),
+                    )
+                    (uploaded_at,) = await cur.fetchone()
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+        return UploadPartSchema(
+            part_number=part_number,
+            content_length=total,
+            content_hash=hasher.hexdigest(),
+            uploaded_at=uploaded_at,
+        )
+
+    async def complete_upload_session(
+        self,
+        namespace: str,
+        session_id: str,
+    ) -> DocumentSchema | None:
+        """
+        Собирает документ из загруженных частей по возрастанию номера:
+        проставляет абсолютные смещения строк, считает SHA-256 всего тела
+        и создаёт метаданные. Длина — сумма длин частей; хеш у документа
+        из одной части уже посчитан при её записи, иначе части читаются
+        по порядку через один hasher. Сессия удаляется в той же транзакции.
+        None — сессии нет; ValueError — нет ни одной части или в номерах
+        частей есть пропуски.
+        """
+        pool = await self._get_pool()
+        table = namespace + '_metadata'
+        uid = uuid.UUID(session_id)
+
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    # ждёт части, которые ещё пишутся, и не пускает новые
+                    await cur.execute(
+                        """
+                        select document_name, part_size, codec, storage
+                        from json_upload_sessions
+                        where id = %s
+                          and namespace = %s
+                        for update
+                        """,
+                        (uid, namespace),
+                    )
+                    row = await cur.fetchone()
+                    if row is None:
+                        await conn.rollback()
+                        return None
+                    document_name, part_size, codec, storage = row
+
+                    await cur.execute(
+                        """
+                        select part_number, content_length, content_hash
+                        from json_upload_parts
+                        where session_id = %s
+                        order by part_number
+                        """,
+                        (uid,),
+                    )
+                    parts = await cur.fetchall()
+                    if not parts:
+                        raise ValueError('Upload session has no parts')
+                    numbers = [number for number, _, _ in parts]
+                    if numbers[-1] != len(numbers):
+                        missing = sorted(set(range(1, numbers[-1])) - set(numbers))
+                        raise ValueError(
+                            'Upload session is missing parts: '
+                            + ', '.join(map(str, missing[:10]))
+                            + (', ...' if len(missing) > 10 else '')
+                        )
+                    total = sum(length for _, length, _ in parts)
+
+                    await cur.execute(
+                        """
+                        with bases as (
+                            select part_number,
+                                   sum(content_length) over (order by part_number)
+                                       - content_length as base
+                            from json_upload_parts
+                            where session_id = %(id)s
+                        )
+                        update json_chunks c
+                        set byte_offset = c.byte_offset + b.base
+                        from bases b
+                        where c.id = %(id)s
+                          and c.part >= b.part_number * %(stride)s
+                          and c.part < (b.part_number + 1) * %(stride)s
+                        """,
+                        {'id': uid, 'stride': UPLOAD_PART_STRIDE},
+                    )
+
+                if len(parts) == 1:
+                    content_hash = parts[0][2]
+                else:
+                    content_hash = await self._hash_chunks(conn, uid, codec)
+
+                async with conn.cursor() as cur:
                     await cur.execute(
                         sql.SQL(
                             """
-                            insert into {} (id, document_name, content_length, content_hash)
-                            values (%s, %s, %s, %s)
+                            insert into {} (id, document_name, content_length, content_hash, part_size, codec, storage)
+                            values (%s, %s, %s, %s, %s, %s, %s)
                             returning created_at, updated_at
                             """
                         ).format(sql.Identifier(table)),
-                        (doc_id, document_name, total, content_hash),
+                        (
+                            uid,
+                            document_name,
+                            total,
+                            content_hash,
+                            part_size,
+                            codec,
+                            storage,
+                        ),
                     )
                     created_at, updated_at = await cur.fetchone()
-
+                    await cur.execute(
+                        'delete from json_upload_sessions where id = %s', (uid,)
+                    )
                 await conn.commit()
             except Exception:
                 await conn.rollback()
                 raise
 
         return DocumentSchema(
-            id=str(doc_id),
+            id=str(uid),
             document_name=document_name,
             created_at=created_at,
             updated_at=updated_at,
             content_length=total,
             content_hash=content_hash,
+            part_size=part_size,
+            codec=codec,
+            storage=storage,
         )
 
+    @staticmethod
+    async def _hash_chunks(conn: AsyncConnection, uid: uuid.UUID, codec: str) -> str:
+        """SHA-256 тела из json_chunks: части по порядку через один hasher."""
+        hasher = hashlib.sha256()
+        decode = part_decoder(codec)
+        async with conn.cursor(name='json_upload_hash', binary=True) as cur:
+            cur.itersize = CHUNK_FETCH_ROWS
+            await cur.execute(
+                """
+                select data
+                from json_chunks
+                where id = %s
+                order by part
+                """,
+                (uid,),
+            )
+            async for (data,) in cur:
+                if decode is not None:
+                    data = await asyncio.to_thread(decode, data)
+                await asyncio.to_thread(hasher.update, data)
+        return hasher.hexdigest()
+
+    async def abort_upload_session(self, namespace: str, session_id: str) -> bool:
+        pool = await self._get_pool()
+        uid = uuid.UUID(session_id)
+
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        delete
+                        from json_upload_sessions
+                        where id = %s
+                          and namespace = %s
+                        """,
+                        (uid, namespace),
+                    )
+                    deleted = cur.rowcount > 0
+                    if deleted:
+                        await cur.execute(
+                            'delete from json_chunks where id = %s', (uid,)
+                        )
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+        return deleted
+
+    async def delete_abandoned_upload_sessions(self, ttl: float) -> int:
+        """
+        Удаляет сессии, в которые ничего не загружалось дольше ttl секунд,
+        вместе с их частями. Сессии, в которые сейчас пишется часть, пропускаются.
+        """
+        pool = await self._get_pool()
+
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        select s.id
+                        from json_upload_sessions s
+                        where s.created_at < now() - make_interval(secs => %(ttl)s)
+                          and not exists (
+                              select 1
+                              from json_upload_parts p
+                              where p.session_id = s.id
+                                and p.uploaded_at >= now() - make_interval(secs => %(ttl)s)
+                          )
+                        for update skip locked
+                        """,
+                        {'ttl': ttl},
+                    )
+                    uids = [row[0] for row in await cur.fetchall()]
+                    if uids:
+                        await cur.execute(
+                            'delete from json_chunks where id = any(%s)', (uids,)
+                        )
+                        await cur.execute(
+                            'delete from json_upload_sessions where id = any(%s)',
+                            (uids,),
+                        )
+                await conn.commit()
+            except UndefinedTable:
+                # ни одного неймспейса ещё не создано
+                await conn.rollback()
+                return 0
+            except Exception:
+                await conn.rollback()
+                raise
+
+        return len(uids)
+
     async def get_data_by_id(self, doc_id: str) -> Optional[bytes]:
         pool = await self._get_pool()
         uid = uuid.UUID(doc_id)
@@ -229,23 +1564,31 @@ class PostgresDBRepository:
         pool = await self._get_pool()
         async with pool.connection() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
-                    sql.SQL(
-                        """
-                    create table if not exists {} (
-                        id uuid primary key,
-                        document_name text not null,
-                        content_length integer not null,
-                        content_hash text not null,
-                        created_at timestamptz not null default now(),
-                        updated_at timestamptz not null default now()
-                    );
-                    """
-                    ).format(sql.Identifier(table))
-                )
+                await self._create_meta_table(cur, table)
 
             await conn.commit()
 
+    @staticmethod
+    async def _create_meta_table(cur: AsyncCursor, table: str) -> None:
+        await cur.execute(
+            sql.SQL(
+                """
+            create table if not exists {} (
+                id uuid primary key,
+                document_name text not null,
+                content_length bigint not null,
+                content_hash text not null,
+                created_at timestamptz not null default now(),
+                updated_at timestamptz not null default now(),
+                part_size integer,
+                codec text not null default 'identity',
+                storage text not null default 'elastic',
+                inline boolean not null default false
+            );
+            """
+            ).format(sql.Identifier(table))
+        )
+
     async def drop_meta_table_by_namespace(self, namespace: str) -> None:
         # TODO: тоже бы проверочку названия, хотя if exists скипнет,
         #  но в целом чтоб не делать лишний запрос можно и проверить на этом этапе
@@ -277,8 +1620,8 @@ class PostgresDBRepository:
                 await cur.execute(
                     sql.SQL(
                         """
-                        insert into {} (id, document_name, content_length, content_hash)
-                        values (%s, %s, %s, %s)
+                        insert into {} (id, document_name, content_length, content_hash, inline)
+                        values (%s, %s, %s, %s, true)
                         returning created_at, updated_at
                         """
                     ).format(sql.Identifier(table)),
@@ -303,6 +1646,7 @@ class PostgresDBRepository:
             updated_at=updated_at,
             content_length=content_length,
             content_hash=content_hash,
+            inline=True,
         )
 
     async def get_document_meta(
@@ -324,7 +1668,11 @@ class PostgresDBRepository:
                                content_length,
                                content_hash,
                                created_at,
-                               updated_at
+                               updated_at,
+                               part_size,
+                               codec,
+                               storage,
+                               inline
                         from {}
                         where id = %s
                         """
@@ -336,6 +1684,47 @@ class PostgresDBRepository:
         if row is None:
             return None
 
+        return self._meta_from_row(row)
+
+    async def get_documents_meta(
+        self,
+        namespace: str,
+        doc_ids: Collection[str],
+    ) -> list[DocumentSchema]:
+        """Метаданные нескольких документов одним запросом; отсутствующие пропускаются."""
+        if not doc_ids:
+            return []
+        pool = await self._get_pool()
+        table = namespace + '_metadata'
+        uids = [uuid.UUID(doc_id) for doc_id in doc_ids]
+
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    sql.SQL(
+                        """
+                        select id,
+                               document_name,
+                               content_length,
+                               content_hash,
+                               created_at,
+                               updated_at,
+                               part_size,
+                               codec,
+                               storage,
+                               inline
+                        from {}
+                        where id = any(%s)
+                        """
+                    ).format(sql.Identifier(table)),
+                    (uids,),
+                )
+                rows = await cur.fetchall()
+
+        return [self._meta_from_row(row) for row in rows]
+
+    @staticmethod
+    def _meta_from_row(row: dict[str, Any]) -> DocumentSchema:
         return DocumentSchema(
             id=str(row['id']),
             document_name=row['document_name'],
@@ -343,6 +1732,10 @@ class PostgresDBRepository:
             updated_at=row['updated_at'],
             content_length=row['content_length'],
             content_hash=row['content_hash'],
+            part_size=row['part_size'],
+            codec=row['codec'],
+            storage=row['storage'],
+            inline=row['inline'],
         )
 
     async def delete_document_meta(
@@ -376,13 +1769,29 @@ class PostgresDBRepository:
         limit: int | None = None,
         cursor: str | None = None,
         offset: int | None = None,
+        count: str = 'exact',
     ) -> DocumentListSchema:
+        """
+        Keyset-пагинация по первичному ключу: uuid7 упорядочен по времени,
+        поэтому "новые сверху" — это order by id desc, а страница начинается
+        с id <= cursor (включительно) и читается поиском по индексу, без OFFSET.
+        next_cursor — id первого документа следующей страницы.
+
+        count:
+          exact    — count(*) по таблице (для полной выборки — просто длина списка)
+          estimate — оценка из статистики планировщика (pg_class.reltuples)
+          none     — не считать, count = None
+        offset оставлен для совместимости и на больших таблицах дорог.
+        """
+        if count not in ('exact', 'estimate', 'none'):
+            raise ValueError(f'Unsupported count mode: {count!r}')
+
         pool = await self._get_pool()
         table = namespace + '_metadata'
 
         async with pool.connection() as conn:
             async with conn.cursor(row_factory=dict_row) as cur:
-                query = [
+                query: list[sql.Composable] = [
                     sql.SQL(
                         """
                         select id,
@@ -390,19 +1799,24 @@ class PostgresDBRepository:
                             content_length,
                             content_hash,
                             created_at,
-                            updated_at
+                            updated_at,
+                            part_size,
+                            codec,
+                            storage,
+                            inline
                         from {}
                         """
                     ).format(sql.Identifier(table)),
                 ]
-                params = []
+                params: list[Any] = []
                 if cursor is not None:
                     query.append(sql.SQL('where id <= %s'))
                     params.append(cursor)
-                query.append(sql.SQL('order by created_at desc'))
+                query.append(sql.SQL('order by id desc'))
                 if limit is not None:
+                    # одна лишняя строка показывает, есть ли следующая страница
                     query.append(sql.SQL('limit %s'))
-                    params.append(limit)
+                    params.append(limit + 1)
                 if offset is not None:
                     query.append(sql.SQL('offset %s'))
                     params.append(offset)
@@ -412,27 +1826,48 @@ class PostgresDBRepository:
                 )
                 rows = await cur.fetchall()
 
-                await cur.execute(
-                    sql.SQL('select count(*) as cnt from {}').format(
-                        sql.Identifier(table)
-                    )
-                )
-                total_row = await cur.fetchone()
+                next_cursor = None
+                if limit is not None and len(rows) > limit:
+                    next_cursor = str(rows[limit]['id'])
+                    rows = rows[:limit]
 
-        items = [
-            DocumentSchema(
-                id=str(r['id']),
-                document_name=r['document_name'],
-                created_at=r['created_at'],
-                updated_at=r['updated_at'],
-                content_length=r['content_length'],
-                content_hash=r['content_hash'],
-            )
-            for r in rows
-            if r is not None
-        ]
+                total: int | None = None
+                whole_table = limit is None and cursor is None and not offset
+                if count == 'exact' and whole_table:
+                    total = len(rows)
+                elif count == 'exact':
+                    total = await self._count_exact(cur, table)
+                elif count == 'estimate':
+                    total = await self._count_estimate(cur, table)
+
+        items = [self._meta_from_row(r) for r in rows if r is not None]
+
+        return DocumentListSchema(items=items, count=total, next_cursor=next_cursor)
 
-        return DocumentListSchema(items=items, count=total_row['cnt'])
+    @staticmethod
+    async def _count_exact(cur: AsyncCursor[dict[str, Any]], table: str) -> int:
+        await cur.execute(
+            sql.SQL('select count(*) as cnt from {}').format(sql.Identifier(table))
+        )
+        row = await cur.fetchone()
+        # count(*) без group by всегда возвращает строку
+        return 0 if row is None else row['cnt']
+
+    @classmethod
+    async def _count_estimate(cls, cur: AsyncCursor[dict[str, Any]], table: str) -> int:
+        await cur.execute(
+            """
+            select reltuples::bigint as cnt
+            from pg_class
+            where oid = to_regclass(%s)
+            """,
+            (sql.Identifier(table).as_string(cur),),
+        )
+        row = await cur.fetchone()
+        # -1: таблицу ещё ни разу не анализировали, оценки нет
+        if row is None or row['cnt'] < 0:
+            return await cls._count_exact(cur, table)
+        return row['cnt']
 
     async def delete_object_by_id(self, namespace: str, doc_id: str) -> bool:
         pool = await self._get_pool()
@@ -464,6 +1899,17 @@ class PostgresDBRepository:
                     )
                     chunks_deleted = cur.rowcount
 
+                    # однострочные документы (create_document_inline)
+                    await cur.execute(
+                        """
+                        delete
+                        from json_buffer
+                        where id = %s
+                        """,
+                        (uid,),
+                    )
+                    chunks_deleted += cur.rowcount
+
                 await conn.commit()
             except Exception:
                 await conn.rollback()
@@ -1,15 +1,29 @@
-from typing import Any
+from typing import Any, Literal
 from dishka import FromDishka
 from dishka.integrations.fastapi import DishkaRoute
-from starlette.responses import JSONResponse, Response
-from fastapi import APIRouter, Body, Query, Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from fastapi import APIRouter, Body, Path, Query, Request
 from uuid import UUID
 
-from .schemas import DocumentListSchema, DocumentSchema
+from .repositories.postgres import UPLOAD_MAX_PARTS
+from .schemas import (
+    DocumentListSchema,
+    DocumentMultiGetSchema,
+    DocumentSchema,
+    UploadPartSchema,
+    UploadSessionSchema,
+)
 from .services import MultiRepositoryService
 
 router = APIRouter(prefix='/ns', route_class=DishkaRoute)
 
+# id в одном запросе _mget
+MGET_MAX_IDS = 1000
+# документов на странице поиска по курсору; страница запрашивается с одним
+# лишним документом, а size в Elasticsearch не больше max_result_window (10000)
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGE_SIZE = 9999
+
 
 @router.get('/get_namespaces', response_model=list[str])
 async def get_namespaces(
@@ -32,9 +46,30 @@ async def get_object_meta(
 async def get_object_body(
     namespace: str,
     object_id: UUID,
+    request: Request,
     multi_repo: FromDishka[MultiRepositoryService],
-) -> dict[str, Any]:
-    return await multi_repo.get_object_body(namespace, object_id)
+) -> StreamingResponse:
+    body = await multi_repo.get_object_body_stream(
+        namespace,
+        object_id,
+        if_none_match=request.headers.get('if-none-match'),
+        range_header=request.headers.get('range'),
+        if_range=request.headers.get('if-range'),
+    )
+    headers = {
+        'Content-Length': str(body.content_length),
+        'ETag': body.etag,
+    }
+    if body.accept_ranges:
+        headers['Accept-Ranges'] = 'bytes'
+    if body.content_range is not None:
+        headers['Content-Range'] = body.content_range
+    return StreamingResponse(
+        body.chunks,
+        status_code=body.status_code,
+        media_type='application/json',
+        headers=headers,
+    )
 
 
 @router.post('/{namespace}/objects', response_model=UUID)
@@ -50,6 +85,97 @@ async def create_object(
     return JSONResponse(content=str(object_id))
 
 
+@router.post('/{namespace}/objects/_bulk')
+async def create_objects_bulk(
+    namespace: str,
+    request: Request,
+    multi_repo: FromDishka[MultiRepositoryService],
+    document_name: str = Query(
+        'document',
+        description='Имя документов без name_field: к нему добавляется номер строки',
+    ),
+    name_field: str | None = Query(
+        None, description='Поле документа, значение которого станет его именем'
+    ),
+) -> StreamingResponse:
+    results = await multi_repo.create_objects_bulk(
+        namespace,
+        request.stream(),
+        document_name=document_name,
+        name_field=name_field,
+    )
+    return StreamingResponse(results, media_type='application/x-ndjson')
+
+
+@router.post('/{namespace}/objects/_mget/meta')
+async def get_objects_meta(
+    namespace: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+    object_ids: list[UUID] = Body(..., max_length=MGET_MAX_IDS),
+) -> DocumentMultiGetSchema:
+    return await multi_repo.get_objects_meta(namespace, object_ids)
+
+
+@router.post('/{namespace}/objects/_mget/body')
+async def get_objects_body(
+    namespace: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+    object_ids: list[UUID] = Body(..., max_length=MGET_MAX_IDS),
+) -> StreamingResponse:
+    bodies = await multi_repo.get_objects_body_stream(namespace, object_ids)
+    return StreamingResponse(bodies, media_type='application/json')
+
+
+@router.post('/{namespace}/uploads', status_code=201)
+async def create_upload(
+    namespace: str,
+    document_name: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> UploadSessionSchema:
+    return await multi_repo.create_upload(namespace, document_name)
+
+
+@router.get('/{namespace}/uploads/{upload_id}')
+async def get_upload(
+    namespace: str,
+    upload_id: UUID,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> UploadSessionSchema:
+    return await multi_repo.get_upload(namespace, upload_id)
+
+
+@router.put('/{namespace}/uploads/{upload_id}/parts/{part_number}')
+async def upload_part(
+    namespace: str,
+    upload_id: UUID,
+    request: Request,
+    multi_repo: FromDishka[MultiRepositoryService],
+    part_number: int = Path(..., ge=1, le=UPLOAD_MAX_PARTS),
+) -> UploadPartSchema:
+    return await multi_repo.upload_part(
+        namespace, upload_id, part_number, request.stream()
+    )
+
+
+@router.post('/{namespace}/uploads/{upload_id}/complete')
+async def complete_upload(
+    namespace: str,
+    upload_id: UUID,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> DocumentSchema:
+    return await multi_repo.complete_upload(namespace, upload_id)
+
+
+@router.delete('/{namespace}/uploads/{upload_id}', response_model=None)
+async def abort_upload(
+    namespace: str,
+    upload_id: UUID,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> Response:
+    await multi_repo.abort_upload(namespace, upload_id)
+    return Response(status_code=204)
+
+
 @router.delete('/{namespace}/objects/{object_id}', response_model=None)
 async def delete_object_by_id(
     namespace: str,
@@ -70,14 +196,72 @@ async def set_search_schema(
     return Response(status_code=204)
 
 
+@router.put('/{namespace}/bulk-load', response_model=None)
+async def begin_bulk_load(
+    namespace: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> Response:
+    await multi_repo.begin_bulk_load(namespace)
+    return Response(status_code=204)
+
+
+@router.delete('/{namespace}/bulk-load', response_model=None)
+async def end_bulk_load(
+    namespace: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+) -> Response:
+    await multi_repo.end_bulk_load(namespace)
+    return Response(status_code=204)
+
+
 @router.post('/{namespace}/search', response_model=list[dict[str, Any]])
 async def search_objects(
     namespace: str,
     multi_repo: FromDishka[MultiRepositoryService],
     filters: str = Body(..., description='Фильтры поиска'),
+    size: int | None = Query(
+        None,
+        ge=1,
+        le=SEARCH_MAX_PAGE_SIZE,
+        description=f'Документов на странице (по умолчанию {SEARCH_PAGE_SIZE})',
+    ),
+    sort: str | None = Query(
+        None,
+        description='Ключи сортировки по полям схемы: $.price:desc,$.createdAt',
+    ),
+    cursor: str | None = Query(
+        None,
+        description='Курсор следующей страницы из заголовка X-Next-Cursor (opaque)',
+    ),
 ) -> JSONResponse:
-    result = await multi_repo.search_objects(namespace, filters)
-    return JSONResponse(content=result)
+    if size is None and sort is None and cursor is None:
+        result = await multi_repo.search_objects(namespace, filters)
+        return JSONResponse(content=result)
+
+    # постранично: следующая страница — тот же запрос с cursor из X-Next-Cursor
+    items, next_cursor = await multi_repo.search_objects_page(
+        namespace,
+        filters,
+        size=size or SEARCH_PAGE_SIZE,
+        sort=sort,
+        cursor=cursor,
+    )
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor is not None else None
+    return JSONResponse(content=items, headers=headers)
+
+
+@router.post('/{namespace}/search/_export')
+async def export_objects(
+    namespace: str,
+    multi_repo: FromDishka[MultiRepositoryService],
+    filters: str = Body(..., description='Фильтры поиска'),
+    sort: str | None = Query(
+        None,
+        description='Ключи сортировки по полям схемы: $.price:desc,$.createdAt',
+    ),
+) -> StreamingResponse:
+    lines = await multi_repo.export_objects(namespace, filters, sort)
+    return StreamingResponse(lines, media_type='application/x-ndjson')
 
 
 @router.get('/{namespace}', response_model=DocumentListSchema)
@@ -102,8 +286,15 @@ async def list_objects(
         None,
         description='Открывок/токен курсора для получения следующей страницы (opaque)',
     ),
+    count: Literal['exact', 'estimate', 'none'] = Query(
+        'estimate',
+        description=(
+            'Как считать общее число объектов: exact — точный count(*), '
+            'estimate — оценка по статистике Postgres, none — не считать'
+        ),
+    ),
 ) -> JSONResponse:
-    content = await multi_repo.read_limit_namespace(namespace, limit, cursor)
+    content = await multi_repo.read_limit_namespace(namespace, limit, cursor, count)
     return JSONResponse(content=content.model_dump(mode="json"))
 
 
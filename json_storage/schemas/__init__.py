@@ -1,2 +1,5 @@
 from .document import DocumentSchema as DocumentSchema
 from .document_list import DocumentListSchema as DocumentListSchema
+from .document_list import DocumentMultiGetSchema as DocumentMultiGetSchema
+from .upload import UploadPartSchema as UploadPartSchema
+from .upload import UploadSessionSchema as UploadSessionSchema
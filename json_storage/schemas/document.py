@@ -15,3 +15,17 @@ class DocumentSchema(BaseModel):
     updated_at: datetime
     content_length: int
     content_hash: str
+    # размер части в json_chunks; None для однострочных документов
+    # и для записанных до появления колонки
+    part_size: int | None = None
+    # кодек частей тела: identity или zstd
+    codec: str = 'identity'
+    # где каноническое тело: elastic (_source индекса) или postgres (json_chunks)
+    storage: str = 'elastic'
+    # тело одной строкой в json_buffer, а не частями в json_chunks
+    inline: bool = False
+
+    @property
+    def body_in_postgres(self) -> bool:
+        # тело отдаётся из Postgres, а не из _source индекса
+        return self.inline or self.storage == 'postgres'
@@ -4,4 +4,14 @@ from pydantic import BaseModel, Field
 
 class DocumentListSchema(BaseModel):
     items: list[DocumentSchema] = Field(default_factory=list)
-    count: int = 0
+    # None, если подсчёт не запрашивали
+    count: int | None = 0
+    # непрозрачный курсор следующей страницы; None — страница последняя
+    next_cursor: str | None = None
+
+
+class DocumentMultiGetSchema(BaseModel):
+    # найденные документы в порядке запроса
+    items: list[DocumentSchema] = Field(default_factory=list)
+    # id, которых в неймспейсе нет
+    missing: list[str] = Field(default_factory=list)
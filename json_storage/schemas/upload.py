@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.alias_generators import to_camel
+
+
+class UploadPartSchema(BaseModel):
+    model_config = ConfigDict(
+        serialize_by_alias=True, populate_by_name=True, alias_generator=to_camel
+    )
+
+    part_number: int
+    content_length: int
+    # SHA-256 байт этой части, для проверки клиентом
+    content_hash: str
+    uploaded_at: datetime
+
+
+class UploadSessionSchema(BaseModel):
+    model_config = ConfigDict(
+        serialize_by_alias=True, populate_by_name=True, alias_generator=to_camel
+    )
+
+    # id сессии — он же id документа после завершения
+    id: str
+    document_name: str
+    created_at: datetime
+    parts: list[UploadPartSchema] = Field(default_factory=list)
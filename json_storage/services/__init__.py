@@ -1 +1,3 @@
 from .multi_repository_service import MultiRepositoryService as MultiRepositoryService
+from .indexing import BulkIndexer as BulkIndexer
+from .refresh import RefreshPolicy as RefreshPolicy
@@ -1,7 +1,11 @@
-from collections import defaultdict
-from dataclasses import dataclass
+import re
+from collections import OrderedDict, defaultdict
+from collections.abc import Hashable, Mapping, Sequence
+from dataclasses import dataclass, replace
+from datetime import datetime
 from typing import Any
 
+from .json_projection import JsonProjector
 from .jsonpath_parser import JSONPathParser, PathSegment
 
 
@@ -38,6 +42,191 @@ class OrExpr:
 
 Expr = Condition | NotExpr | AndExpr | OrExpr
 
+# типы полей схемы поиска; поле, заданное просто строкой JSONPath, — keyword
+FIELD_TYPES = frozenset({'keyword', 'long', 'double', 'date', 'boolean', 'text'})
+_RANGE_TYPES = frozenset({'keyword', 'long', 'double', 'date'})
+
+
+# токены выражения одним регулярным выражением; альтернативы проверяются
+# по порядку, последние ловят ошибки, поэтому совпадения идут без пропусков
+# (пропустить finditer может только пробелы в конце строки).
+# Путь тянется до пробела, скобки, '!', '<', '>' или двухсимвольного оператора;
+# число — по грамматике JSON и не может продолжаться буквой, цифрой или знаком
+_TOKEN_RE = re.compile(
+    r"""
+    \s*
+    (?:
+      (?P<PATH>\$[^\s()!<>=&|]*(?:(?:=(?!=)|&(?!&)|\|(?!\|))[^\s()!<>=&|]*)*)
+    | (?P<OP>[=!]=|[<>]=?)
+    | (?P<AND>&&)
+    | (?P<OR>\|\|)
+    | "(?P<STRING>[^"]*)"
+    | (?P<NUMBER>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)(?![\w.+-])
+    | (?P<NOT>!)
+    | (?P<LPAREN>\()
+    | (?P<RPAREN>\))
+    | (?P<COMMA>,)
+    | (?P<LBRACKET>\[)
+    | (?P<RBRACKET>\])
+    | (?P<IN>(?:not\s+)?in)(?!\w)
+    | (?P<WORD>[^\W\d_]+)
+    | (?P<BAD_NUMBER>-?[0-9][\w.+-]*)
+    | (?P<BAD_STRING>")
+    | (?P<ERROR>\S)
+    )
+    """,
+    re.VERBOSE,
+)
+# токены, значение которых — сам текст
+_TOKEN_VALUES = frozenset(
+    {
+        'PATH',
+        'AND',
+        'OR',
+        'OP',
+        'NOT',
+        'LPAREN',
+        'RPAREN',
+        'COMMA',
+        'LBRACKET',
+        'RBRACKET',
+    }
+)
+_WORDS: dict[str, tuple[str, Any]] = {
+    'true': ('BOOL', True),
+    'false': ('BOOL', False),
+    'null': ('NULL', None),
+}
+# сообщения об ошибках по группе _TOKEN_RE; {!r} — текст совпадения
+_TOKEN_ERRORS = {
+    'WORD': 'Unexpected identifier {!r}',
+    'BAD_NUMBER': 'Invalid number literal {!r}',
+    'BAD_STRING': 'Unterminated string literal',
+    'ERROR': 'Unexpected character {!r}',
+}
+# виды токенов-литералов: в плане запроса на их месте параметры;
+# LIST — список [..] после in целиком, один параметр при любой длине
+_LITERALS = frozenset({'STRING', 'NUMBER', 'BOOL', 'NULL', 'LIST'})
+_SCALARS = _LITERALS - {'LIST'}
+# операторы по типу поля: boolean и text — только равенство, text — без in
+_RANGE_OPS = frozenset({'>', '>=', '<', '<='})
+# планов в QueryPlanCache; одна запись — одна форма выражения в неймспейсе
+QUERY_PLAN_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class SearchField:
+    path: str
+    type: str = 'keyword'
+
+
+@dataclass(frozen=True)
+class _Param:
+    """Место литерала в плане; field и field_type — для проверки значения."""
+
+    index: int
+    field: str | None = None
+    field_type: str | None = None
+    # значение — список литералов (in [..])
+    many: bool = False
+
+
+@dataclass(frozen=True)
+class _Terms:
+    """Значения terms из нескольких условий: скаляры и списки in подряд."""
+
+    items: tuple[Any, ...]
+
+
+def _bind(node: Any, values: Sequence[Any]) -> Any:
+    if isinstance(node, _Param):
+        value = values[node.index]
+        if node.field_type is not None:
+            for item in value if node.many else (value,):
+                DSLTranslator._check_value(node.field, node.field_type, item)  # type: ignore[arg-type]
+        return value
+    if isinstance(node, _Terms):
+        terms: list[Any] = []
+        for item in node.items:
+            if isinstance(item, _Param) and item.many:
+                terms.extend(_bind(item, values))
+            else:
+                terms.append(_bind(item, values))
+        return terms
+    if isinstance(node, dict):
+        return {key: _bind(item, values) for key, item in node.items()}
+    if isinstance(node, list):
+        return [_bind(item, values) for item in node]
+    return node
+
+
+@dataclass(frozen=True)
+class CompiledSearchSchema:
+    """
+    Схема поиска вместе со всем, что из неё выводится: ES-поля, маппинг
+    индекса и проекция документа считаются один раз при загрузке,
+    а не на каждый поиск или индексацию.
+    """
+
+    schema: dict[str, Any]
+    version: int
+    fields: frozenset[str]
+    mapping: dict
+    projector: JsonProjector
+    # ES-поле -> тип из схемы, для проверки литералов в запросе
+    types: dict[str, str]
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """
+    ES-запрос, собранный по форме выражения: на местах литералов параметры,
+    значения подставляются и проверяются по типам полей в bind.
+    """
+
+    query: dict
+    types: Mapping[str, str]
+
+    def bind(self, values: Sequence[Any]) -> dict:
+        return _bind(self.query, values)
+
+
+class QueryPlanCache:
+    """
+    LRU планов запросов по ключу (неймспейс, версия схемы, форма выражения).
+    Форма — токены выражения без значений литералов, поэтому запросы,
+    отличающиеся только значениями, разбираются и транслируются один раз.
+    """
+
+    def __init__(self, maxsize: int = QUERY_PLAN_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._plans: OrderedDict[Hashable, QueryPlan] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def clear(self) -> None:
+        self._plans.clear()
+
+    def build_query(
+        self,
+        namespace: str,
+        schema: CompiledSearchSchema,
+        expr: str,
+    ) -> dict:
+        shape, values = DSLTranslator.parameterize(expr)
+        key = (namespace, schema.version, shape)
+        plan = self._plans.get(key)
+        # та же версия после пересоздания неймспейса — уже другая схема
+        if plan is None or plan.types is not schema.types:
+            plan = DSLTranslator.compile_plan(shape, schema.types)
+            self._plans[key] = plan
+            if len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+        else:
+            self._plans.move_to_end(key)
+        return plan.bind(values)
+
 
 class DSLTranslator:
     @staticmethod
@@ -68,24 +257,51 @@ class DSLTranslator:
         return EsPath(field=field, is_nested=True, nested_path=nested_path)
 
     @staticmethod
-    def schema_to_es_mapping(search_schema: dict[str, str]) -> dict:
+    def parse_schema(search_schema: Mapping[str, Any]) -> dict[str, SearchField]:
+        """
+        Поля схемы поиска в одном виде. Поле задаётся строкой JSONPath
+        (тип keyword) или объектом {"path": "$.price", "type": "double"}.
+        """
+        fields: dict[str, SearchField] = {}
+        for logical_name, spec in search_schema.items():
+            if isinstance(spec, str):
+                fields[logical_name] = SearchField(path=spec)
+                continue
+            if not isinstance(spec, Mapping) or not isinstance(spec.get('path'), str):
+                raise ValueError(
+                    f'Field {logical_name!r}: expected JSONPath string '
+                    'or object with "path"'
+                )
+            field_type = spec.get('type', 'keyword')
+            if field_type not in FIELD_TYPES:
+                raise ValueError(
+                    f'Field {logical_name!r}: unsupported type {field_type!r}, '
+                    f'expected one of {sorted(FIELD_TYPES)}'
+                )
+            fields[logical_name] = SearchField(path=spec['path'], type=field_type)
+        return fields
+
+    @staticmethod
+    def schema_to_es_mapping(search_schema: Mapping[str, Any]) -> dict:
         properties: dict = {}
         nested_props: dict[str, dict] = defaultdict(
             lambda: {'type': 'nested', 'properties': {}}
         )
 
-        for logical_name, json_path in search_schema.items():
-            segments: list[PathSegment] = JSONPathParser.parse_json_path(json_path)
+        for search_field in DSLTranslator.parse_schema(search_schema).values():
+            segments: list[PathSegment] = JSONPathParser.parse_json_path(
+                search_field.path
+            )
             es_path: EsPath = DSLTranslator.to_es_path(segments)
 
-            if es_path.is_nested:
-                nested_path = es_path.nested_path
+            nested_path = es_path.nested_path
+            if es_path.is_nested and nested_path is not None:
                 inner_name = es_path.field[len(nested_path) + 1 :]
                 nested_props[nested_path]['properties'][inner_name] = {
-                    'type': 'keyword'
+                    'type': search_field.type
                 }
             else:
-                properties[es_path.field] = {'type': 'keyword'}
+                properties[es_path.field] = {'type': search_field.type}
 
         for nested_path, nested_def in nested_props.items():
             properties[nested_path] = nested_def
@@ -93,7 +309,33 @@ class DSLTranslator:
         return {'mappings': {'properties': properties}}
 
     @staticmethod
-    def build_query_from_expression(expr: str) -> dict:
+    def compile_schema(
+        search_schema: dict[str, Any],
+        version: int = 0,
+    ) -> CompiledSearchSchema:
+        parsed = DSLTranslator.parse_schema(search_schema)
+        types = {
+            DSLTranslator.to_es_path(
+                JSONPathParser.parse_json_path(search_field.path)
+            ).field: search_field.type
+            for search_field in parsed.values()
+        }
+        return CompiledSearchSchema(
+            schema=search_schema,
+            version=version,
+            fields=frozenset(types),
+            mapping=DSLTranslator.schema_to_es_mapping(search_schema),
+            projector=JsonProjector.from_paths(
+                search_field.path for search_field in parsed.values()
+            ),
+            types=types,
+        )
+
+    @staticmethod
+    def build_query_from_expression(
+        expr: str,
+        types: Mapping[str, str] | None = None,
+    ) -> dict:
         """
         Принимает строку вида:
 
@@ -103,150 +345,151 @@ class DSLTranslator:
 
         и возвращает ES-запрос:
 
-            {'query': {'term': {'status': 'paid'}}}
-            {'query': {'bool': {'must': [{'range': {'price': {...}}}, {'range': {'price': {...}}}]}}}
-            {'query': {'bool': {'minimum_should_match': 1, 'should': [{'nested': {'path': 'items', 'query': {...}}}, {'term': {'tags': 'hot'}}]}}}
+            {'query': {'bool': {'filter': [{'term': {'status': 'paid'}}]}}}
+            {'query': {'bool': {'filter': [{'range': {'price': {...}}}, {'range': {'price': {...}}}]}}}
+            {'query': {'bool': {'filter': [{'bool': {'should': [{'nested': {'path': 'items', 'query': {...}}}, {'term': {'tags': 'hot'}}], 'minimum_should_match': 1}}]}}}
+
+        Запрос целиком в filter-контексте: релевантность не считается,
+        а условия кэшируются Elasticsearch. Цепочки && и || разворачиваются
+        в один bool, условия одной такой цепочки по одному nested_path
+        собираются в один nested-запрос (для && — по одному элементу массива).
 
         Поддерживается:
-        - операторы: ==, !=, >, >=, <, <=
+        - операторы: ==, !=, >, >=, <, <=, in [..], not in [..]
         - логика: &&, ||, !, скобки (...)
         - значения: строки "text", числа 10 / 10.5, true/false
-        """
-        tokens = DSLTranslator._tokenize(expr)
-        ast, pos = DSLTranslator._parse_expression(tokens, 0)
-        if pos != len(tokens):
-            raise ValueError('Unexpected tokens at end of expression')
-        clause = DSLTranslator._expr_to_es(ast)
-        return {'query': clause}
-
-    @staticmethod
-    def _tokenize(s: str) -> list[tuple[str, Any]]:
-        tokens: list[tuple[str, Any]] = []
-        i = 0
-        n = len(s)
-
-        def peek2(i: int) -> str:
-            return s[i : i + 2]
-
-        while i < n:
-            ch = s[i]
-            if ch.isspace():
-                i += 1
-                continue
-
-            if ch == '$':
-                start = i
-                i += 1
-                while i < n:
-                    if s[i].isspace():
-                        break
-                    if s[i] in ('(', ')', '!', '>', '<'):
-                        break
-                    two = peek2(i)
-                    if two in ('==', '!=', '>=', '<=', '&&', '||'):
-                        break
-                    i += 1
-                path = s[start:i]
-                tokens.append(('PATH', path))
-                continue
 
-            two = peek2(i)
+        in становится запросом terms; в него же сводятся цепочки ||
+        из равенств по одному полю (и != через && — в must_not).
 
-            if two == '&&':
-                tokens.append(('AND', '&&'))
-                i += 2
-                continue
-            if two == '||':
-                tokens.append(('OR', '||'))
-                i += 2
-                continue
-
-            if two == '!=':
-                tokens.append(('OP', '!='))
-                i += 2
-                continue
-            if ch == '!':
-                tokens.append(('NOT', '!'))
-                i += 1
-                continue
+        types — типы полей схемы (CompiledSearchSchema.types): литералы
+        проверяются по типу поля, для text равенство становится match.
+        Поля вне схемы не проверяются.
+        """
+        shape, values = DSLTranslator.parameterize(expr)
+        return DSLTranslator.compile_plan(shape, types or {}).bind(values)
 
-            if two == '==':
-                tokens.append(('OP', '=='))
-                i += 2
-                continue
-            if two == '>=':
-                tokens.append(('OP', '>='))
-                i += 2
-                continue
-            if two == '<=':
-                tokens.append(('OP', '<='))
-                i += 2
-                continue
-            if ch == '>':
-                tokens.append(('OP', '>'))
-                i += 1
-                continue
-            if ch == '<':
-                tokens.append(('OP', '<'))
-                i += 1
-                continue
+    @staticmethod
+    def parameterize(expr: str) -> tuple[tuple[tuple[str, Any], ...], list[Any]]:
+        """
+        Форма выражения и значения его литералов:
 
-            if ch == '(':
-                tokens.append(('LPAREN', ch))
-                i += 1
-                continue
-            if ch == ')':
-                tokens.append(('RPAREN', ch))
-                i += 1
-                continue
+            $.price > 10 && $.status == "paid"
+            -> ((PATH, $.price), (OP, >), (NUMBER, None), (AND, &&), ...), [10, 'paid']
 
-            if ch == '"':
-                j = i + 1
-                buf = []
-                while j < n and s[j] != '"':
-                    buf.append(s[j])
-                    j += 1
-                if j >= n or s[j] != '"':
-                    raise ValueError('Unterminated string literal')
-                value = ''.join(buf)
-                tokens.append(('STRING', value))
-                i = j + 1
-                continue
+        Список [..] становится одним токеном LIST со списком значений,
+        поэтому форма не зависит от его длины.
+        """
+        shape: list[tuple[str, Any]] = []
+        values: list[Any] = []
+        items: list[Any] | None = None
+        expect_item = False
+        for kind, value in DSLTranslator._tokenize(expr):
+            if items is None:
+                if kind == 'LBRACKET':
+                    items = []
+                    expect_item = True
+                elif kind in _LITERALS:
+                    shape.append((kind, None))
+                    values.append(value)
+                elif kind == 'RBRACKET' or kind == 'COMMA':
+                    raise ValueError(f'Unexpected {value!r} outside of a list')
+                else:
+                    shape.append((kind, value))
+            elif kind == 'RBRACKET' and (not expect_item or not items):
+                shape.append(('LIST', None))
+                values.append(items)
+                items = None
+            elif expect_item and kind in _SCALARS:
+                items.append(value)
+                expect_item = False
+            elif not expect_item and kind == 'COMMA':
+                expect_item = True
+            else:
+                raise ValueError(f'Unexpected {value!r} in list')
+        if items is not None:
+            raise ValueError("Missing ']'")
+        return tuple(shape), values
 
-            if ch.isdigit() or (ch == '-' and i + 1 < n and s[i + 1].isdigit()):
-                j = i
-                has_dot = False
-                while j < n and (s[j].isdigit() or s[j] in ('.', 'e', 'E', '+', '-')):
-                    if s[j] == '.':
-                        has_dot = True
-                    j += 1
-                num_str = s[i:j]
-                try:
-                    value = float(num_str) if has_dot else int(num_str)
-                except ValueError:
-                    raise ValueError(f'Invalid number literal: {num_str!r}')
-                tokens.append(('NUMBER', value))
-                i = j
-                continue
+    @staticmethod
+    def compile_plan(
+        shape: Sequence[tuple[str, Any]],
+        types: Mapping[str, str],
+    ) -> QueryPlan:
+        tokens: list[tuple[str, Any]] = []
+        params = 0
+        for kind, value in shape:
+            if kind in _LITERALS:
+                value = _Param(index=params, many=kind == 'LIST')
+                params += 1
+            tokens.append((kind, value))
+        ast, pos = DSLTranslator._parse_expression(tokens, 0)
+        if pos != len(tokens):
+            raise ValueError('Unexpected tokens at end of expression')
+        clause = DSLTranslator._expr_to_es(ast, types)
+        bool_clause = clause.get('bool')
+        if bool_clause is None or 'should' in bool_clause:
+            clause = {'bool': {'filter': [clause]}}
+        return QueryPlan(query={'query': clause}, types=types)
 
-            if ch.isalpha():
-                j = i
-                while j < n and s[j].isalpha():
-                    j += 1
-                word = s[i:j]
-                if word == 'true':
-                    tokens.append(('BOOL', True))
-                elif word == 'false':
-                    tokens.append(('BOOL', False))
-                elif word == 'null':
-                    tokens.append(('NULL', None))
-                else:
-                    raise ValueError(f'Unexpected identifier: {word!r}')
-                i = j
-                continue
+    @staticmethod
+    def build_sort(sort: str | None, types: Mapping[str, str]) -> list[Any]:
+        """
+        Ключи сортировки "$.price:desc,$.createdAt" ->
+        [{'price': {'order': 'desc'}}, {'createdAt': {'order': 'asc'}}].
 
-            raise ValueError(f'Unexpected character: {ch!r}')
+        Сортировать можно по полям схемы, кроме text. Без ключей — порядок
+        индекса (_shard_doc): самый дешёвый для прохода по всей выдаче.
+        """
+        if sort is None or not sort.strip():
+            return ['_shard_doc']
+        keys: list[Any] = []
+        for item in sort.split(','):
+            path, _, order = item.strip().partition(':')
+            order = order.strip() or 'asc'
+            if order not in ('asc', 'desc'):
+                raise ValueError(f'Invalid sort order {order!r} for {path!r}')
+            es_path = DSLTranslator.to_es_path(JSONPathParser.parse_json_path(path))
+            field_type = types.get(es_path.field)
+            if field_type is None:
+                raise ValueError(f'Sort field {path!r} is not in the search schema')
+            if field_type == 'text':
+                raise ValueError(f'Cannot sort by text field {path!r}')
+            key: dict[str, Any] = {'order': order}
+            if es_path.is_nested:
+                key['nested'] = {'path': es_path.nested_path}
+            keys.append({es_path.field: key})
+        return keys
 
+    @staticmethod
+    def _tokenize(s: str) -> list[tuple[str, Any]]:
+        """
+        Один проход мастер-регулярным выражением _TOKEN_RE: каждое
+        совпадение — токен вместе с пробелами перед ним, ошибки —
+        с позицией в строке.
+        """
+        tokens: list[tuple[str, Any]] = []
+        for m in _TOKEN_RE.finditer(s):
+            kind = m.lastgroup
+            if kind is None:
+                # не бывает: все альтернативы _TOKEN_RE — именованные группы
+                raise ValueError(f'Unexpected {m[0]!r} at position {m.start()}')
+            text = m[kind]
+            if kind in _TOKEN_VALUES:
+                tokens.append((kind, text))
+            elif kind == 'STRING':
+                tokens.append(('STRING', text))
+            elif kind == 'NUMBER':
+                is_float = '.' in text or 'e' in text or 'E' in text
+                tokens.append(('NUMBER', float(text) if is_float else int(text)))
+            elif kind == 'IN':
+                tokens.append(('OP', 'in' if text == 'in' else 'not in'))
+            elif kind == 'WORD' and text in _WORDS:
+                tokens.append(_WORDS[text])
+            else:
+                raise ValueError(
+                    f'{_TOKEN_ERRORS[kind].format(text)} at position {m.start(kind)}'
+                )
         return tokens
 
     @staticmethod
@@ -300,13 +543,19 @@ class DSLTranslator:
             if p >= len(tokens):
                 raise ValueError('Expected value after operator')
             ttype, value = tokens[p]
-            if ttype not in ('STRING', 'NUMBER', 'BOOL', 'NULL'):
+            if op in ('in', 'not in'):
+                if ttype != 'LIST':
+                    raise ValueError(f'Expected list [...] after {op!r}')
+            elif ttype not in _SCALARS:
                 raise ValueError('Expected literal value')
             p += 1
 
             if op == '!=':
                 inner = Condition(path=path, op='==', value=value)
                 return NotExpr(expr=inner), p
+            if op == 'not in':
+                inner = Condition(path=path, op='in', value=value)
+                return NotExpr(expr=inner), p
 
             return Condition(path=path, op=op, value=value), p
 
@@ -314,16 +563,65 @@ class DSLTranslator:
         return node, pos2
 
     @staticmethod
-    def _expr_to_es(expr: Expr) -> dict:
+    def _check_operator(field: str, field_type: str, op: str) -> None:
+        if (op in _RANGE_OPS and field_type not in _RANGE_TYPES) or (
+            op == 'in' and field_type == 'text'
+        ):
+            raise ValueError(
+                f'Operator {op!r} is not supported for {field_type} field {field!r}'
+            )
+
+    @staticmethod
+    def _check_value(field: str, field_type: str, value: Any) -> None:
+        if field_type == 'keyword':
+            # поля без типа в схеме тоже keyword: ES сравнивает числа
+            # и true/false с их строковым видом, как было до типов
+            valid = isinstance(value, (str, int, float))
+        elif field_type == 'text':
+            valid = isinstance(value, str)
+        elif field_type == 'long':
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        elif field_type == 'double':
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        elif field_type == 'boolean':
+            valid = isinstance(value, bool)
+        elif field_type == 'date':
+            # ISO 8601 строкой или epoch millis числом, как принимает ES
+            if isinstance(value, str):
+                try:
+                    datetime.fromisoformat(value)
+                    valid = True
+                except ValueError:
+                    valid = False
+            else:
+                valid = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            valid = True
+        if not valid:
+            raise ValueError(
+                f'Invalid literal {value!r} for {field_type} field {field!r}'
+            )
+
+    @staticmethod
+    def _expr_to_es(expr: Expr, types: Mapping[str, str]) -> dict:
         if isinstance(expr, Condition):
             segments = JSONPathParser.parse_json_path(expr.path)
             es_path = DSLTranslator.to_es_path(segments)
-
-            if expr.op == '==':
-                inner: dict[str, Any] = {'term': {es_path.field: expr.value}}
+            field_type = types.get(es_path.field)
+            value = expr.value
+            if field_type is not None:
+                DSLTranslator._check_operator(es_path.field, field_type, expr.op)
+                value = DSLTranslator._typed_value(es_path.field, field_type, value)
+
+            if expr.op == '==' and field_type == 'text':
+                inner: dict[str, Any] = {'match': {es_path.field: value}}
+            elif expr.op == '==':
+                inner = {'term': {es_path.field: value}}
+            elif expr.op == 'in':
+                inner = {'terms': {es_path.field: value}}
             elif expr.op in ('>', '>=', '<', '<='):
                 op_map = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}
-                inner = {'range': {es_path.field: {op_map[expr.op]: expr.value}}}
+                inner = {'range': {es_path.field: {op_map[expr.op]: value}}}
             else:
                 raise ValueError(f'Unsupported operator: {expr.op!r}')
 
@@ -337,22 +635,140 @@ class DSLTranslator:
             return inner
 
         if isinstance(expr, NotExpr):
-            clause = DSLTranslator._expr_to_es(expr.expr)
+            clause = DSLTranslator._expr_to_es(expr.expr, types)
             return {'bool': {'must_not': [clause]}}
 
         if isinstance(expr, AndExpr):
-            left = DSLTranslator._expr_to_es(expr.left)
-            right = DSLTranslator._expr_to_es(expr.right)
-            return {'bool': {'must': [left, right]}}
+            filters: list[dict] = []
+            negated: list[Expr] = []
+            for operand in DSLTranslator._flatten(expr, AndExpr):
+                if isinstance(operand, NotExpr):
+                    negated.append(operand.expr)
+                else:
+                    filters.append(DSLTranslator._expr_to_es(operand, types))
+            # a != 1 && a != 2 — то же, что !(a == 1 || a == 2)
+            must_not = [
+                DSLTranslator._expr_to_es(operand, types)
+                for operand in DSLTranslator._merge_equalities(negated, types)
+            ]
+            bool_clause: dict[str, Any] = {}
+            if filters:
+                bool_clause['filter'] = DSLTranslator._merge_nested(filters, 'filter')
+            if must_not:
+                bool_clause['must_not'] = must_not
+            return {'bool': bool_clause}
 
         if isinstance(expr, OrExpr):
-            left = DSLTranslator._expr_to_es(expr.left)
-            right = DSLTranslator._expr_to_es(expr.right)
+            operands = DSLTranslator._merge_equalities(
+                DSLTranslator._flatten(expr, OrExpr), types
+            )
+            should = [DSLTranslator._expr_to_es(operand, types) for operand in operands]
+            if len(should) == 1:
+                return should[0]
             return {
                 'bool': {
-                    'should': [left, right],
+                    'should': DSLTranslator._merge_nested(should, 'should'),
                     'minimum_should_match': 1,
                 }
             }
 
         raise TypeError(f'Unsupported expression node: {expr!r}')
+
+    @staticmethod
+    def _typed_value(field: str, field_type: str, value: Any) -> Any:
+        """Параметры плана помечаются типом поля, готовые значения проверяются."""
+        if isinstance(value, _Param):
+            # значение проверится при подстановке в план
+            return replace(value, field=field, field_type=field_type)
+        if isinstance(value, _Terms):
+            return _Terms(
+                tuple(
+                    DSLTranslator._typed_value(field, field_type, item)
+                    for item in value.items
+                )
+            )
+        for item in value if isinstance(value, list) else (value,):
+            DSLTranslator._check_value(field, field_type, item)
+        return value
+
+    @staticmethod
+    def _merge_equalities(
+        operands: list[Expr],
+        types: Mapping[str, str],
+    ) -> list[Expr]:
+        """
+        Операнды цепочки ||: условия == и in по одному полю — одно условие in
+        (запрос terms) на месте первого из них. Поля text не объединяются:
+        равенство для них — match.
+        """
+        groups: dict[str, list[Condition]] = defaultdict(list)
+        for operand in operands:
+            if isinstance(operand, Condition) and operand.op in ('==', 'in'):
+                groups[operand.path].append(operand)
+
+        merged: list[Expr] = []
+        for operand in operands:
+            if not isinstance(operand, Condition) or operand.op not in ('==', 'in'):
+                merged.append(operand)
+                continue
+            group = groups.pop(operand.path, None)
+            if group is None:
+                continue
+            field = DSLTranslator.to_es_path(
+                JSONPathParser.parse_json_path(operand.path)
+            ).field
+            if len(group) == 1 or types.get(field) == 'text':
+                merged.extend(group)
+                continue
+            merged.append(
+                Condition(
+                    path=operand.path,
+                    op='in',
+                    value=_Terms(tuple(condition.value for condition in group)),
+                )
+            )
+        return merged
+
+    @staticmethod
+    def _flatten(expr: Expr, kind: type[AndExpr] | type[OrExpr]) -> list[Expr]:
+        """Операнды цепочки a && b && c (или ||) одним списком, слева направо."""
+        operands: list[Expr] = []
+        stack: list[Expr] = [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, kind):
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                operands.append(node)
+        return operands
+
+    @staticmethod
+    def _merge_nested(clauses: list[dict], occur: str) -> list[dict]:
+        """
+        nested-условия с одним path — в один nested на месте первого из них.
+        Для should это равносильная запись, для filter — условия на один
+        и тот же элемент массива, как и ожидается от nested-поля.
+        """
+        queries: dict[str, list[dict]] = defaultdict(list)
+        for clause in clauses:
+            if 'nested' in clause:
+                queries[clause['nested']['path']].append(clause['nested']['query'])
+
+        merged: list[dict] = []
+        for clause in clauses:
+            if 'nested' not in clause:
+                merged.append(clause)
+                continue
+            path = clause['nested']['path']
+            inner = queries.pop(path, None)
+            if inner is None:
+                continue
+            if len(inner) == 1:
+                merged.append(clause)
+                continue
+            bool_clause: dict[str, Any] = {occur: inner}
+            if occur == 'should':
+                bool_clause['minimum_should_match'] = 1
+            merged.append({'nested': {'path': path, 'query': {'bool': bool_clause}}})
+        return merged
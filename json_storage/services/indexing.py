@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import re
+import uuid
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any
+
+from json_storage.repositories import ElasticSearchDBRepository, PostgresDBRepository
+from json_storage.repositories.postgres import STORAGE_POSTGRES
+from json_storage.schemas import DocumentSchema
+
+from .dsl_translator import CompiledSearchSchema, DSLTranslator
+from .json_projection import JsonProjector
+from .multi_repository_service import MultiRepositoryService
+from .refresh import RefreshPolicy
+
+logger = logging.getLogger(__name__)
+
+
+# перевод строки в JSON допустим только как пробельный символ между токенами —
+# внутри строковых литералов он обязан быть экранирован, так что замена безопасна
+_NEWLINES_TO_SPACES = bytes.maketrans(b'\r\n', b'  ')
+_WHITESPACE = frozenset(b' \t\r\n')
+_SIGNIFICANT = re.compile(rb'[^ \t\r\n]')
+
+
+class BulkItemError(Exception):
+    """Elasticsearch отклонил документ в составе _bulk."""
+
+
+class DocumentTooLarge(ValueError):
+    """Тело документа больше допустимого для индексации в памяти воркера."""
+
+
+class SourceBuffer:
+    """
+    Собирает тело документа из частей json_chunks в готовый для Elasticsearch
+    _source без разбора JSON: в памяти только сами байты, одна копия.
+    BytesIO отдаёт накопленное как bytes без копирования, в отличие от
+    bytes(bytearray), который удвоил бы пик памяти.
+
+    Полную проверку JSON делает Elasticsearch; здесь — только что это объект.
+    single_line — заменить переводы строк пробелами (строка NDJSON для _bulk),
+    замена идёт по частям, а не по всему телу.
+    """
+
+    def __init__(self, max_bytes: int, *, single_line: bool = False) -> None:
+        self.max_bytes = max_bytes
+        self.single_line = single_line
+        self._buf = io.BytesIO()
+
+    def write(self, chunk: bytes) -> None:
+        if self._buf.tell() + len(chunk) > self.max_bytes:
+            raise DocumentTooLarge(
+                f'Document exceeds {self.max_bytes} bytes allowed for indexing'
+            )
+        if self.single_line:
+            chunk = chunk.translate(_NEWLINES_TO_SPACES)
+        self._buf.write(chunk)
+
+    def getvalue(self) -> bytes:
+        source = self._buf.getvalue()
+        self._buf = io.BytesIO()
+        check_object_source(source)
+        return source
+
+
+def check_object_source(source: bytes) -> None:
+    """Проверяет по первому и последнему значимым байтам, что тело — JSON-объект."""
+    first = _SIGNIFICANT.search(source)
+    last = len(source) - 1
+    while last >= 0 and source[last] in _WHITESPACE:
+        last -= 1
+    if first is None or source[first.start()] != ord('{') or source[last] != ord('}'):
+        raise TypeError('Only JSON objects (dict) are supported for indexing')
+
+
+class _Chunks:
+    """Части тела документа в памяти для проекции без повторного чтения."""
+
+    def __init__(self) -> None:
+        self.parts: list[bytes] = []
+        self.size = 0
+
+    def append(self, chunk: bytes) -> None:
+        self.parts.append(chunk)
+        self.size += len(chunk)
+
+    async def iterate(self) -> AsyncGenerator[bytes, None]:
+        for part in self.parts:
+            yield part
+
+
+@dataclass
+class _Pending:
+    namespace: str
+    object_id: str
+    future: asyncio.Future[None]
+
+
+@dataclass
+class BulkIndexer:
+    """
+    Собирает задачи индексации воркера в пачки: пачка закрывается по batch_size
+    документов или по окну batch_window, метаданные и части документов читаются
+    одним запросом на пачку, в Elasticsearch уходит один _bulk на каждые
+    batch_bytes тела.
+
+    Каждая задача ждёт результат своего документа: при отказе Elasticsearch
+    по конкретному документу ошибку получает только его задача, и taskiq
+    повторяет лишь её. Один экземпляр на процесс (APP-скоуп).
+
+    Для пространств с телами в Postgres в индекс уходит только проекция
+    на поля схемы поиска, а части документа остаются в json_chunks.
+    """
+
+    postgres: PostgresDBRepository
+    elastic: ElasticSearchDBRepository
+    batch_size: int = 500
+    batch_window: float = 0.05
+    batch_bytes: int = 16 * 1024 * 1024
+    max_document_bytes: int = 512 * 1024 * 1024
+    # без политики пачки пишутся с refresh=wait_for
+    refresh_policy: RefreshPolicy | None = None
+    _pending: list[_Pending] = field(init=False, default_factory=list)
+    _timer: asyncio.TimerHandle | None = field(init=False, default=None)
+    _flushes: set[asyncio.Task[None]] = field(init=False, default_factory=set)
+    _indices: set[str] = field(init=False, default_factory=set)
+
+    async def index(self, namespace: str, object_id: str) -> None:
+        """Ставит документ в текущую пачку и ждёт, пока пачка будет проиндексирована."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+        self._pending.append(_Pending(namespace, str(uuid.UUID(object_id)), future))
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._flush)
+
+        await future
+
+    async def aclose(self) -> None:
+        """Отправляет незакрытую пачку и дожидается всех отправок."""
+        self._flush()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._index_batch(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _index_batch(self, batch: list[_Pending]) -> None:
+        try:
+            await self._index_batch_unsafe(batch)
+        except Exception as exc:
+            logger.exception('Bulk indexing of %d documents failed', len(batch))
+            _fail(batch, exc)
+        finally:
+            # отменённая отправка не должна оставить задачи ждать вечно
+            _fail(batch, RuntimeError('Bulk indexing was interrupted'))
+
+    async def _index_batch_unsafe(self, batch: list[_Pending]) -> None:
+        by_namespace: dict[str, list[_Pending]] = {}
+        for item in batch:
+            by_namespace.setdefault(item.namespace, []).append(item)
+
+        waiting: dict[str, list[_Pending]] = {}
+        metas: list[tuple[str, DocumentSchema]] = []
+        for namespace, items in by_namespace.items():
+            for item in items:
+                waiting.setdefault(item.object_id, []).append(item)
+            await self._ensure_index(namespace)
+            found = await self.postgres.get_documents_meta(
+                namespace, {item.object_id for item in items}
+            )
+            for meta in found:
+                # проекция читается потоком, ограничение — только для тела целиком
+                if (
+                    meta.storage != STORAGE_POSTGRES
+                    and meta.content_length > self.max_document_bytes
+                ):
+                    _fail(
+                        waiting.pop(meta.id),
+                        DocumentTooLarge(
+                            f'Document exceeds {self.max_document_bytes} bytes '
+                            'allowed for indexing'
+                        ),
+                    )
+                else:
+                    metas.append((namespace, meta))
+
+        for group in self._split_by_bytes(metas):
+            await self._send(group, waiting)
+
+        # документ удалён раньше, чем до него дошла очередь, — индексировать нечего
+        for items in waiting.values():
+            for item in items:
+                if not item.future.done():
+                    item.future.set_result(None)
+
+    def _split_by_bytes(
+        self,
+        metas: list[tuple[str, DocumentSchema]],
+    ) -> list[list[tuple[str, DocumentSchema]]]:
+        groups: list[list[tuple[str, DocumentSchema]]] = []
+        group: list[tuple[str, DocumentSchema]] = []
+        size = 0
+        for namespace, meta in metas:
+            # тела, остающиеся в Postgres, тоже читаются в память пачки для проекции
+            if group and size + meta.content_length > self.batch_bytes:
+                groups.append(group)
+                group, size = [], 0
+            group.append((namespace, meta))
+            size += meta.content_length
+        if group:
+            groups.append(group)
+        return groups
+
+    async def _send(
+        self,
+        group: list[tuple[str, DocumentSchema]],
+        waiting: dict[str, list[_Pending]],
+    ) -> None:
+        sources = {
+            meta.id: SourceBuffer(self.max_document_bytes, single_line=True)
+            for _, meta in group
+            if meta.storage != STORAGE_POSTGRES
+        }
+        # тела, остающиеся в Postgres, читаются тем же запросом, что и _source
+        # остальных, а проекция считается по накопленным частям; тело больше
+        # max_document_bytes проецируется отдельным потоковым чтением
+        projected: dict[str, _Chunks] = {
+            meta.id: _Chunks() for _, meta in group if meta.storage == STORAGE_POSTGRES
+        }
+        oversized: set[str] = set()
+        failed: dict[str, Exception] = {}
+        async for doc_id, chunk in self.postgres.iter_bodies(
+            [meta for _, meta in group if meta.id in sources or meta.id in projected]
+        ):
+            if doc_id in failed or doc_id in oversized:
+                continue
+            body = projected.get(doc_id)
+            if body is not None:
+                if body.size + len(chunk) > self.max_document_bytes:
+                    oversized.add(doc_id)
+                    del projected[doc_id]
+                else:
+                    body.append(chunk)
+                continue
+            try:
+                sources[doc_id].write(chunk)
+            except DocumentTooLarge as exc:
+                failed[doc_id] = exc
+
+        operations: list[Any] = []
+        sent: list[str] = []
+        namespaces: set[str] = set()
+        retained: set[str] = set()
+        projectors: dict[str, JsonProjector] = {}
+        for namespace, meta in group:
+            payload: Any
+            try:
+                if meta.storage == STORAGE_POSTGRES:
+                    # тело остаётся в Postgres, в индекс — только проекция
+                    projector = projectors.get(namespace)
+                    if projector is None:
+                        projector = await projector_for(self.postgres, namespace)
+                        projectors[namespace] = projector
+                    if meta.id in oversized:
+                        payload = await project_document(
+                            self.postgres, namespace, meta, projector
+                        )
+                    else:
+                        chunks = projected.pop(meta.id)
+                        payload = await projector.project(chunks.iterate())
+                elif meta.id in failed:
+                    raise failed[meta.id]
+                else:
+                    payload = sources.pop(meta.id).getvalue()
+                if meta.body_in_postgres:
+                    retained.add(meta.id)
+            except (ValueError, TypeError) as exc:
+                _fail(waiting.pop(meta.id), exc)
+                continue
+            operations.append({'index': {'_index': namespace, '_id': meta.id}})
+            operations.append(payload)
+            sent.append(meta.id)
+            namespaces.add(namespace)
+
+        if not sent:
+            return
+
+        refresh: str | None
+        if self.refresh_policy is None:
+            refresh = 'wait_for'
+        else:
+            refresh = self.refresh_policy.param_for_many(namespaces)
+        results = await self.elastic.bulk(operations, refresh=refresh)
+
+        indexed: list[str] = []
+        for doc_id, result in zip(sent, results, strict=True):
+            if 'error' in result:
+                error = result['error']
+                _fail(
+                    waiting.pop(doc_id),
+                    BulkItemError(f'{result.get("status")}: {error}'),
+                )
+            else:
+                indexed.append(doc_id)
+
+        if self.refresh_policy is not None:
+            for namespace in namespaces:
+                self.refresh_policy.written(namespace)
+        await self.postgres.delete_chunks_by_ids(
+            [doc_id for doc_id in indexed if doc_id not in retained]
+        )
+        for doc_id in indexed:
+            for item in waiting.pop(doc_id):
+                if not item.future.done():
+                    item.future.set_result(None)
+
+    async def _ensure_index(self, namespace: str) -> None:
+        if namespace in self._indices:
+            return
+        await self.elastic.ensure_index(index=namespace)
+        self._indices.add(namespace)
+
+
+async def search_schema_for(
+    postgres: PostgresDBRepository,
+    namespace: str,
+) -> CompiledSearchSchema | None:
+    """
+    Скомпилированная схема поиска неймспейса: из кеша процесса (его держит
+    в актуальном состоянии catalog_sync), при промахе — из каталога в Postgres.
+    """
+    compiled = MultiRepositoryService.SEARCH_SCHEMAS.get(namespace)
+    if compiled is not None:
+        return compiled
+    stored = await postgres.get_search_schema(namespace)
+    if stored is None:
+        return None
+    compiled = DSLTranslator.compile_schema(*stored)
+    MultiRepositoryService.SEARCH_SCHEMAS[namespace] = compiled
+    return compiled
+
+
+async def projector_for(
+    postgres: PostgresDBRepository,
+    namespace: str,
+) -> JsonProjector:
+    """Проектор схемы поиска неймспейса; без схемы — пустая проекция."""
+    compiled = await search_schema_for(postgres, namespace)
+    return compiled.projector if compiled else JsonProjector.from_paths([])
+
+
+async def project_document(
+    postgres: PostgresDBRepository,
+    namespace: str,
+    meta: DocumentSchema,
+    projector: JsonProjector | None = None,
+) -> dict[str, Any]:
+    """
+    Проекция тела документа из json_chunks на схему поиска неймспейса.
+    Без схемы проекция пустая: документ есть в индексе, но искать по нему нечем.
+    """
+    if projector is None:
+        projector = await projector_for(postgres, namespace)
+    async with aclosing(postgres.iter_body(meta)) as chunks:
+        return await projector.project(chunks)
+
+
+def _fail(items: list[_Pending], exc: BaseException) -> None:
+    for item in items:
+        if not item.future.done():
+            item.future.set_exception(exc)
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .jsonpath_parser import JSONPathParser
+
+# пропуск значения: за одно совпадение — целая строка или скобка, всё прочее
+# (числа, литералы, пробелы, запятые) регулярное выражение перешагивает само.
+# Группы: 1 — строка закрыта в этой части, 2 — часть кончилась на '\',
+# 3 — открывающая скобка, 4 — закрывающая
+_TOKENS = re.compile(rb'"[^"\\]*+(?:\\.[^"\\]*+)*+(")?(\\)?|([{\[])|([}\]])', re.DOTALL)
+# продолжение строки, начатой в предыдущей части; группы как у _TOKENS
+_STRING_REST = re.compile(rb'[^"\\]*+(?:\\.[^"\\]*+)*+(")?(\\)?', re.DOTALL)
+_SCALAR_END = re.compile(rb'[,}\]\s]')
+_SIGNIFICANT = re.compile(rb'[^ \t\r\n]')
+# быстрые пути для типичных ключей и скаляров, целиком лежащих в текущей части
+_SIMPLE_KEY = re.compile(rb'[ \t\r\n]*"([^"\\]*)"[ \t\r\n]*:')
+_SIMPLE_VALUE = re.compile(
+    rb'[ \t\r\n]*("[^"\\]*"|-?[0-9][0-9.eE+-]*|true|false|null)(?=[ \t\r\n,}\]])'
+)
+
+_MISSING = object()
+
+
+@dataclass
+class _Node:
+    children: dict[str, _Node] = field(default_factory=dict)
+    # значение по этому пути берётся целиком
+    leaf: bool = False
+
+
+class _Reader:
+    """
+    Потоковое чтение JSON по частям: значения, которые не нужны проекции,
+    пропускаются прыжками регулярного выражения по кавычкам и скобкам,
+    без разбора и без сборки тела в памяти.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buf = b''
+        self._pos = 0
+
+    async def _fill(self) -> bool:
+        async for chunk in self._chunks:
+            if chunk:
+                self._buf = bytes(chunk)
+                self._pos = 0
+                return True
+        return False
+
+    async def peek(self) -> int | None:
+        """Первый значимый байт без его потребления; None — конец документа."""
+        while True:
+            m = _SIGNIFICANT.search(self._buf, self._pos)
+            if m is not None:
+                self._pos = m.start()
+                return self._buf[self._pos]
+            if not await self._fill():
+                return None
+
+    async def expect(self, *allowed: bytes) -> int:
+        c = await self.peek()
+        if c is None or bytes((c,)) not in allowed:
+            found = 'end of document' if c is None else repr(chr(c))
+            raise ValueError(f'Invalid JSON: expected {allowed!r}, got {found}')
+        self._pos += 1
+        return c
+
+    async def key(self) -> str:
+        """Ключ объекта вместе с двоеточием после него."""
+        m = _SIMPLE_KEY.match(self._buf, self._pos)
+        if m is not None:
+            self._pos = m.end()
+            return m.group(1).decode()
+        if await self.peek() != ord('"'):
+            raise ValueError('Invalid JSON: object key must be a string')
+        key = json.loads(await self.value(capture=True))  # type: ignore[arg-type]
+        await self.expect(b':')
+        return key
+
+    async def value(self, capture: bool) -> bytes | None:
+        """Проходит одно значение целиком; при capture возвращает его байты."""
+        m = _SIMPLE_VALUE.match(self._buf, self._pos)
+        if m is not None:
+            self._pos = m.end(1)
+            return m.group(1) if capture else None
+
+        c = await self.peek()
+        if c is None:
+            raise ValueError('Invalid JSON: unexpected end of document')
+        if c in b'}],:':
+            raise ValueError(f'Invalid JSON: unexpected {chr(c)!r}')
+        if c not in b'{["':
+            return await self._scalar(capture)
+
+        parts: list[bytes] | None = [] if capture else None
+        start = self._pos
+        depth = 0
+        in_string = False
+        escaped = False
+
+        while True:
+            buf = self._buf
+            if in_string:
+                if escaped:
+                    if self._pos == len(buf):
+                        await self._next_part(parts, start)
+                        start = 0
+                        continue
+                    # экранированный символ оказался уже в следующей части
+                    self._pos += 1
+                    escaped = False
+                m = _STRING_REST.match(buf, self._pos)
+                if m.group(1) is None:  # type: ignore[union-attr]
+                    escaped = m.group(2) is not None  # type: ignore[union-attr]
+                    await self._next_part(parts, start)
+                    start = 0
+                    continue
+                self._pos = m.end()  # type: ignore[union-attr]
+                in_string = False
+                if depth == 0:
+                    break
+
+            done = False
+            for m in _TOKENS.finditer(buf, self._pos):
+                kind = m.lastindex
+                if kind == 3:
+                    depth += 1
+                elif kind == 4:
+                    depth -= 1
+                    if depth == 0:
+                        self._pos = m.end()
+                        done = True
+                        break
+                elif kind != 1:
+                    # строка не закрыта в этой части
+                    in_string = True
+                    escaped = kind == 2
+                    break
+                elif depth == 0:
+                    self._pos = m.end()
+                    done = True
+                    break
+            if done:
+                break
+            await self._next_part(parts, start)
+            start = 0
+
+        if parts is not None:
+            parts.append(self._buf[start : self._pos])
+            return b''.join(parts)
+        return None
+
+    async def _scalar(self, capture: bool) -> bytes | None:
+        # число, true, false, null
+        parts: list[bytes] | None = [] if capture else None
+        start = self._pos
+        while True:
+            m = _SCALAR_END.search(self._buf, self._pos)
+            if m is not None:
+                self._pos = m.start()
+                break
+            if parts is not None:
+                parts.append(self._buf[start:])
+            if not await self._fill():
+                self._pos = len(self._buf)
+                break
+            start = 0
+        if parts is not None:
+            parts.append(self._buf[start : self._pos])
+            return b''.join(parts)
+        return None
+
+    async def _next_part(self, parts: list[bytes] | None, start: int) -> None:
+        if parts is not None:
+            parts.append(self._buf[start:])
+        if not await self._fill():
+            raise ValueError('Invalid JSON: unexpected end of document')
+
+
+@dataclass(frozen=True)
+class JsonProjector:
+    """
+    Проекция документа на JSONPath схемы поиска: из документа остаются только
+    объявленные поля с сохранением их места в структуре, чтобы пути полей
+    в Elasticsearch (user.status, items.productId) совпадали с полными документами.
+
+    Элементы массивов проецируются каждый отдельно, поэтому условия по одному
+    nested-элементу продолжают работать. Документ читается потоком из частей,
+    разбираются лишь объекты на пути к полям схемы и сами значения полей.
+    """
+
+    root: _Node
+
+    @classmethod
+    def from_paths(cls, json_paths: Iterable[str]) -> JsonProjector:
+        root = _Node()
+        for json_path in json_paths:
+            segments = JSONPathParser.parse_json_path(json_path)
+            if not segments:
+                # '$' — весь документ
+                root.leaf = True
+                continue
+            node = root
+            for segment in segments:
+                node = node.children.setdefault(segment.name, _Node())
+            node.leaf = True
+        return cls(root=root)
+
+    async def project(self, chunks: AsyncIterator[bytes]) -> dict[str, Any]:
+        reader = _Reader(chunks)
+        if await reader.peek() != ord('{'):
+            raise TypeError('Only JSON objects (dict) are supported for indexing')
+
+        if self.root.leaf:
+            raw = await reader.value(capture=True)
+            result = json.loads(raw)  # type: ignore[arg-type]
+        else:
+            result = await self._object(reader, self.root)
+
+        if await reader.peek() is not None:
+            raise ValueError('Invalid JSON: unexpected data after document')
+        return result
+
+    async def _object(self, reader: _Reader, node: _Node) -> dict[str, Any]:
+        await reader.expect(b'{')
+        out: dict[str, Any] = {}
+        if await reader.peek() == ord('}'):
+            await reader.expect(b'}')
+            return out
+
+        while True:
+            key = await reader.key()
+            child = node.children.get(key)
+            if child is None:
+                await reader.value(capture=False)
+            elif child.leaf:
+                out[key] = json.loads(await reader.value(capture=True))  # type: ignore[arg-type]
+            else:
+                value = await self._value(reader, child)
+                if value is not _MISSING:
+                    out[key] = value
+
+            if await reader.expect(b',', b'}') == ord('}'):
+                return out
+
+    async def _value(self, reader: _Reader, node: _Node) -> Any:
+        c = await reader.peek()
+        if c == ord('{'):
+            projected = await self._object(reader, node)
+            return projected if projected else _MISSING
+        if c == ord('['):
+            # как и Elasticsearch, массив объектов проходим поэлементно
+            # вне зависимости от [*] в пути
+            return await self._array(reader, node)
+        await reader.value(capture=False)
+        return _MISSING
+
+    async def _array(self, reader: _Reader, node: _Node) -> Any:
+        await reader.expect(b'[')
+        items: list[Any] = []
+        if await reader.peek() == ord(']'):
+            await reader.expect(b']')
+            return _MISSING
+
+        while True:
+            value = await self._value(reader, node)
+            if value is not _MISSING:
+                items.append(value)
+            if await reader.expect(b',', b']') == ord(']'):
+                return items if items else _MISSING
@@ -1,6 +1,10 @@
 from dataclasses import dataclass
+from functools import lru_cache
 import re
 
+_ROOT_RE = re.compile(r'\$(?:\.(.*))?')
+_SEGMENT_RE = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)(\[\*\])?$')
+
 
 @dataclass(frozen=True)
 class PathSegment:
@@ -20,29 +24,32 @@ class JSONPathParser:
         - сегменты вида: name или name[*]
         - без фильтров, без '..', без [?()], без ['name']
         """
+        return list(JSONPathParser._parse(json_path))
 
-        m = re.fullmatch(r'\$(?:\.(.*))?', json_path.strip())
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _parse(json_path: str) -> tuple[PathSegment, ...]:
+        # пути схем и фильтров повторяются, разбор кэшируется
+        m = _ROOT_RE.fullmatch(json_path.strip())
         if not m:
             raise ValueError("Only absolute JSONPath starting with '$' is supported")
 
         inner = m.group(1)
         if not inner:
-            return []
+            return ()
 
         segments: list[PathSegment] = []
 
-        token_re = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)(\[\*\])?$')
-
         for raw in inner.split('.'):
             raw = raw.strip()
             if not raw:
                 raise ValueError(f'Empty path segment in {json_path!r}')
 
-            m = token_re.match(raw)
+            m = _SEGMENT_RE.match(raw)
             if not m:
                 raise ValueError(f'Unsupported JSONPath segment: {raw!r}')
 
             name, array_marker = m.group(1), m.group(2)
             segments.append(PathSegment(name=name, is_array=bool(array_marker)))
 
-        return segments
+        return tuple(segments)
@@ -1,24 +1,255 @@
 import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import re
 from typing import Any, ClassVar, TypeVar
 from uuid import UUID
 from collections.abc import AsyncIterator
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
+import psycopg
 from fastapi import HTTPException
-from .dsl_translator import DSLTranslator
+from .dsl_translator import CompiledSearchSchema, DSLTranslator, QueryPlanCache
+from .refresh import RefreshPolicy
 from json_storage.repositories import PostgresDBRepository, ElasticSearchDBRepository
-from json_storage.schemas import DocumentListSchema, DocumentSchema
+from json_storage.repositories.postgres import (
+    BULK_LOAD_CHANNEL,
+    NAMESPACES_CHANNEL,
+    SEARCH_SCHEMAS_CHANNEL,
+    STORAGE_POSTGRES,
+)
+from json_storage.schemas import (
+    DocumentListSchema,
+    DocumentMultiGetSchema,
+    DocumentSchema,
+    UploadPartSchema,
+    UploadSessionSchema,
+)
 
 JSONType = TypeVar('JSONType', bound=dict[str, Any])
 
+logger = logging.getLogger(__name__)
+
+
+def _encode_cursor(object_id: str) -> str:
+    return base64.urlsafe_b64encode(uuid.UUID(object_id).bytes).rstrip(b'=').decode()
+
+
+async def _single_chunk(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _read_head(
+    body: AsyncIterator[bytes],
+    limit: int,
+) -> tuple[bytes, AsyncIterator[bytes] | None]:
+    """
+    Читает начало потока, пока не наберётся больше limit байт. Если поток
+    кончился раньше — (всё тело, None), иначе — (прочитанное, весь поток
+    с прочитанным в начале).
+    """
+    head = bytearray()
+    stream = aiter(body)
+    async for chunk in stream:
+        head += chunk
+        if len(head) > limit:
+            return bytes(head), _prepend(bytes(head), stream)
+    return bytes(head), None
+
+
+async def _prepend(head: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield head
+    async for chunk in rest:
+        yield chunk
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Слабое сравнение ETag по RFC 9110 для If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(
+        candidate.strip().removeprefix('W/') == opaque
+        for candidate in if_none_match.split(',')
+    )
+
+
+# документов в одном _mget при выдаче тел пачкой
+MGET_BATCH = 100
+
+# документов на страницу search_after при выгрузке всей выдачи поиска
+SEARCH_EXPORT_BATCH = 1000
+# переводы строк внутри тела: в валидном JSON они бывают только между
+# токенами, поэтому замена на пробел делает тело одной строкой NDJSON
+_NEWLINES = bytes.maketrans(b'\r\n', b'  ')
+
+# пачка bulk-загрузки: закрывается по числу строк или по объёму тел
+BULK_BATCH_LINES = 1000
+BULK_BATCH_BYTES = 8 * 1024 * 1024
+# строка длиннее — ошибка этой строки; её байты не накапливаются
+BULK_MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+async def _ndjson_lines(
+    body: AsyncIterator[bytes],
+    max_line_bytes: int,
+) -> AsyncIterator[bytes | None]:
+    """
+    Строки NDJSON из потока запроса без завершающего перевода строки.
+    None вместо строки длиннее max_line_bytes.
+    """
+    buf = bytearray()
+    oversized = False
+    async for chunk in body:
+        start = 0
+        while True:
+            end = chunk.find(b'\n', start)
+            if end == -1:
+                if not oversized:
+                    buf += chunk[start:]
+                    if len(buf) > max_line_bytes:
+                        oversized = True
+                        buf.clear()
+                break
+            if not oversized:
+                buf += chunk[start:end]
+                oversized = len(buf) > max_line_bytes
+            yield None if oversized else bytes(buf)
+            buf.clear()
+            oversized = False
+            start = end + 1
+    if oversized:
+        yield None
+    elif buf:
+        yield bytes(buf)
+
+
+def _parse_bulk_lines(
+    lines: list[tuple[int, bytes | None]],
+    document_name: str,
+    name_field: str | None,
+) -> list[tuple[int, str, bytes] | tuple[int, str]]:
+    """
+    Проверяет строки пачки: (номер, имя, тело) для документа,
+    (номер, ошибка) для строки, которую сохранить нельзя.
+    """
+    parsed: list[tuple[int, str, bytes] | tuple[int, str]] = []
+    for line_number, line in lines:
+        if line is None:
+            parsed.append((line_number, f'Line exceeds {BULK_MAX_LINE_BYTES} bytes'))
+            continue
+        try:
+            document = json.loads(line)
+        except ValueError as exc:
+            parsed.append((line_number, f'Invalid JSON: {exc}'))
+            continue
+        if not isinstance(document, dict):
+            parsed.append(
+                (line_number, 'Only JSON objects (dict) are supported for indexing')
+            )
+            continue
+        name = document.get(name_field) if name_field else None
+        if name is None:
+            name = f'{document_name}-{line_number}'
+        elif not isinstance(name, str):
+            name = json.dumps(name, ensure_ascii=False)
+        parsed.append((line_number, name, line))
+    return parsed
+
+
+_BYTE_RANGE = re.compile(r'bytes=\s*(\d*)-(\d*)\s*')
+
+
+def _parse_range(range_header: str | None, length: int) -> tuple[int, int] | None:
+    """
+    Единственный диапазон bytes= из заголовка Range как (start, end) включительно.
+    Несколько диапазонов и нераспознанный заголовок игнорируются — отдаётся
+    всё тело, как разрешает RFC 9110; недостижимый диапазон — 416.
+    """
+    if not range_header:
+        return None
+    m = _BYTE_RANGE.fullmatch(range_header)
+    if m is None or m.group(1) == m.group(2) == '':
+        return None
+    first, last = m.groups()
+    if first == '':
+        # bytes=-N — последние N байт; bytes=-0 недостижим
+        suffix = int(last)
+        start = length - min(suffix, length) if suffix else length
+        end = length - 1
+    else:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+        if last and int(last) < start:
+            return None
+    if start >= length:
+        raise HTTPException(
+            status_code=416, headers={'Content-Range': f'bytes */{length}'}
+        )
+    return start, end
+
+
+@dataclass
+class ObjectBody:
+    """Тело документа для отдачи клиенту без разбора JSON."""
+
+    chunks: AsyncIterator[bytes]
+    content_length: int
+    etag: str
+    # тело из Postgres можно читать диапазонами
+    accept_ranges: bool = False
+    # 'bytes start-end/length' для ответа 206
+    content_range: str | None = None
+
+    @property
+    def status_code(self) -> int:
+        return 200 if self.content_range is None else 206
+
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return str(uuid.UUID(bytes=raw))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def _search_key(filters: str, sort: str | None) -> str:
+    # курсор поиска годится только для того же запроса
+    return hashlib.sha256(f'{filters}\n{sort or ""}'.encode()).hexdigest()[:16]
+
+
+def _encode_search_cursor(pit_id: str, after: list[Any], key: str) -> str:
+    raw = json.dumps({'pit': pit_id, 'after': after, 'key': key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b'=').decode()
+
+
+def _decode_search_cursor(cursor: str, key: str) -> tuple[str, list[Any]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        state = json.loads(raw)
+        pit_id, after, cursor_key = state['pit'], state['after'], state['key']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if cursor_key != key or not isinstance(pit_id, str) or not isinstance(after, list):
+        raise HTTPException(status_code=400, detail='Cursor does not match the query')
+    return pit_id, after
+
 
 @dataclass
 class MultiRepositoryService:
     NAMESPACES: ClassVar[set[str]] = set()
-    SEARCH_SCHEMAS: ClassVar[dict[str, dict[str, Any]]] = {}
+    SEARCH_SCHEMAS: ClassVar[dict[str, CompiledSearchSchema]] = {}
+    QUERY_PLANS: ClassVar[QueryPlanCache] = QueryPlanCache()
     postgres_repository: PostgresDBRepository
     elastic_repository: ElasticSearchDBRepository
+    refresh_policy: RefreshPolicy
 
     async def get_object_meta(self, namespace: str, object_id: UUID) -> DocumentSchema:
         meta = await self.postgres_repository.get_document_meta(
@@ -29,17 +260,166 @@ class MultiRepositoryService:
         return meta
 
     async def get_object_body(self, namespace: str, object_id: UUID) -> dict[str, Any]:
-        await self.get_object_meta(namespace, object_id)
+        meta = await self.get_object_meta(namespace, object_id)
+        if meta.body_in_postgres:
+            bodies = await self._load_bodies([meta])
+            return bodies[meta.id]
+        return await self._elastic_body(namespace, meta.id)
 
+    async def _elastic_body(self, namespace: str, doc_id: str) -> dict[str, Any]:
         doc = await self.elastic_repository.get_document(
             index=namespace,
-            doc_id=str(object_id),
+            doc_id=doc_id,
         )
         if doc is None:
             raise HTTPException(status_code=202, detail='Документ ещё индексируется')
 
         return doc
 
+    async def get_object_body_stream(
+        self,
+        namespace: str,
+        object_id: UUID,
+        if_none_match: str | None = None,
+        range_header: str | None = None,
+        if_range: str | None = None,
+    ) -> ObjectBody:
+        """
+        Тело документа для отдачи клиенту. Из Postgres — потоком частей
+        или строкой json_buffer в исходном виде; из Elasticsearch — _source
+        одним куском.
+
+        ETag — content_hash загруженных байт. Тело из Elasticsearch
+        сериализуется заново и совпадает с исходным лишь по смыслу,
+        поэтому его ETag слабый. При совпадении с If-None-Match тело
+        не читается вовсе — 304.
+
+        Range поддерживается для тела из Postgres: читаются только части,
+        покрывающие диапазон. If-Range сравнивается со строгим ETag,
+        при несовпадении отдаётся всё тело.
+        """
+        meta = await self.get_object_meta(namespace, object_id)
+        if meta.body_in_postgres:
+            etag = f'"{meta.content_hash}"'
+        else:
+            etag = f'W/"{meta.content_hash}"'
+        if _etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={'ETag': etag})
+
+        if meta.body_in_postgres:
+            byte_range = None
+            if if_range is None or if_range.strip() == etag:
+                byte_range = _parse_range(range_header, meta.content_length)
+            if byte_range is None:
+                return ObjectBody(
+                    chunks=self.postgres_repository.iter_body(meta),
+                    content_length=meta.content_length,
+                    etag=etag,
+                    accept_ranges=True,
+                )
+            start, end = byte_range
+            if meta.inline:
+                data = await self.postgres_repository.get_data_by_id(meta.id)
+                chunks = _single_chunk((data or b'')[start : end + 1])
+            else:
+                chunks = self.postgres_repository.iter_chunk_range(
+                    meta.id, start, end, codec=meta.codec, part_size=meta.part_size
+                )
+            return ObjectBody(
+                chunks=chunks,
+                content_length=end - start + 1,
+                etag=etag,
+                accept_ranges=True,
+                content_range=f'bytes {start}-{end}/{meta.content_length}',
+            )
+        doc = await self._elastic_body(namespace, meta.id)
+        raw = json.dumps(doc, ensure_ascii=False).encode()
+        return ObjectBody(chunks=_single_chunk(raw), content_length=len(raw), etag=etag)
+
+    async def get_objects_meta(
+        self,
+        namespace: str,
+        object_ids: list[UUID],
+    ) -> DocumentMultiGetSchema:
+        """Метаданные нескольких документов одним запросом к Postgres."""
+        ids = list(dict.fromkeys(str(object_id) for object_id in object_ids))
+        if not await self._namespace_exists(namespace):
+            return DocumentMultiGetSchema(missing=ids)
+        found = {
+            meta.id: meta
+            for meta in await self.postgres_repository.get_documents_meta(
+                namespace, ids
+            )
+        }
+        return DocumentMultiGetSchema(
+            items=[found[doc_id] for doc_id in ids if doc_id in found],
+            missing=[doc_id for doc_id in ids if doc_id not in found],
+        )
+
+    async def get_objects_body_stream(
+        self,
+        namespace: str,
+        object_ids: list[UUID],
+    ) -> AsyncIterator[bytes]:
+        """
+        Тела нескольких документов JSON-массивом {"id", "status", "body"?}.
+        Тела из Postgres идут одним запросом к json_chunks и вставляются
+        в ответ как есть, тела из Elasticsearch — через _mget пачками
+        по MGET_BATCH. status 202 — документ ещё индексируется, 404 — его нет.
+        Элементы идут не в порядке запроса: сначала тела из Postgres.
+        """
+        multi = await self.get_objects_meta(namespace, object_ids)
+        return self._stream_bodies(namespace, multi)
+
+    async def _stream_bodies(
+        self,
+        namespace: str,
+        multi: DocumentMultiGetSchema,
+    ) -> AsyncIterator[bytes]:
+        separator = b'['
+        sent: set[str] = set()
+        current: str | None = None
+        async for doc_id, chunk in self.postgres_repository.iter_bodies(
+            [meta for meta in multi.items if meta.body_in_postgres]
+        ):
+            if doc_id != current:
+                if current is not None:
+                    yield b'}'
+                head = b'{"id": "%s", "status": 200, "body": ' % doc_id.encode()
+                yield separator + head
+                separator = b','
+                sent.add(doc_id)
+                current = doc_id
+            yield chunk
+        if current is not None:
+            yield b'}'
+
+        pending = [meta.id for meta in multi.items if not meta.body_in_postgres]
+        for i in range(0, len(pending), MGET_BATCH):
+            batch = pending[i : i + MGET_BATCH]
+            docs = await self.elastic_repository.mget(namespace, batch)
+            for doc_id in batch:
+                if doc_id in docs:
+                    item = {'id': doc_id, 'status': 200, 'body': docs[doc_id]}
+                else:
+                    item = {'id': doc_id, 'status': 202}
+                yield separator + json.dumps(item, ensure_ascii=False).encode()
+                separator = b','
+                sent.add(doc_id)
+
+        for doc_id in multi.missing + [meta.id for meta in multi.items]:
+            if doc_id not in sent:
+                yield separator + json.dumps({'id': doc_id, 'status': 404}).encode()
+                separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+    async def _load_bodies(self, metas: list[DocumentSchema]) -> dict[str, Any]:
+        """Тела документов, хранящихся в Postgres, по запросу на таблицу тел."""
+        raw: dict[str, bytearray] = {meta.id: bytearray() for meta in metas}
+        async for doc_id, chunk in self.postgres_repository.iter_bodies(metas):
+            raw[doc_id].extend(chunk)
+        return {doc_id: json.loads(body) for doc_id, body in raw.items()}
+
     async def create_object_stream(
         self,
         namespace: str,
@@ -47,16 +427,30 @@ class MultiRepositoryService:
         *,
         document_name: str,
     ) -> UUID:
+        # DDL только для неймспейса, которого ещё нет в каталоге кластера;
+        # известные неймспейсы загружаются при старте и приходят через NOTIFY
         if namespace not in self.NAMESPACES:
+            await self.postgres_repository.register_namespace(namespace)
             self.NAMESPACES.add(namespace)
-            await self.postgres_repository.create_chunks_table()
-            await self.postgres_repository.create_meta_table_by_namespace(namespace)
 
-        doc = await self.postgres_repository.create_document_stream(
-            namespace=namespace,
-            document_name=document_name,
-            body=body,
-        )
+        # небольшое тело целиком в памяти — одна строка json_buffer вместо частей;
+        # inline_threshold=0 отключает такие тела, поток сразу идёт в части
+        threshold = self.postgres_repository.inline_threshold
+        rest: AsyncIterator[bytes] | None
+        if threshold > 0:
+            head, rest = await _read_head(body, threshold)
+        else:
+            head, rest = b'', body
+        if rest is None:
+            doc = await self.postgres_repository.create_document_inline(
+                namespace, document_name, head
+            )
+        else:
+            doc = await self.postgres_repository.create_document_stream(
+                namespace=namespace,
+                document_name=document_name,
+                body=rest,
+            )
 
         from json_storage.tasks import index_document_to_elastic
 
@@ -64,41 +458,420 @@ class MultiRepositoryService:
 
         return uuid.UUID(doc.id)
 
+    async def create_objects_bulk(
+        self,
+        namespace: str,
+        body: AsyncIterator[bytes],
+        *,
+        document_name: str = 'document',
+        name_field: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Загрузка NDJSON — по документу на строку. Строки собираются в пачки
+        (BULK_BATCH_LINES строк или BULK_BATCH_BYTES байт), пачка пишется
+        одной транзакцией через COPY и уходит на индексацию одним сообщением.
+
+        Имя документа — значение поля name_field, если оно есть,
+        иначе document_name и номер строки. Результат — NDJSON по строке
+        на каждую непустую строку запроса: {"line": N, "id": ...}
+        или {"line": N, "error": ...}; отдаётся по мере записи пачек.
+        """
+        if namespace not in self.NAMESPACES:
+            await self.postgres_repository.register_namespace(namespace)
+            self.NAMESPACES.add(namespace)
+        return self._ingest_bulk(namespace, body, document_name, name_field)
+
+    async def _ingest_bulk(
+        self,
+        namespace: str,
+        body: AsyncIterator[bytes],
+        document_name: str,
+        name_field: str | None,
+    ) -> AsyncIterator[bytes]:
+        batch: list[tuple[int, bytes | None]] = []
+        size = 0
+        line_number = 0
+        async for line in _ndjson_lines(body, BULK_MAX_LINE_BYTES):
+            line_number += 1
+            if line is not None:
+                line = line.strip()
+                if not line:
+                    continue
+                size += len(line)
+            batch.append((line_number, line))
+            if len(batch) >= BULK_BATCH_LINES or size >= BULK_BATCH_BYTES:
+                yield await self._write_bulk_batch(
+                    namespace, batch, document_name, name_field
+                )
+                batch, size = [], 0
+        if batch:
+            yield await self._write_bulk_batch(
+                namespace, batch, document_name, name_field
+            )
+
+    async def _write_bulk_batch(
+        self,
+        namespace: str,
+        batch: list[tuple[int, bytes | None]],
+        document_name: str,
+        name_field: str | None,
+    ) -> bytes:
+        parsed = await asyncio.to_thread(
+            _parse_bulk_lines, batch, document_name, name_field
+        )
+        documents = [(item[1], item[2]) for item in parsed if len(item) == 3]
+        ids: list[str] = []
+        if documents:
+            metas = await self.postgres_repository.create_documents_bulk(
+                namespace, documents
+            )
+            ids = [meta.id for meta in metas]
+
+            from json_storage.tasks import index_documents_to_elastic
+
+            await index_documents_to_elastic.kiq(namespace=namespace, object_ids=ids)
+
+        created = iter(ids)
+        results = []
+        for item in parsed:
+            if len(item) == 3:
+                result = {'line': item[0], 'id': next(created)}
+            else:
+                result = {'line': item[0], 'error': item[1]}
+            results.append(json.dumps(result, ensure_ascii=False).encode() + b'\n')
+        return b''.join(results)
+
+    async def create_upload(
+        self,
+        namespace: str,
+        document_name: str,
+    ) -> UploadSessionSchema:
+        if namespace not in self.NAMESPACES:
+            await self.postgres_repository.register_namespace(namespace)
+            self.NAMESPACES.add(namespace)
+        return await self.postgres_repository.create_upload_session(
+            namespace, document_name
+        )
+
+    async def get_upload(self, namespace: str, upload_id: UUID) -> UploadSessionSchema:
+        session = await self.postgres_repository.get_upload_session(
+            namespace, str(upload_id)
+        )
+        if session is None:
+            raise HTTPException(status_code=404)
+        return session
+
+    async def upload_part(
+        self,
+        namespace: str,
+        upload_id: UUID,
+        part_number: int,
+        body: AsyncIterator[bytes],
+    ) -> UploadPartSchema:
+        try:
+            part = await self.postgres_repository.write_upload_part(
+                namespace, str(upload_id), part_number, body
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        if part is None:
+            raise HTTPException(status_code=404)
+        return part
+
+    async def complete_upload(self, namespace: str, upload_id: UUID) -> DocumentSchema:
+        """
+        Завершает загрузку по частям: документ появляется под id сессии
+        и уходит на индексацию, как после обычной загрузки.
+        """
+        try:
+            doc = await self.postgres_repository.complete_upload_session(
+                namespace, str(upload_id)
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        if doc is None:
+            raise HTTPException(status_code=404)
+
+        from json_storage.tasks import index_document_to_elastic
+
+        await index_document_to_elastic.kiq(namespace=namespace, object_id=doc.id)
+        return doc
+
+    async def abort_upload(self, namespace: str, upload_id: UUID) -> None:
+        if not await self.postgres_repository.abort_upload_session(
+            namespace, str(upload_id)
+        ):
+            raise HTTPException(status_code=404)
+
+    async def collect_abandoned_uploads(
+        self,
+        ttl: float,
+        interval: float,
+    ) -> None:
+        """Периодически удаляет брошенные сессии загрузки. Работает до отмены задачи."""
+        while True:
+            try:
+                deleted = (
+                    await self.postgres_repository.delete_abandoned_upload_sessions(ttl)
+                )
+                if deleted:
+                    logger.info('Deleted %s abandoned upload sessions', deleted)
+            except psycopg.Error:
+                logger.exception('Upload sessions cleanup failed')
+            await asyncio.sleep(interval)
+
     async def delete_object_by_id(self, namespace: str, object_id: UUID) -> None:
         await asyncio.gather(
             self.postgres_repository.delete_object_by_id(namespace, str(object_id)),
-            self.elastic_repository.delete_document(namespace, str(object_id)),
+            self.elastic_repository.delete_document(
+                namespace,
+                str(object_id),
+                refresh=self.refresh_policy.param_for(namespace),
+            ),
         )
+        self.refresh_policy.written(namespace)
+
+    async def begin_bulk_load(self, namespace: str) -> None:
+        """
+        Режим массовой загрузки: индекс неймспейса перестаёт обновляться
+        (refresh_interval=-1), воркеры пишут в него без refresh.
+        Флаг в каталоге ставится раньше, чем отключается refresh, — иначе
+        запись с refresh=wait_for ждала бы refresh, которого не будет.
+        """
+        if namespace not in self.NAMESPACES:
+            await self.postgres_repository.register_namespace(namespace)
+            self.NAMESPACES.add(namespace)
+        await self.elastic_repository.ensure_index(index=namespace)
+        await self.postgres_repository.set_bulk_load(namespace, True)
+        self.refresh_policy.SUSPENDED.add(namespace)
+        await self.elastic_repository.suspend_refresh(namespace)
+
+    async def end_bulk_load(self, namespace: str) -> None:
+        """Возвращает refresh_interval индекса, делает refresh и снимает флаг."""
+        if not await self._namespace_exists(namespace):
+            raise HTTPException(status_code=404)
+        await self.elastic_repository.resume_refresh(namespace)
+        await self.postgres_repository.set_bulk_load(namespace, False)
+        self.refresh_policy.SUSPENDED.discard(namespace)
 
     async def set_search_schema(
         self,
         namespace: str,
         search_schema: dict[str, Any],
     ) -> None:
-        self.SEARCH_SCHEMAS[namespace] = search_schema
-        mapping = DSLTranslator.schema_to_es_mapping(search_schema)
+        search_schema = dict(search_schema)
+        try:
+            compiled = DSLTranslator.compile_schema(search_schema)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         await self.elastic_repository.create_or_update_index(
             index=namespace,
-            mappings=mapping,
+            mappings=compiled.mapping,
         )
+        version = await self.postgres_repository.save_search_schema(
+            namespace, search_schema
+        )
+        self.SEARCH_SCHEMAS[namespace] = replace(compiled, version=version)
+
+        if self.postgres_repository.storage_for(namespace) == STORAGE_POSTGRES:
+            # reindex перенёс старые проекции, новых полей в них нет
+            from json_storage.tasks import reproject_namespace
+
+            await reproject_namespace.kiq(namespace=namespace)
+
+    async def get_search_schema(self, namespace: str) -> CompiledSearchSchema | None:
+        compiled = self.SEARCH_SCHEMAS.get(namespace)
+        if compiled is not None:
+            return compiled
+        # схему мог задать другой процесс, а уведомление ещё не дошло
+        return await self._reload_search_schema(namespace)
+
+    async def _reload_search_schema(
+        self,
+        namespace: str,
+    ) -> CompiledSearchSchema | None:
+        stored = await self.postgres_repository.get_search_schema(namespace)
+        if stored is None:
+            self.SEARCH_SCHEMAS.pop(namespace, None)
+            return None
+        search_schema, version = stored
+        compiled = DSLTranslator.compile_schema(search_schema, version)
+        self.SEARCH_SCHEMAS[namespace] = compiled
+        return compiled
+
+    async def _search_request(
+        self,
+        namespace: str,
+        filters: str,
+        sort: str | None,
+    ) -> tuple[dict, list[Any]]:
+        schema = await self.get_search_schema(namespace)
+        if not schema:
+            raise HTTPException(400, 'Search schema not set')
+        try:
+            query = self.QUERY_PLANS.build_query(namespace, schema, filters)
+            sort_keys = DSLTranslator.build_sort(sort, schema.types)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return query, sort_keys
 
     async def search_objects(
         self, namespace: str, filters: str
     ) -> list[dict[str, Any]]:
-        schema = self.SEARCH_SCHEMAS.get(namespace)
-        if not schema:
-            raise HTTPException(400, 'Search schema not set')
-        query = DSLTranslator.build_query_from_expression(filters)
+        query, _ = await self._search_request(namespace, filters, None)
 
-        resp = await self.elastic_repository.search_in_index(
-            index=namespace,
-            body=query,
+        if self.postgres_repository.storage_for(namespace) != STORAGE_POSTGRES:
+            return await self.elastic_repository.search_in_index(
+                index=namespace,
+                body=query,
+            )
+
+        # в индексе только проекции — сами документы берём из Postgres
+        ids = await self.elastic_repository.search_ids(index=namespace, body=query)
+        metas = await self.postgres_repository.get_documents_meta(namespace, ids)
+        bodies = await self._load_bodies(
+            [meta for meta in metas if meta.body_in_postgres]
+        )
+        return [bodies[doc_id] for doc_id in ids if doc_id in bodies]
+
+    async def search_objects_page(
+        self,
+        namespace: str,
+        filters: str,
+        size: int,
+        sort: str | None = None,
+        cursor: str | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """
+        Страница поиска по курсору: search_after в point-in-time, поэтому
+        глубина выдачи не ограничена и каждая страница стоит одинаково.
+        Курсор (opaque) несёт id PIT и ключи сортировки последнего документа
+        и годится только для тех же filters и sort; None — страниц больше нет.
+        Страница запрашивается с одним лишним документом, чтобы не отдавать
+        курсор на пустую последнюю страницу.
+        """
+        query, sort_keys = await self._search_request(namespace, filters, sort)
+        key = _search_key(filters, sort)
+        after: list[Any] | None = None
+        if cursor is None:
+            pit_id = await self.elastic_repository.open_point_in_time(namespace)
+        else:
+            pit_id, after = _decode_search_cursor(cursor, key)
+
+        # PIT первой страницы известен клиенту только из курсора: если страница
+        # не собралась, курсор до него не дойдёт и PIT провисит до keep_alive.
+        # PIT из курсора не закрываем — клиент может повторить запрос с ним
+        closed = False
+        try:
+            hits, pit_id = await self._search_hits(
+                namespace, pit_id, query, sort_keys, size + 1, after
+            )
+            if len(hits) > size:
+                hits = hits[:size]
+                next_cursor = _encode_search_cursor(pit_id, hits[-1]['sort'], key)
+            else:
+                closed = True
+                await self.elastic_repository.close_point_in_time(pit_id)
+                next_cursor = None
+
+            if self.postgres_repository.storage_for(namespace) != STORAGE_POSTGRES:
+                return [hit['_source'] for hit in hits], next_cursor
+            ids = [hit['_id'] for hit in hits]
+            metas = await self.postgres_repository.get_documents_meta(namespace, ids)
+            bodies = await self._load_bodies(
+                [meta for meta in metas if meta.body_in_postgres]
+            )
+        except BaseException:
+            if cursor is None and not closed:
+                await self.elastic_repository.close_point_in_time(pit_id)
+            raise
+        return [bodies[doc_id] for doc_id in ids if doc_id in bodies], next_cursor
+
+    async def export_objects(
+        self,
+        namespace: str,
+        filters: str,
+        sort: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Вся выдача поиска NDJSON-потоком, по документу в строке: страницы
+        по SEARCH_EXPORT_BATCH через search_after в одном point-in-time,
+        то есть в снимке индекса на момент начала выгрузки. Тела из Postgres
+        идут как хранятся, только без переводов строк. PIT открывается
+        с первой строкой потока и закрывается с его концом, так что поток,
+        который так и не начали читать, ничего в Elasticsearch не держит.
+        """
+        query, sort_keys = await self._search_request(namespace, filters, sort)
+        return self._export_lines(namespace, query, sort_keys)
+
+    async def _export_lines(
+        self,
+        namespace: str,
+        query: dict,
+        sort_keys: list[Any],
+    ) -> AsyncIterator[bytes]:
+        in_postgres = (
+            self.postgres_repository.storage_for(namespace) == STORAGE_POSTGRES
         )
+        after: list[Any] | None = None
+        pit_id = await self.elastic_repository.open_point_in_time(namespace)
+        try:
+            while True:
+                hits, pit_id = await self._search_hits(
+                    namespace, pit_id, query, sort_keys, SEARCH_EXPORT_BATCH, after
+                )
+                if in_postgres:
+                    ids = [hit['_id'] for hit in hits]
+                    async for line in self._postgres_lines(namespace, ids):
+                        yield line
+                else:
+                    for hit in hits:
+                        yield (
+                            json.dumps(hit['_source'], ensure_ascii=False).encode()
+                            + b'\n'
+                        )
+                if len(hits) < SEARCH_EXPORT_BATCH:
+                    break
+                after = hits[-1]['sort']
+        finally:
+            await self.elastic_repository.close_point_in_time(pit_id)
 
-        return resp
+    async def _search_hits(
+        self,
+        namespace: str,
+        pit_id: str,
+        query: dict,
+        sort_keys: list[Any],
+        size: int,
+        after: list[Any] | None,
+    ) -> tuple[list[dict[str, Any]], str]:
+        # в индексе postgres-неймспейса только проекции — _source не нужен
+        source = self.postgres_repository.storage_for(namespace) != STORAGE_POSTGRES
+        result = await self.elastic_repository.search_after(
+            pit_id, query, sort_keys, size, after, source=source
+        )
+        if result is None:
+            raise HTTPException(status_code=410, detail='Search cursor expired')
+        return result
+
+    async def _postgres_lines(
+        self,
+        namespace: str,
+        ids: list[str],
+    ) -> AsyncIterator[bytes]:
+        """Тела страницы выдачи из Postgres строками NDJSON в порядке ids."""
+        metas = await self.postgres_repository.get_documents_meta(namespace, ids)
+        stored = [meta for meta in metas if meta.body_in_postgres]
+        raw: dict[str, bytearray] = {meta.id: bytearray() for meta in stored}
+        async for doc_id, chunk in self.postgres_repository.iter_bodies(stored):
+            raw[doc_id] += chunk.translate(_NEWLINES)
+        for doc_id in ids:
+            if doc_id in raw:
+                raw[doc_id] += b'\n'
+                yield bytes(raw.pop(doc_id))
 
     async def read_namespace(self, namespace: str) -> DocumentListSchema:
-        if namespace not in self.NAMESPACES:
+        if not await self._namespace_exists(namespace):
             return DocumentListSchema()
         return await self.postgres_repository.list_documents_meta(namespace)
 
@@ -106,13 +879,79 @@ class MultiRepositoryService:
         self,
         namespace: str,
         limit: int,
-        cursor: str,
+        cursor: str | None,
+        count: str = 'estimate',
     ) -> DocumentListSchema:
-        if namespace not in self.NAMESPACES:
+        if not await self._namespace_exists(namespace):
             return DocumentListSchema()
-        return await self.postgres_repository.list_documents_meta(
-            namespace, limit=limit, cursor=cursor
+        page = await self.postgres_repository.list_documents_meta(
+            namespace,
+            limit=limit,
+            cursor=_decode_cursor(cursor) if cursor is not None else None,
+            count=count,
         )
+        if page.next_cursor is not None:
+            page.next_cursor = _encode_cursor(page.next_cursor)
+        return page
 
     async def get_namespace(self) -> list[str]:
         return sorted(list(self.NAMESPACES))
+
+    async def _namespace_exists(self, namespace: str) -> bool:
+        if namespace in self.NAMESPACES:
+            return True
+        # неймспейс мог создать другой процесс, а уведомление ещё не дошло
+        if await self.postgres_repository.namespace_exists(namespace):
+            self.NAMESPACES.add(namespace)
+            return True
+        return False
+
+    async def load_catalog(self) -> None:
+        """
+        Загружает каталог неймспейсов и схем поиска из Postgres в память процесса.
+        Схемы сразу компилируются (ES-поля, маппинг).
+        """
+        await self.postgres_repository.create_catalog_tables()
+        self.NAMESPACES.update(await self.postgres_repository.list_namespaces())
+        await self._reload_bulk_load()
+        stored = await self.postgres_repository.list_search_schemas()
+        for namespace, (search_schema, version) in stored.items():
+            cached = self.SEARCH_SCHEMAS.get(namespace)
+            if cached is None or cached.version != version:
+                self.SEARCH_SCHEMAS[namespace] = DSLTranslator.compile_schema(
+                    search_schema, version
+                )
+
+    async def watch_catalog(self, retry_delay: float = 5.0) -> None:
+        """
+        Держит кеш каталога в согласии с другими процессами через LISTEN/NOTIFY.
+        После каждого (пере)подключения каталог перечитывается целиком, чтобы
+        не потерять изменения, сделанные без подписки. Работает до отмены задачи.
+        """
+        while True:
+            try:
+                async with self.postgres_repository.listen(
+                    NAMESPACES_CHANNEL, SEARCH_SCHEMAS_CHANNEL, BULK_LOAD_CHANNEL
+                ) as notifies:
+                    await self.load_catalog()
+                    async for notify in notifies:
+                        await self._apply_catalog_notify(notify.channel, notify.payload)
+            except psycopg.Error:
+                logger.exception(
+                    'Catalog listener failed, reconnecting in %s s', retry_delay
+                )
+                await asyncio.sleep(retry_delay)
+
+    async def _apply_catalog_notify(self, channel: str, payload: str) -> None:
+        if channel == NAMESPACES_CHANNEL:
+            self.NAMESPACES.add(payload)
+        elif channel == SEARCH_SCHEMAS_CHANNEL:
+            # сама схема может не влезть в payload (8000 байт), перечитываем
+            await self._reload_search_schema(payload)
+        elif channel == BULK_LOAD_CHANNEL:
+            await self._reload_bulk_load()
+
+    async def _reload_bulk_load(self) -> None:
+        suspended = await self.postgres_repository.list_bulk_load_namespaces()
+        self.refresh_policy.SUSPENDED.clear()
+        self.refresh_policy.SUSPENDED.update(suspended)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from typing import ClassVar
+
+from json_storage.repositories import ElasticSearchDBRepository
+
+logger = logging.getLogger(__name__)
+
+# запись сразу видна в поиске: refresh=true на каждый запрос
+IMMEDIATE = 'immediate'
+# запрос ждёт ближайшего refresh индекса
+WAIT_FOR = 'wait_for'
+# ничего не форсируем, видимость — по refresh_interval индекса
+NONE = 'none'
+# один refresh на неймспейс раз в period секунд, если в него писали
+PERIODIC = 'periodic'
+
+_REFRESH_PARAMS: dict[str, str | None] = {
+    IMMEDIATE: 'true',
+    WAIT_FOR: 'wait_for',
+    NONE: None,
+    PERIODIC: None,
+}
+_STRENGTH = {NONE: 0, PERIODIC: 0, WAIT_FOR: 1, IMMEDIATE: 2}
+
+
+@dataclass
+class RefreshPolicy:
+    """
+    Политика refresh для записей в Elasticsearch: по умолчанию и для отдельных
+    неймспейсов. Неймспейсы в режиме массовой загрузки (SUSPENDED, синхронизируется
+    через каталог) пишутся без refresh, пока загрузка не закончится.
+
+    Для periodic записи лишь помечают неймспейс, а фоновая задача раз в period
+    секунд делает один refresh на все помеченные. Один экземпляр на процесс.
+    """
+
+    SUSPENDED: ClassVar[set[str]] = set()
+    elastic: ElasticSearchDBRepository
+    default: str = WAIT_FOR
+    namespaces: Mapping[str, str] = field(default_factory=dict)
+    period: float = 1.0
+    _dirty: set[str] = field(init=False, default_factory=set)
+    _task: asyncio.Task[None] | None = field(init=False, default=None)
+
+    def policy_for(self, namespace: str) -> str:
+        if namespace in self.SUSPENDED:
+            return NONE
+        return self.namespaces.get(namespace, self.default)
+
+    def param_for(self, namespace: str) -> str | None:
+        """Значение параметра refresh для запроса записи в неймспейс."""
+        return _REFRESH_PARAMS[self.policy_for(namespace)]
+
+    def param_for_many(self, namespaces: Iterable[str]) -> str | None:
+        """refresh для запроса _bulk по нескольким неймспейсам — самый строгий из них."""
+        policies = [self.policy_for(namespace) for namespace in namespaces]
+        if not policies:
+            return None
+        return _REFRESH_PARAMS[max(policies, key=_STRENGTH.__getitem__)]
+
+    def written(self, namespace: str) -> None:
+        """Отмечает успешную запись; для periodic неймспейс попадёт в ближайший refresh."""
+        if self.policy_for(namespace) != PERIODIC:
+            return
+        self._dirty.add(namespace)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._refresh_dirty()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.period)
+            await self._refresh_dirty()
+
+    async def _refresh_dirty(self) -> None:
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, set()
+        try:
+            await self.elastic.refresh(sorted(batch))
+        except Exception:
+            logger.exception('Periodic refresh of %s failed', sorted(batch))
+            self._dirty |= batch
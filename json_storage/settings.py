@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,10 +8,96 @@ class DsnSettingsSchema(BaseSettings):
     dsn: str
 
 
+class PostgresSettingsSchema(DsnSettingsSchema):
+    pool_min_size: int = 4
+    pool_max_size: int = 20
+    # секунды; соединение старше max_lifetime пересоздаётся пулом
+    pool_max_lifetime: float = 3600.0
+    # секунды; простаивающие соединения сверх min_size закрываются
+    pool_max_idle: float = 600.0
+    # секунды ожидания свободного соединения из пула
+    pool_timeout: float = 30.0
+    # дождаться открытия min_size соединений при старте приложения
+    pool_prewarm: bool = True
+    # байты; тело загрузки перенарезается на строки json_chunks этого размера
+    part_size: int = Field(1024 * 1024, ge=64 * 1024, le=16 * 1024 * 1024)
+    # частей, принятых от клиента и ожидающих записи; 0 — без конвейера
+    ingest_queue_depth: int = Field(4, ge=0)
+    # сжатие частей json_chunks: по умолчанию и для отдельных неймспейсов,
+    # например POSTGRES__COMPRESSION_NAMESPACES='{"logs": "zstd"}'.
+    # С zstd хотя бы в одном неймспейсе колонка json_chunks.data переводится
+    # в storage external: TOAST (pglz) больше не сжимает и identity-части
+    # остальных неймспейсов, они занимают место как есть
+    compression: Literal['identity', 'zstd'] = 'identity'
+    compression_namespaces: dict[str, Literal['identity', 'zstd']] = Field(
+        default_factory=dict
+    )
+    compression_level: int = Field(3, ge=1, le=22)
+    # где хранится каноническое тело: elastic — в _source индекса (части
+    # удаляются после индексации), postgres — в json_chunks, а в индекс уходит
+    # только проекция на схему поиска; для отдельных неймспейсов:
+    # POSTGRES__BODY_STORAGE_NAMESPACES='{"orders": "postgres"}'
+    body_storage: Literal['elastic', 'postgres'] = 'elastic'
+    body_storage_namespaces: dict[str, Literal['elastic', 'postgres']] = Field(
+        default_factory=dict
+    )
+    # байты; тело не больше порога пишется одной строкой json_buffer одним
+    # запросом и отдаётся оттуда же, без частей json_chunks; 0 — отключено
+    inline_threshold: int = Field(16 * 1024, ge=0, le=1024 * 1024)
+
+
+class ElasticSearchSettingsSchema(DsnSettingsSchema):
+    # размер пула HTTP-соединений на каждый узел кластера
+    connections_per_node: int = 10
+    # секунды на один запрос к Elasticsearch
+    request_timeout: float = 30.0
+    max_retries: int = 3
+    retry_on_timeout: bool = True
+    # время жизни point-in-time между страницами поиска по курсору (единицы ES)
+    pit_keep_alive: str = '1m'
+
+
+class IndexingSettingsSchema(BaseModel):
+    # single — задача индексирует свой документ сама;
+    # batch — задачи воркера собираются в пачки и уходят одним _bulk
+    mode: Literal['single', 'batch'] = 'single'
+    # пачка отправляется, как только наберёт столько документов...
+    batch_size: int = Field(default=500, ge=1)
+    # ...или по истечении окна (секунды) с момента первого документа в ней
+    batch_window: float = Field(default=0.05, gt=0)
+    # байты; ограничение тела одного запроса _bulk, пачка делится по нему
+    batch_bytes: int = Field(default=16 * 1024 * 1024, ge=1024 * 1024)
+    # сообщений RabbitMQ в работе у воркера; в режиме batch — не меньше batch_size,
+    # иначе пачки будут закрываться только по окну
+    prefetch: int = Field(default=10, ge=1)
+    # refresh индекса после записи: immediate — refresh=true на каждый запрос,
+    # wait_for — ждать ближайшего refresh, none — не форсировать,
+    # periodic — один refresh на неймспейс раз в refresh_period секунд;
+    # для отдельных неймспейсов: INDEXING__REFRESH_NAMESPACES='{"logs": "none"}'
+    refresh: Literal['immediate', 'wait_for', 'none', 'periodic'] = 'wait_for'
+    refresh_namespaces: dict[
+        str, Literal['immediate', 'wait_for', 'none', 'periodic']
+    ] = Field(default_factory=dict)
+    refresh_period: float = Field(default=1.0, gt=0)
+    # байты; больший документ не индексируется. Тело держится в памяти воркера
+    # одной копией, пик ≈ этот размер плюс несколько частей json_chunks
+    max_document_bytes: int = Field(default=512 * 1024 * 1024, ge=1024 * 1024)
+
+
+class UploadsSettingsSchema(BaseModel):
+    # секунды; сессия загрузки по частям, в которую ничего не грузили
+    # дольше этого срока, удаляется вместе с частями
+    session_ttl: float = Field(default=24 * 3600, gt=0)
+    # секунды между проходами сборщика брошенных сессий
+    gc_interval: float = Field(default=600, gt=0)
+
+
 class SettingsSchema(BaseSettings):
-    elastic_search: DsnSettingsSchema
-    postgres: DsnSettingsSchema
+    elastic_search: ElasticSearchSettingsSchema
+    postgres: PostgresSettingsSchema
     rabbit_mq: DsnSettingsSchema
+    indexing: IndexingSettingsSchema = IndexingSettingsSchema()
+    uploads: UploadsSettingsSchema = UploadsSettingsSchema()
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8',
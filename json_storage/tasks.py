@@ -1,43 +1,171 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import logging
 from typing import Any
 
 from json_storage.cmd.taskiq_broker import taskiq_broker
+from json_storage.container import get_container
 from json_storage.repositories import ElasticSearchDBRepository, PostgresDBRepository
+from json_storage.repositories.postgres import STORAGE_POSTGRES
+from json_storage.services import BulkIndexer, RefreshPolicy
+from json_storage.services.dsl_translator import DSLTranslator
+from json_storage.services.indexing import (
+    BulkItemError,
+    DocumentTooLarge,
+    SourceBuffer,
+    project_document,
+)
 from json_storage.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 async def _index_document_to_elastic_impl(namespace: str, object_id: str) -> None:
-    postgres = PostgresDBRepository(dsn=settings.postgres.dsn)
-    elastic = ElasticSearchDBRepository(url=settings.elastic_search.dsn)
+    # пул Postgres и клиент Elasticsearch живут весь срок воркера (APP-скоуп),
+    # задача лишь берёт из контейнера лёгкие репозитории поверх них
+    async with get_container() as container:
+        if settings.indexing.mode == 'batch':
+            # документ уходит в Elasticsearch в составе общей пачки _bulk;
+            # ошибка по нему поднимается здесь же, и taskiq повторит только эту задачу
+            indexer = await container.get(BulkIndexer)
+            await indexer.index(namespace, object_id)
+            return
+
+        postgres = await container.get(PostgresDBRepository)
+        elastic = await container.get(ElasticSearchDBRepository)
 
-    try:
         meta = await postgres.get_document_meta(namespace, object_id)
         if meta is None:
             return
 
+        if (
+            meta.storage != STORAGE_POSTGRES
+            and meta.content_length > settings.indexing.max_document_bytes
+        ):
+            raise DocumentTooLarge(
+                f'Document exceeds {settings.indexing.max_document_bytes} bytes '
+                'allowed for indexing'
+            )
+
         index_name = namespace
         await elastic.ensure_index(index=index_name)
 
-        buf = bytearray()
-        async for chunk in postgres.iter_chunks_by_id(object_id):
-            buf.extend(chunk)
-
-        payload: Any = json.loads(buf)
-        if not isinstance(payload, dict):
-            raise TypeError('Only JSON objects (dict) are supported for indexing')
+        payload: dict[str, Any] | bytes
+        if meta.storage == STORAGE_POSTGRES:
+            # тело остаётся в Postgres, в индекс — только проекция на схему поиска
+            payload = await project_document(postgres, namespace, meta)
+        else:
+            # тело уходит в Elasticsearch как есть, без json.loads: в памяти воркера
+            # только байты документа, а не они же плюс граф Python-объектов
+            source = SourceBuffer(settings.indexing.max_document_bytes)
+            async for chunk in postgres.iter_body(meta):
+                source.write(chunk)
+            payload = source.getvalue()
 
+        refresh_policy = await container.get(RefreshPolicy)
         ok = await elastic.insert_document(
-            index=index_name, doc_id=object_id, document=payload
+            index=index_name,
+            doc_id=object_id,
+            document=payload,
+            refresh=refresh_policy.param_for(namespace),
         )
         if ok:
-            await postgres.delete_chunks_by_id(object_id)
-    finally:
-        await postgres.aclose()
-        await elastic.aclose()
+            refresh_policy.written(namespace)
+            # однострочное тело остаётся в json_buffer и отдаётся оттуда
+            if not meta.body_in_postgres:
+                await postgres.delete_chunks_by_id(object_id)
 
 
 @taskiq_broker.task(retry_on_error=True, max_retries=10)
 async def index_document_to_elastic(namespace: str, object_id: str) -> None:
     await _index_document_to_elastic_impl(namespace=namespace, object_id=object_id)
+
+
+async def _index_documents_to_elastic_impl(
+    namespace: str,
+    object_ids: list[str],
+) -> None:
+    """
+    Индексация пачки документов из bulk-загрузки одной задачей через BulkIndexer.
+    Документы, которые не проиндексировались, получают по собственной задаче
+    с обычными повторами: повтор всей пачки заново отправил бы и уже
+    проиндексированные, чьих частей в json_chunks больше нет.
+    """
+    async with get_container() as container:
+        indexer = await container.get(BulkIndexer)
+        results = await asyncio.gather(
+            *(indexer.index(namespace, object_id) for object_id in object_ids),
+            return_exceptions=True,
+        )
+
+    for object_id, result in zip(object_ids, results):
+        if isinstance(result, Exception):
+            logger.warning(
+                'Document %s failed in batch, retrying alone: %r', object_id, result
+            )
+            await index_document_to_elastic.kiq(
+                namespace=namespace, object_id=object_id
+            )
+
+
+@taskiq_broker.task(retry_on_error=True, max_retries=10)
+async def index_documents_to_elastic(namespace: str, object_ids: list[str]) -> None:
+    await _index_documents_to_elastic_impl(namespace=namespace, object_ids=object_ids)
+
+
+async def _reproject_namespace_impl(namespace: str, page_size: int = 500) -> None:
+    """
+    Переиндексирует проекции всех документов неймспейса, тела которых хранятся
+    в Postgres: после смены схемы поиска в индексе нет новых полей, а взять их,
+    кроме как из канонического тела, неоткуда. Идёт страницами метаданных,
+    по одному _bulk на страницу.
+    """
+    async with get_container() as container:
+        postgres = await container.get(PostgresDBRepository)
+        elastic = await container.get(ElasticSearchDBRepository)
+
+        # схема — прямо из каталога: кеш процесса мог ещё не получить NOTIFY
+        stored = await postgres.get_search_schema(namespace)
+        if stored is None:
+            return
+        projector = DSLTranslator.compile_schema(*stored).projector
+        await elastic.ensure_index(index=namespace)
+
+        cursor: str | None = None
+        while True:
+            page = await postgres.list_documents_meta(
+                namespace, limit=page_size, cursor=cursor, count='none'
+            )
+            operations: list[Any] = []
+            for meta in page.items:
+                if meta.storage != STORAGE_POSTGRES:
+                    continue
+                try:
+                    projection = await project_document(
+                        postgres, namespace, meta, projector
+                    )
+                except (ValueError, TypeError):
+                    logger.exception('Cannot project document %s', meta.id)
+                    continue
+                operations.append({'index': {'_index': namespace, '_id': meta.id}})
+                operations.append(projection)
+
+            if operations:
+                results = await elastic.bulk(operations)
+                errors = [result for result in results if 'error' in result]
+                if errors:
+                    raise BulkItemError(
+                        f'{len(errors)} documents failed to reindex, first: {errors[0]}'
+                    )
+
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        await elastic.refresh(namespace)
+
+
+@taskiq_broker.task(retry_on_error=True, max_retries=10)
+async def reproject_namespace(namespace: str) -> None:
+    await _reproject_namespace_impl(namespace=namespace)
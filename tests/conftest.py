@@ -1,7 +1,7 @@
 import pytest_asyncio
 from elasticsearch import AsyncElasticsearch
 
-from json_storage.services import MultiRepositoryService
+from json_storage.services import MultiRepositoryService, RefreshPolicy
 from json_storage.settings import settings
 import psycopg
 import pytest
@@ -33,10 +33,22 @@ def cleanup_postgres_after_test():
         for table in tables:
             cur.execute(f'drop table if exists "{table}" cascade;')
 
+        for catalog in (
+            'json_namespaces',
+            'json_search_schemas',
+            'json_upload_sessions',
+            'json_buffer',
+        ):
+            cur.execute('select to_regclass(%s)', (catalog,))
+            if cur.fetchone()[0] is not None:
+                cur.execute(f'truncate table {catalog} cascade;')
+
         conn.commit()
 
     MultiRepositoryService.NAMESPACES.clear()
     MultiRepositoryService.SEARCH_SCHEMAS.clear()
+    MultiRepositoryService.QUERY_PLANS.clear()
+    RefreshPolicy.SUSPENDED.clear()
 
 
 @pytest_asyncio.fixture(autouse=True)
@@ -2,7 +2,7 @@ import pytest_asyncio
 from typing import AsyncIterator
 
 from dishka import AsyncContainer
-from json_storage.container import get_container
+from json_storage.container import ContainerManager, get_container
 from json_storage.repositories import PostgresDBRepository, ElasticSearchDBRepository
 from json_storage.services import MultiRepositoryService
 from json_storage.depends import provider
@@ -10,8 +10,12 @@ from json_storage.depends import provider
 
 @pytest_asyncio.fixture
 async def container() -> AsyncIterator[AsyncContainer]:
+    # APP-скоуп (пул соединений) привязан к event loop теста,
+    # поэтому контейнер пересоздаётся и закрывается на каждый тест
+    await ContainerManager.close()
     async with get_container([provider]) as container:
         yield container
+    await ContainerManager.close()
 
 
 @pytest_asyncio.fixture
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import uuid
+
+import psycopg
+import pytest
+
+from json_storage.services import BulkIndexer
+from json_storage.services.indexing import BulkItemError
+from json_storage.settings import settings
+
+
+async def _body_bytes(raw: bytes):
+    yield raw
+
+
+@pytest.mark.asyncio
+async def test_bulk_indexer_indexes_batch_and_fails_only_bad_items(
+    postgres_repo,
+    elasticsearch_repo,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    await postgres_repo.register_namespace(namespace)
+
+    good = []
+    for i in range(5):
+        doc = await postgres_repo.create_document_stream(
+            namespace=namespace,
+            document_name=f'doc{i}',
+            # многострочное тело должно стать одной строкой NDJSON
+            body=_body_bytes(json.dumps({'n': i, 's': 'a\nb'}, indent=2).encode()),
+        )
+        good.append(doc.id)
+    bad = await postgres_repo.create_document_stream(
+        namespace=namespace,
+        document_name='bad',
+        body=_body_bytes(b'[1, 2, 3]'),
+    )
+
+    indexer = BulkIndexer(
+        postgres=postgres_repo,
+        elastic=elasticsearch_repo,
+        batch_size=4,
+        batch_window=0.05,
+    )
+    try:
+        results = await asyncio.gather(
+            *(indexer.index(namespace, doc_id) for doc_id in [*good, bad.id]),
+            return_exceptions=True,
+        )
+    finally:
+        await indexer.aclose()
+
+    assert results[:5] == [None] * 5
+    assert isinstance(results[5], (TypeError, BulkItemError))
+
+    for i, doc_id in enumerate(good):
+        got = await elasticsearch_repo.get_document(index=namespace, doc_id=doc_id)
+        assert got == {'n': i, 's': 'a\nb'}
+
+    with psycopg.connect(settings.postgres.dsn) as conn, conn.cursor() as cur:
+        cur.execute('select distinct id from json_chunks')
+        left = {str(row[0]) for row in cur.fetchall()}
+    # части документа, не попавшего в индекс, остаются для повтора задачи
+    assert left == {bad.id}
+
+
+@pytest.mark.asyncio
+async def test_bulk_indexer_projects_postgres_bodies_from_batch_read(
+    postgres_repo,
+    elasticsearch_repo,
+    monkeypatch,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    postgres_repo.body_storage_namespaces = {namespace: 'postgres'}
+    await postgres_repo.register_namespace(namespace)
+
+    ids = []
+    for i in range(3):
+        doc = await postgres_repo.create_document_stream(
+            namespace=namespace,
+            document_name=f'doc{i}',
+            body=_body_bytes(json.dumps({'n': i}).encode()),
+        )
+        ids.append(doc.id)
+
+    def iter_body(meta):
+        raise AssertionError('projection must reuse the batch read')
+
+    # тела пачки читаются одним iter_bodies, а не по документу
+    monkeypatch.setattr(postgres_repo, 'iter_body', iter_body)
+    indexer = BulkIndexer(postgres=postgres_repo, elastic=elasticsearch_repo)
+    try:
+        results = await asyncio.gather(
+            *(indexer.index(namespace, doc_id) for doc_id in ids)
+        )
+    finally:
+        await indexer.aclose()
+
+    assert results == [None] * 3
+    for doc_id in ids:
+        # без схемы поиска проекция пустая
+        got = await elasticsearch_repo.get_document(index=namespace, doc_id=doc_id)
+        assert got == {}
@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+from json_storage.repositories import ElasticSearchDBRepository
+from json_storage.services import MultiRepositoryService, RefreshPolicy
+from json_storage.settings import settings
+
+
+def test_refresh_policy_per_namespace_and_bulk_load():
+    policy = RefreshPolicy(
+        elastic=ElasticSearchDBRepository(url=settings.elastic_search.dsn),
+        default='wait_for',
+        namespaces={'logs': 'none', 'orders': 'immediate', 'events': 'periodic'},
+    )
+
+    assert policy.param_for('other') == 'wait_for'
+    assert policy.param_for('logs') is None
+    assert policy.param_for('orders') == 'true'
+    assert policy.param_for('events') is None
+    # в одном _bulk побеждает самая строгая политика
+    assert policy.param_for_many(['logs', 'orders', 'other']) == 'true'
+    assert policy.param_for_many(['logs', 'events']) is None
+
+    RefreshPolicy.SUSPENDED.add('orders')
+    try:
+        assert policy.policy_for('orders') == 'none'
+    finally:
+        RefreshPolicy.SUSPENDED.discard('orders')
+
+
+@pytest.mark.asyncio
+async def test_bulk_load_suspends_and_restores_refresh(
+    multi_repository_service: MultiRepositoryService,
+    postgres_repo,
+    es_client,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+
+    await multi_repository_service.begin_bulk_load(namespace)
+    resp = await es_client.indices.get_settings(index=namespace)
+    (index_settings,) = resp.body.values()
+    assert index_settings['settings']['index']['refresh_interval'] == '-1'
+    assert namespace in RefreshPolicy.SUSPENDED
+    assert await postgres_repo.list_bulk_load_namespaces() == [namespace]
+
+    await multi_repository_service.end_bulk_load(namespace)
+    resp = await es_client.indices.get_settings(index=namespace)
+    (index_settings,) = resp.body.values()
+    assert 'refresh_interval' not in index_settings['settings']['index']
+    assert namespace not in RefreshPolicy.SUSPENDED
+    assert await postgres_repo.list_bulk_load_namespaces() == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_load_restores_custom_refresh_interval(
+    multi_repository_service: MultiRepositoryService,
+    es_client,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    await es_client.indices.create(
+        index=namespace, settings={'index': {'refresh_interval': '5s'}}
+    )
+
+    # повторное начало загрузки не затирает сохранённое значение
+    await multi_repository_service.begin_bulk_load(namespace)
+    await multi_repository_service.begin_bulk_load(namespace)
+    await multi_repository_service.end_bulk_load(namespace)
+
+    resp = await es_client.indices.get_settings(index=namespace)
+    (index_settings,) = resp.body.values()
+    assert index_settings['settings']['index']['refresh_interval'] == '5s'
+    resp = await es_client.indices.get_mapping(index=namespace)
+    (index_mapping,) = resp.body.values()
+    assert 'json_storage_refresh_interval' not in index_mapping['mappings'].get(
+        '_meta', {}
+    )
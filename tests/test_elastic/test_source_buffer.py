@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from json_storage.services.indexing import DocumentTooLarge, SourceBuffer
+
+
+def test_source_buffer_keeps_bytes_as_is():
+    raw = b'  {"k": "v",\n "n": [1, 2]}\n'
+    source = SourceBuffer(1024)
+    for i in range(0, len(raw), 5):
+        source.write(raw[i : i + 5])
+    assert source.getvalue() == raw
+
+
+def test_source_buffer_single_line_for_ndjson():
+    doc = {'k': 'line1\nline2', 'nested': {'a': [1, 2, 3]}}
+    raw = json.dumps(doc, indent=2).encode().replace(b'\n', b'\r\n')
+    source = SourceBuffer(1024, single_line=True)
+    for i in range(0, len(raw), 7):
+        source.write(raw[i : i + 7])
+    line = source.getvalue()
+    assert b'\n' not in line and b'\r' not in line
+    assert json.loads(line) == doc
+
+
+@pytest.mark.parametrize('raw', [b'[1, 2]', b'"str"', b'  ', b'{"k": 1} 1', b''])
+def test_source_buffer_rejects_non_objects(raw):
+    source = SourceBuffer(1024)
+    source.write(raw)
+    with pytest.raises(TypeError):
+        source.getvalue()
+
+
+def test_source_buffer_limit():
+    source = SourceBuffer(10)
+    source.write(b'{"k": ')
+    with pytest.raises(DocumentTooLarge):
+        source.write(b'"value"}')
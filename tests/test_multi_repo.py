@@ -1,8 +1,14 @@
+import asyncio
+import json
 import uuid
 
+import psycopg
+from psycopg import sql
 import pytest
+from fastapi import HTTPException
 
 from json_storage.services import MultiRepositoryService
+from json_storage.settings import settings
 
 
 @pytest.fixture
@@ -30,3 +36,300 @@ async def test_set_many_search_schema_and_search(
     await multi_repository_service.set_search_schema(namespace, search_schema)
     docs = await multi_repository_service.search_objects(namespace, '$.b == "мур"')
     assert docs == [document]
+
+
+async def _body_bytes(raw: bytes):
+    yield raw
+
+
+@pytest.mark.asyncio
+async def test_namespace_registered_in_catalog_visible_to_other_workers(
+    multi_repository_service: MultiRepositoryService,
+    postgres_repo,
+    captured_taskiq_tasks,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    await multi_repository_service.create_object_stream(
+        namespace=namespace,
+        body=_body_bytes(b'{"k":"v"}'),
+        document_name='doc',
+    )
+
+    assert namespace in await postgres_repo.list_namespaces()
+
+    # как будто запрос пришёл в процесс, который этот неймспейс ещё не видел
+    MultiRepositoryService.NAMESPACES.clear()
+    listed = await multi_repository_service.read_namespace(namespace)
+    assert [item.document_name for item in listed.items] == ['doc']
+
+
+@pytest.mark.asyncio
+async def test_watch_catalog_picks_up_namespaces_from_notify(
+    multi_repository_service: MultiRepositoryService,
+    postgres_repo,
+):
+    await multi_repository_service.load_catalog()
+    watcher = asyncio.create_task(multi_repository_service.watch_catalog())
+    try:
+        namespace = f'ns_{uuid.uuid4().hex[:12]}'
+        for _ in range(50):
+            await postgres_repo.register_namespace(namespace)
+            if namespace in MultiRepositoryService.NAMESPACES:
+                break
+            await asyncio.sleep(0.1)
+        assert namespace in await multi_repository_service.get_namespace()
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+
+def _create_baseline_meta_table(table: str) -> None:
+    # таблица метаданных в том виде, в каком её создавали до каталога
+    with psycopg.connect(settings.postgres.dsn) as conn, conn.cursor() as cur:
+        cur.execute(
+            sql.SQL(
+                """
+                create table {} (
+                    id uuid primary key,
+                    document_name text not null,
+                    content_length integer not null,
+                    content_hash text not null,
+                    created_at timestamptz not null default now(),
+                    updated_at timestamptz not null default now()
+                )
+                """
+            ).format(sql.Identifier(table))
+        )
+        conn.commit()
+
+
+def _columns(table: str) -> dict[str, str]:
+    with psycopg.connect(settings.postgres.dsn) as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            select column_name, data_type
+            from information_schema.columns
+            where table_schema = current_schema() and table_name = %s
+            """,
+            (table,),
+        )
+        return dict(cur.fetchall())
+
+
+@pytest.mark.asyncio
+async def test_load_catalog_seeds_and_migrates_namespaces_created_before_it(
+    multi_repository_service: MultiRepositoryService,
+    postgres_repo,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    _create_baseline_meta_table(namespace + '_metadata')
+
+    await multi_repository_service.load_catalog()
+
+    assert namespace in MultiRepositoryService.NAMESPACES
+    assert namespace in await postgres_repo.list_namespaces()
+    columns = _columns(namespace + '_metadata')
+    assert columns['part_size'] == 'integer'
+    assert columns['codec'] == 'text'
+    assert columns['storage'] == 'text'
+    assert columns['content_length'] == 'bigint'
+
+    with psycopg.connect(settings.postgres.dsn) as conn, conn.cursor() as cur:
+        cur.execute("select to_regclass('json_chunks_offset_idx') is not null")
+        assert cur.fetchone() == (True,)
+
+
+@pytest.mark.asyncio
+async def test_search_schema_persisted_and_loaded_by_other_workers(
+    multi_repository_service: MultiRepositoryService,
+    postgres_repo,
+    elasticsearch_repo,
+    namespace,
+):
+    search_schema = {'status': '$.status'}
+    await multi_repository_service.set_search_schema(namespace, search_schema)
+    await multi_repository_service.set_search_schema(namespace, search_schema)
+
+    stored = await postgres_repo.get_search_schema(namespace)
+    assert stored == (search_schema, 2)
+
+    document = {'status': 'active'}
+    await elasticsearch_repo.insert_document(namespace, f'{uuid.uuid4()}', document)
+
+    # процесс, который не получал PUT /search-schema
+    MultiRepositoryService.SEARCH_SCHEMAS.clear()
+    docs = await multi_repository_service.search_objects(
+        namespace, '$.status == "active"'
+    )
+    assert docs == [document]
+
+    cached = MultiRepositoryService.SEARCH_SCHEMAS[namespace]
+    assert cached.version == 2
+    assert cached.fields == frozenset({'status'})
+
+
+@pytest.mark.asyncio
+async def test_body_stream_served_as_stored_with_etag(
+    multi_repository_service: MultiRepositoryService,
+    captured_taskiq_tasks,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    postgres = multi_repository_service.postgres_repository
+    postgres.body_storage_namespaces = {namespace: 'postgres'}
+    raw = b'{\n  "k": "v",\n  "n": [1, 2]\n}'
+    object_id = await multi_repository_service.create_object_stream(
+        namespace=namespace,
+        body=_body_bytes(raw),
+        document_name='doc',
+    )
+    meta = await multi_repository_service.get_object_meta(namespace, object_id)
+
+    body = await multi_repository_service.get_object_body_stream(namespace, object_id)
+    assert body.etag == f'"{meta.content_hash}"'
+    assert body.content_length == len(raw)
+    assert b''.join([chunk async for chunk in body.chunks]) == raw
+
+    with pytest.raises(HTTPException) as exc:
+        await multi_repository_service.get_object_body_stream(
+            namespace, object_id, f'"other", W/{body.etag}'
+        )
+    assert exc.value.status_code == 304
+    assert exc.value.headers == {'ETag': body.etag}
+
+
+@pytest.mark.asyncio
+async def test_zero_inline_threshold_writes_even_tiny_body_as_parts(
+    multi_repository_service: MultiRepositoryService,
+    captured_taskiq_tasks,
+    monkeypatch,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    postgres = multi_repository_service.postgres_repository
+    monkeypatch.setattr(postgres, 'inline_threshold', 0)
+    object_id = await multi_repository_service.create_object_stream(
+        namespace=namespace,
+        body=_body_bytes(b'{}'),
+        document_name='doc',
+    )
+
+    meta = await postgres.get_document_meta(namespace, str(object_id))
+    assert meta is not None
+    assert not meta.inline
+    assert meta.content_length == 2
+
+
+async def _chunked(raw: bytes, size: int):
+    for i in range(0, len(raw), size):
+        yield raw[i : i + size]
+
+
+@pytest.mark.asyncio
+async def test_bulk_ndjson_ingest_reports_each_line(
+    multi_repository_service: MultiRepositoryService,
+    captured_taskiq_tasks,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    raw = (
+        b'{"name": "first", "n": 1}\n'
+        b'\r\n'
+        b'{"n": 2}\r\n'
+        b'[1, 2]\n'
+        b'{"broken": \n'
+        b'{"name": 7, "n": 3}'
+    )
+    results = await multi_repository_service.create_objects_bulk(
+        namespace, _chunked(raw, 5), document_name='doc', name_field='name'
+    )
+    lines = [
+        json.loads(line)
+        for chunk in [c async for c in results]
+        for line in chunk.splitlines()
+    ]
+
+    assert [line['line'] for line in lines] == [1, 3, 4, 5, 6]
+    assert 'error' in lines[2] and 'error' in lines[3]
+    created = {line['line']: line['id'] for line in lines if 'id' in line}
+    names = {}
+    for line_number, object_id in created.items():
+        meta = await multi_repository_service.get_object_meta(namespace, object_id)
+        names[line_number] = meta.document_name
+    assert names == {1: 'first', 3: 'doc-3', 6: '7'}
+
+
+@pytest.mark.asyncio
+async def test_multi_get_meta_and_bodies(
+    multi_repository_service: MultiRepositoryService,
+    captured_taskiq_tasks,
+):
+    namespace = f'ns_{uuid.uuid4().hex[:12]}'
+    postgres = multi_repository_service.postgres_repository
+    postgres.body_storage_namespaces = {namespace: 'postgres'}
+    bodies = [b'{"n": 1}', b'{\n  "n": 2,\n  "s": "x"\n}']
+    ids = [
+        await multi_repository_service.create_object_stream(
+            namespace=namespace, body=_body_bytes(raw), document_name=f'doc{i}'
+        )
+        for i, raw in enumerate(bodies)
+    ]
+    unknown = uuid.uuid4()
+
+    multi = await multi_repository_service.get_objects_meta(
+        namespace, [ids[1], unknown, ids[0], ids[1]]
+    )
+    assert [meta.document_name for meta in multi.items] == ['doc1', 'doc0']
+    assert multi.missing == [str(unknown)]
+
+    stream = await multi_repository_service.get_objects_body_stream(
+        namespace, [ids[1], unknown, ids[0]]
+    )
+    items = json.loads(b''.join([chunk async for chunk in stream]))
+    by_id = {item['id']: item for item in items}
+    assert by_id[str(ids[0])]['body'] == {'n': 1}
+    assert by_id[str(ids[1])]['body'] == {'n': 2, 's': 'x'}
+    assert by_id[str(unknown)] == {'id': str(unknown), 'status': 404}
+
+
+@pytest.mark.asyncio
+async def test_search_pages_by_cursor_and_export(
+    multi_repository_service: MultiRepositoryService,
+    elasticsearch_repo,
+    namespace,
+):
+    await multi_repository_service.set_search_schema(
+        namespace,
+        {'status': '$.status', 'n': {'path': '$.n', 'type': 'long'}},
+    )
+    for n in range(7):
+        status = 'paid' if n % 3 else 'new'
+        document = {'status': status, 'n': n, 'text': 'a\nb'}
+        await elasticsearch_repo.insert_document(namespace, f'{uuid.uuid4()}', document)
+
+    filters = '$.status == "paid"'
+    pages, cursor = [], None
+    while True:
+        items, cursor = await multi_repository_service.search_objects_page(
+            namespace, filters, size=2, sort='$.n:desc', cursor=cursor
+        )
+        pages.append([item['n'] for item in items])
+        if cursor is None:
+            break
+    assert pages == [[5, 4], [2, 1]]
+
+    _, cursor = await multi_repository_service.search_objects_page(
+        namespace, filters, size=2, sort='$.n:desc'
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        await multi_repository_service.search_objects_page(
+            namespace, '$.status == "new"', size=2, sort='$.n:desc', cursor=cursor
+        )
+    assert exc_info.value.status_code == 400
+    with pytest.raises(HTTPException) as exc_info:
+        await multi_repository_service.search_objects_page(
+            namespace, filters, size=2, sort='$.text'
+        )
+    assert exc_info.value.status_code == 400
+
+    lines = await multi_repository_service.export_objects(namespace, filters, '$.n')
+    raw = b''.join([line async for line in lines])
+    assert raw.endswith(b'\n')
+    assert [json.loads(line)['n'] for line in raw.splitlines()] == [1, 2, 4, 5]
@@ -0,0 +1,137 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from json_storage.repositories.chunking import (
+    IDENTITY,
+    ZSTD,
+    coalesce_parts,
+    part_decoder,
+    part_encoder,
+    prefetch,
+)
+
+
+async def chunker(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+async def collect(data: bytes, chunk_size: int, part_size: int) -> list[bytes]:
+    return [
+        bytes(part)
+        async for part in coalesce_parts(chunker(data, chunk_size), part_size)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_small_chunks_into_fixed_parts():
+    raw = bytes(range(256)) * 41
+
+    parts = await collect(raw, chunk_size=7, part_size=1024)
+
+    assert b''.join(parts) == raw
+    assert [len(p) for p in parts[:-1]] == [1024] * (len(parts) - 1)
+    assert len(parts[-1]) == len(raw) % 1024
+
+
+@pytest.mark.asyncio
+async def test_coalesce_splits_large_chunks():
+    raw = b'x' * 5000 + b'y' * 3000
+
+    parts = await collect(raw, chunk_size=3000, part_size=1000)
+
+    assert b''.join(parts) == raw
+    assert [len(p) for p in parts] == [1000] * 8
+
+
+@pytest.mark.asyncio
+async def test_coalesce_empty_body():
+    assert await collect(b'', chunk_size=10, part_size=100) == []
+
+
+@pytest.mark.asyncio
+async def test_coalesce_rejects_non_positive_part_size():
+    with pytest.raises(ValueError):
+        await collect(b'abc', chunk_size=1, part_size=0)
+
+
+@pytest.mark.asyncio
+async def test_coalesce_ring_keeps_parts_valid_while_queued():
+    raw = bytes(range(256)) * 16
+    parts = coalesce_parts(chunker(raw, 100), part_size=512, buffers=3)
+
+    held = [await anext(parts), await anext(parts)]
+    third = await anext(parts)
+
+    assert bytes(held[0]) == raw[:512]
+    assert bytes(held[1]) == raw[512:1024]
+    assert bytes(third) == raw[1024:1536]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_preserves_order():
+    async def source():
+        for i in range(100):
+            yield i
+
+    assert [i async for i in prefetch(source(), depth=4)] == list(range(100))
+
+
+@pytest.mark.asyncio
+async def test_prefetch_propagates_producer_error():
+    async def source():
+        yield 1
+        raise ConnectionResetError('client went away')
+
+    got = []
+    with pytest.raises(ConnectionResetError):
+        async for item in prefetch(source(), depth=2):
+            got.append(item)
+    assert got == [1]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_close_cancels_producer():
+    cancelled = asyncio.Event()
+
+    async def source():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            cancelled.set()
+
+    async with aclosing(prefetch(source(), depth=2)) as items:
+        assert await anext(items) == 0
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_identity_codec_has_no_transform():
+    assert part_encoder(IDENTITY) is None
+    assert part_decoder(IDENTITY) is None
+
+
+def test_unknown_codec_raises():
+    with pytest.raises(ValueError):
+        part_encoder('brotli')
+    with pytest.raises(ValueError):
+        part_decoder('brotli')
+
+
+def test_zstd_parts_are_independent_frames():
+    pytest.importorskip('compression.zstd')
+    encode = part_encoder(ZSTD, level=3)
+    decode = part_decoder(ZSTD)
+    parts = [b'{"k":"' + b'x' * 100_000, b'y' * 100_000 + b'"}']
+
+    frames = [encode(memoryview(p)) for p in parts]
+
+    assert all(len(f) < len(p) for f, p in zip(frames, parts))
+    # каждая часть распаковывается сама по себе, без предыдущих
+    assert decode(frames[1]) == parts[1]
+    assert decode(frames[0]) == parts[0]
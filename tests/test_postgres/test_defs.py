@@ -324,3 +324,38 @@ async def test_list_documents_meta_cursor_pagination_and_count():
     assert lst4.items == [docs[i] for i in range(2, 5)]
 
     await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_list_documents_meta_keyset_next_cursor_and_count_modes():
+    repo = PostgresDBRepository(dsn=DSN)
+    await repo.create_buffer_table()
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    await repo.create_meta_table_by_namespace(namespace)
+    docs = [
+        await repo.create_document(namespace, f'name-{i}', {'idx': i}) for i in range(5)
+    ]
+    docs.reverse()
+
+    seen = []
+    cursor = None
+    while True:
+        page = await repo.list_documents_meta(
+            namespace, limit=2, cursor=cursor, count='none'
+        )
+        assert page.count is None
+        seen.extend(page.items)
+        if page.next_cursor is None:
+            break
+        assert page.next_cursor == docs[len(seen)].id
+        cursor = page.next_cursor
+
+    assert seen == docs
+
+    estimated = await repo.list_documents_meta(namespace, limit=2, count='estimate')
+    assert isinstance(estimated.count, int)
+
+    with pytest.raises(ValueError):
+        await repo.list_documents_meta(namespace, count='approximately')
+
+    await repo.aclose()
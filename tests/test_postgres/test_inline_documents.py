@@ -0,0 +1,113 @@
+import uuid
+
+import psycopg
+import pytest
+from psycopg import sql
+import uuid_extensions as uuid_ext
+
+from json_storage.repositories.postgres import PostgresDBRepository
+from json_storage.settings import settings
+
+DSN = settings.postgres.dsn
+
+
+async def chunker(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_inline_document_read_and_delete():
+    repo = PostgresDBRepository(dsn=DSN, part_size=8, inline_threshold=64)
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    await repo.register_namespace(namespace)
+
+    small = b'{"k": "small"}'
+    large = b'{"k": "' + b'x' * 100 + b'"}'
+    inline = await repo.create_document_inline(namespace, 'small', small)
+    chunked = await repo.create_document_stream(
+        namespace=namespace, document_name='large', body=chunker(large, 10)
+    )
+
+    assert inline.inline and inline.part_size is None
+    assert inline.content_length == len(small)
+    assert not chunked.inline
+
+    meta = await repo.get_document_meta(namespace, inline.id)
+    assert meta.inline
+    assert b''.join([chunk async for chunk in repo.iter_body(meta)]) == small
+
+    bodies: dict[str, bytes] = {}
+    async for doc_id, chunk in repo.iter_bodies([meta, chunked]):
+        bodies[doc_id] = bodies.get(doc_id, b'') + chunk
+    assert bodies == {inline.id: small, chunked.id: large}
+
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(
+            'select count(*) from json_chunks where id = %s', (uuid.UUID(inline.id),)
+        )
+        assert cur.fetchone()[0] == 0
+
+    await repo.delete_object_by_id(namespace, inline.id)
+    assert await repo.get_data_by_id(inline.id) is None
+
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_document_written_with_baseline_schema_is_not_inline():
+    # таблица и строки в том виде, в каком их писала первая версия:
+    # без part_size/codec/storage, тело частями в json_chunks
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    table = namespace + '_metadata'
+    doc_id = uuid_ext.uuid7()
+    raw = b'{"legacy": true}'
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(
+            sql.SQL(
+                """
+                create table {} (
+                    id uuid primary key,
+                    document_name text not null,
+                    content_length integer not null,
+                    content_hash text not null,
+                    created_at timestamptz not null default now(),
+                    updated_at timestamptz not null default now()
+                )
+                """
+            ).format(sql.Identifier(table))
+        )
+        cur.execute(
+            sql.SQL(
+                """
+                insert into {} (id, document_name, content_length, content_hash)
+                values (%s, 'legacy', %s, '')
+                """
+            ).format(sql.Identifier(table)),
+            (doc_id, len(raw)),
+        )
+        cur.execute(
+            """
+            create table if not exists json_chunks (
+                id uuid not null,
+                part integer not null,
+                data bytea not null,
+                primary key (id, part)
+            )
+            """
+        )
+        cur.execute(
+            'insert into json_chunks (id, part, data) values (%s, 0, %s)',
+            (doc_id, raw),
+        )
+        conn.commit()
+
+    repo = PostgresDBRepository(dsn=DSN)
+    await repo.create_catalog_tables()
+
+    meta = await repo.get_document_meta(namespace, str(doc_id))
+    assert meta.part_size is None
+    assert not meta.inline and not meta.body_in_postgres
+    assert b''.join([chunk async for chunk in repo.iter_body(meta)]) == raw
+
+    await repo.aclose()
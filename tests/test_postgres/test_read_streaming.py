@@ -1,4 +1,5 @@
 import hashlib
+import psycopg
 import pytest
 import uuid_extensions
 
@@ -43,3 +44,39 @@ async def test_iter_chunks_by_id_stream_hash_and_len():
     assert hasher.hexdigest() == expected_hash
 
     await repo.aclose()
+
+
+@pytest.mark.parametrize('codec', ['identity', 'zstd'])
+@pytest.mark.asyncio
+async def test_iter_chunk_range_reads_only_requested_bytes(codec):
+    if codec == 'zstd':
+        pytest.importorskip('compression.zstd')
+    repo = PostgresDBRepository(dsn=DSN, part_size=1000)
+    await repo.create_chunks_table()
+
+    namespace = f'ns_{uuid_extensions.uuid7().hex[:8]}'
+    await repo.create_meta_table_by_namespace(namespace)
+
+    raw = bytes(range(256)) * 40
+    doc = await repo.create_document_stream(
+        namespace=namespace,
+        document_name='range',
+        body=chunker(raw, chunk_size=777),
+        codec=codec,
+    )
+
+    async def read(start, end, **kwargs):
+        chunks = repo.iter_chunk_range(doc.id, start, end, codec=codec, **kwargs)
+        return b''.join([chunk async for chunk in chunks])
+
+    for start, end in [(0, 0), (0, 999), (999, 1000), (1500, 4321), (9000, 10239)]:
+        assert await read(start, end) == raw[start : end + 1]
+
+    # части без byte_offset, записанные до появления колонки
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(
+            'update json_chunks set byte_offset = null where id = %s', (doc.id,)
+        )
+    assert await read(2500, 7777, part_size=1000) == raw[2500:7778]
+
+    await repo.aclose()
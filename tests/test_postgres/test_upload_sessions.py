@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import uuid
+
+import psycopg
+import pytest
+import uuid_extensions as uuid_ext
+
+from json_storage.repositories.postgres import PostgresDBRepository
+from json_storage.settings import settings
+
+DSN = settings.postgres.dsn
+
+
+async def chunker(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_upload_parts_in_parallel_and_complete():
+    repo = PostgresDBRepository(dsn=DSN, part_size=1000)
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    await repo.register_namespace(namespace)
+
+    raw = b'{"items": [' + b', '.join(b'"%05d"' % i for i in range(3000)) + b']}'
+    pieces = [raw[:7000], raw[7000:12345], raw[12345:]]
+
+    session = await repo.create_upload_session(namespace, 'multipart')
+    # части в обратном порядке и параллельно, первая — с повтором
+    await repo.write_upload_part(namespace, session.id, 1, chunker(b'garbage', 3))
+    uploaded = await asyncio.gather(
+        *(
+            repo.write_upload_part(namespace, session.id, number, chunker(piece, 333))
+            for number, piece in reversed(list(enumerate(pieces, start=1)))
+        )
+    )
+    assert [part.content_length for part in uploaded] == [
+        len(piece) for piece in reversed(pieces)
+    ]
+    listed = await repo.get_upload_session(namespace, session.id)
+    assert [part.part_number for part in listed.parts] == [1, 2, 3]
+    assert listed.parts[0].content_hash == hashlib.sha256(pieces[0]).hexdigest()
+
+    doc = await repo.complete_upload_session(namespace, session.id)
+    assert doc.id == session.id
+    assert doc.content_length == len(raw)
+    assert doc.content_hash == hashlib.sha256(raw).hexdigest()
+    assert await repo.get_upload_session(namespace, session.id) is None
+
+    body = b''.join([chunk async for chunk in repo.iter_chunks_by_id(doc.id)])
+    assert body == raw
+    # смещения абсолютные: Range через границу частей загрузки
+    chunks = repo.iter_chunk_range(doc.id, 6990, 7010)
+    assert b''.join([chunk async for chunk in chunks]) == raw[6990:7011]
+
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_abort_and_abandoned_upload_sessions():
+    repo = PostgresDBRepository(dsn=DSN)
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    await repo.register_namespace(namespace)
+
+    aborted = await repo.create_upload_session(namespace, 'aborted')
+    await repo.write_upload_part(namespace, aborted.id, 1, chunker(b'{"k": 1}', 4))
+    assert await repo.abort_upload_session(namespace, aborted.id)
+    assert not await repo.abort_upload_session(namespace, aborted.id)
+    assert (
+        await repo.write_upload_part(namespace, aborted.id, 2, chunker(b'x', 1)) is None
+    )
+
+    empty = await repo.create_upload_session(namespace, 'empty')
+    with pytest.raises(ValueError):
+        await repo.complete_upload_session(namespace, empty.id)
+
+    gapped = await repo.create_upload_session(namespace, 'gapped')
+    await repo.write_upload_part(namespace, gapped.id, 1, chunker(b'{"k": ', 4))
+    await repo.write_upload_part(namespace, gapped.id, 3, chunker(b'1}', 4))
+    with pytest.raises(ValueError, match='missing parts: 2'):
+        await repo.complete_upload_session(namespace, gapped.id)
+    await repo.write_upload_part(namespace, gapped.id, 2, chunker(b'"v", "n": ', 4))
+    doc = await repo.complete_upload_session(namespace, gapped.id)
+    assert doc.content_length == len(b'{"k": "v", "n": 1}')
+    assert doc.content_hash == hashlib.sha256(b'{"k": "v", "n": 1}').hexdigest()
+
+    abandoned = await repo.create_upload_session(namespace, 'abandoned')
+    await repo.write_upload_part(namespace, abandoned.id, 1, chunker(b'{}', 1))
+    assert await repo.delete_abandoned_upload_sessions(ttl=3600) == 0
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(
+            "update json_upload_parts set uploaded_at = now() - interval '2 hours'"
+        )
+        cur.execute(
+            "update json_upload_sessions set created_at = now() - interval '2 hours'"
+        )
+    assert await repo.delete_abandoned_upload_sessions(ttl=3600) == 2
+
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(
+            'select count(*) from json_chunks where id = any(%s)',
+            ([uuid.UUID(aborted.id), uuid.UUID(abandoned.id)],),
+        )
+        assert cur.fetchone()[0] == 0
+
+    await repo.aclose()
@@ -55,6 +55,34 @@ async def test_create_chunks_table():
     assert columns['data']['data_type'] == 'bytea'
 
 
+@pytest.mark.asyncio
+async def test_chunks_storage_is_external_only_with_zstd():
+    def data_storage() -> str:
+        with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT attstorage
+                FROM pg_attribute
+                WHERE attrelid = 'json_chunks'::regclass
+                  AND attname = 'data'
+                """
+            )
+            row = cur.fetchone()
+            assert row is not None
+            return row[0]
+
+    repo = PostgresDBRepository(dsn=DSN, compression_namespaces={'logs': 'zstd'})
+    await repo.create_chunks_table()
+    await repo.aclose()
+    assert data_storage() == 'e'
+
+    # без zstd identity-части снова сжимает pglz
+    repo = PostgresDBRepository(dsn=DSN)
+    await repo.create_chunks_table()
+    await repo.aclose()
+    assert data_storage() == 'x'
+
+
 @pytest.mark.asyncio
 async def test_create_document_stream_writes_chunks_and_meta_and_roundtrips():
     repo = PostgresDBRepository(dsn=DSN)
@@ -122,3 +150,44 @@ async def test_create_document_stream_writes_chunks_and_meta_and_roundtrips():
     assert reassembled == raw
 
     await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_create_document_stream_zstd_roundtrip():
+    pytest.importorskip('compression.zstd')
+    repo = PostgresDBRepository(dsn=DSN)
+    await repo.create_chunks_table()
+
+    namespace = f'ns_{uuid_ext.uuid7().hex[:8]}'
+    table = f'{namespace}_metadata'
+    await repo.create_meta_table_by_namespace(namespace)
+
+    raw = b'{"k":"' + b'x' * (2 * 1024 * 1024) + b'"}'
+
+    doc = await repo.create_document_stream(
+        namespace=namespace,
+        document_name='zstd',
+        body=chunker(raw, chunk_size=64 * 1024),
+        codec='zstd',
+    )
+
+    assert doc.codec == 'zstd'
+    assert doc.content_length == len(raw)
+    assert doc.content_hash == hashlib.sha256(raw).hexdigest()
+
+    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
+        cur.execute(f'select codec from {table} where id = %s', (doc.id,))
+        assert cur.fetchone()[0] == 'zstd'
+
+        cur.execute(
+            'select sum(length(data)) from json_chunks where id = %s', (doc.id,)
+        )
+        (stored,) = cur.fetchone()
+        assert stored < len(raw)
+
+    reassembled = b''.join(
+        [chunk async for chunk in repo.iter_chunks_by_id(doc.id, codec=doc.codec)]
+    )
+    assert reassembled == raw
+
+    await repo.aclose()
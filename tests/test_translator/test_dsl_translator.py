@@ -1,4 +1,6 @@
-from json_storage.services.dsl_translator import DSLTranslator, EsPath
+import pytest
+
+from json_storage.services.dsl_translator import DSLTranslator, EsPath, QueryPlanCache
 from json_storage.services.jsonpath_parser import JSONPathParser
 
 
@@ -116,8 +118,10 @@ def test_build_query_simple_eq():
 
     assert query == {
         'query': {
-            'term': {
-                'status': 'paid',
+            'bool': {
+                'filter': [
+                    {'term': {'status': 'paid'}},
+                ]
             }
         }
     }
@@ -129,7 +133,7 @@ def test_build_query_numeric_range_and():
     assert query == {
         'query': {
             'bool': {
-                'must': [
+                'filter': [
                     {'range': {'price': {'gt': 10}}},
                     {'range': {'price': {'lte': 20}}},
                 ]
@@ -143,13 +147,19 @@ def test_build_query_nested_term():
 
     assert query == {
         'query': {
-            'nested': {
-                'path': 'items',
-                'query': {
-                    'term': {
-                        'items.productId': 'A1',
+            'bool': {
+                'filter': [
+                    {
+                        'nested': {
+                            'path': 'items',
+                            'query': {
+                                'term': {
+                                    'items.productId': 'A1',
+                                }
+                            },
+                        }
                     }
-                },
+                ]
             }
         }
     }
@@ -157,17 +167,23 @@ def test_build_query_nested_term():
 
 def test_build_query_or():
     query = DSLTranslator.build_query_from_expression(
-        '$.status == "paid" || $.status == "pending"'
+        '$.status == "paid" || $.userId == "u1"'
     )
 
     assert query == {
         'query': {
             'bool': {
-                'should': [
-                    {'term': {'status': 'paid'}},
-                    {'term': {'status': 'pending'}},
-                ],
-                'minimum_should_match': 1,
+                'filter': [
+                    {
+                        'bool': {
+                            'should': [
+                                {'term': {'status': 'paid'}},
+                                {'term': {'userId': 'u1'}},
+                            ],
+                            'minimum_should_match': 1,
+                        }
+                    }
+                ]
             }
         }
     }
@@ -187,18 +203,447 @@ def test_build_query_grouped_and_or():
     assert query == {
         'query': {
             'bool': {
-                'should': [
+                'filter': [
                     {
                         'bool': {
-                            'must': [
-                                {'range': {'price': {'gt': 10}}},
-                                {'range': {'price': {'lte': 20}}},
-                            ]
+                            'should': [
+                                {
+                                    'bool': {
+                                        'filter': [
+                                            {'range': {'price': {'gt': 10}}},
+                                            {'range': {'price': {'lte': 20}}},
+                                        ]
+                                    }
+                                },
+                                {'term': {'status': 'paid'}},
+                            ],
+                            'minimum_should_match': 1,
+                        }
+                    }
+                ]
+            }
+        }
+    }
+
+
+def test_build_query_flattens_chains_and_negations():
+    query = DSLTranslator.build_query_from_expression(
+        '$.a == 1 && ($.b == 2 && $.c == 3) && !($.d == 4) && $.e != 5'
+    )
+
+    assert query == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'term': {'a': 1}},
+                    {'term': {'b': 2}},
+                    {'term': {'c': 3}},
+                ],
+                'must_not': [
+                    {'term': {'d': 4}},
+                    {'term': {'e': 5}},
+                ],
+            }
+        }
+    }
+
+    query = DSLTranslator.build_query_from_expression(
+        '$.a == 1 || $.b == 2 || ($.c == 3 || $.d == 4)'
+    )
+    assert query['query']['bool']['filter'][0]['bool']['should'] == [
+        {'term': {'a': 1}},
+        {'term': {'b': 2}},
+        {'term': {'c': 3}},
+        {'term': {'d': 4}},
+    ]
+
+
+def test_build_query_merges_nested_siblings():
+    query = DSLTranslator.build_query_from_expression(
+        '$.items[*].productId == "A1" && $.status == "paid"'
+        ' && $.items[*].price > 10 && $.order.items[*].qty == 2'
+    )
+
+    assert query == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {
+                        'nested': {
+                            'path': 'items',
+                            'query': {
+                                'bool': {
+                                    'filter': [
+                                        {'term': {'items.productId': 'A1'}},
+                                        {'range': {'items.price': {'gt': 10}}},
+                                    ]
+                                }
+                            },
                         }
                     },
                     {'term': {'status': 'paid'}},
+                    {
+                        'nested': {
+                            'path': 'order.items',
+                            'query': {'term': {'order.items.qty': 2}},
+                        }
+                    },
+                ]
+            }
+        }
+    }
+
+    query = DSLTranslator.build_query_from_expression(
+        '$.items[*].productId == "A1" || $.items[*].price > 10'
+    )
+    assert query['query']['bool']['filter'][0]['bool']['should'] == [
+        {
+            'nested': {
+                'path': 'items',
+                'query': {
+                    'bool': {
+                        'should': [
+                            {'term': {'items.productId': 'A1'}},
+                            {'range': {'items.price': {'gt': 10}}},
+                        ],
+                        'minimum_should_match': 1,
+                    }
+                },
+            }
+        }
+    ]
+
+
+def test_compile_schema_precomputes_fields_and_mapping():
+    search_schema = {
+        'status': '$.status',
+        'productId': '$.items[*].productId',
+    }
+
+    compiled = DSLTranslator.compile_schema(search_schema, version=3)
+
+    assert compiled.version == 3
+    assert compiled.schema == search_schema
+    assert compiled.fields == frozenset({'status', 'items.productId'})
+    assert compiled.mapping == DSLTranslator.schema_to_es_mapping(search_schema)
+    assert compiled.types == {'status': 'keyword', 'items.productId': 'keyword'}
+
+
+def test_schema_to_es_mapping_typed_fields():
+    search_schema = {
+        'status': '$.status',
+        'price': {'path': '$.price', 'type': 'double'},
+        'createdAt': {'path': '$.createdAt', 'type': 'date'},
+        'qty': {'path': '$.items[*].qty', 'type': 'long'},
+        'title': {'path': '$.title', 'type': 'text'},
+    }
+
+    mapping = DSLTranslator.schema_to_es_mapping(search_schema)
+
+    assert mapping == {
+        'mappings': {
+            'properties': {
+                'status': {'type': 'keyword'},
+                'price': {'type': 'double'},
+                'createdAt': {'type': 'date'},
+                'title': {'type': 'text'},
+                'items': {
+                    'type': 'nested',
+                    'properties': {
+                        'qty': {'type': 'long'},
+                    },
+                },
+            }
+        }
+    }
+
+
+@pytest.mark.parametrize(
+    'spec',
+    [
+        {'path': '$.price', 'type': 'float'},
+        {'type': 'long'},
+        42,
+    ],
+)
+def test_compile_schema_rejects_bad_field_spec(spec):
+    with pytest.raises(ValueError):
+        DSLTranslator.compile_schema({'price': spec})
+
+
+def test_build_query_typed_literals():
+    compiled = DSLTranslator.compile_schema(
+        {
+            'price': {'path': '$.price', 'type': 'double'},
+            'createdAt': {'path': '$.createdAt', 'type': 'date'},
+            'title': {'path': '$.title', 'type': 'text'},
+            'active': {'path': '$.active', 'type': 'boolean'},
+        }
+    )
+    query = DSLTranslator.build_query_from_expression(
+        '$.price >= 10 && $.createdAt < "2024-01-01T00:00:00"'
+        ' && $.title == "red shoes" && $.active == true',
+        compiled.types,
+    )
+
+    assert query == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'range': {'price': {'gte': 10}}},
+                    {'range': {'createdAt': {'lt': '2024-01-01T00:00:00'}}},
+                    {'match': {'title': 'red shoes'}},
+                    {'term': {'active': True}},
+                ]
+            }
+        }
+    }
+
+
+@pytest.mark.parametrize(
+    'expr',
+    [
+        '$.price > "10"',
+        '$.items[*].qty == 1.5',
+        '$.createdAt > "yesterday"',
+        '$.active > true',
+        '$.title < "b"',
+    ],
+)
+def test_build_query_rejects_literal_of_wrong_type(expr):
+    types = DSLTranslator.compile_schema(
+        {
+            'status': '$.status',
+            'price': {'path': '$.price', 'type': 'double'},
+            'qty': {'path': '$.items[*].qty', 'type': 'long'},
+            'createdAt': {'path': '$.createdAt', 'type': 'date'},
+            'title': {'path': '$.title', 'type': 'text'},
+            'active': {'path': '$.active', 'type': 'boolean'},
+        }
+    ).types
+    with pytest.raises(ValueError):
+        DSLTranslator.build_query_from_expression(expr, types)
+
+
+def test_build_query_keeps_numbers_and_bools_for_keyword_fields():
+    # схема из одних строк JSONPath, как до появления типов
+    types = DSLTranslator.compile_schema(
+        {'price': '$.price', 'paid': '$.paid', 'code': '$.code'}
+    ).types
+    query = DSLTranslator.build_query_from_expression(
+        '$.price == 10 && $.paid == true && $.code in [1, "A"]', types
+    )
+
+    assert query == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'term': {'price': 10}},
+                    {'term': {'paid': True}},
+                    {'terms': {'code': [1, 'A']}},
+                ]
+            }
+        }
+    }
+
+
+def test_parameterize_separates_shape_from_literals():
+    shape, values = DSLTranslator.parameterize('$.price > 10 && $.status == "paid"')
+    other_shape, other_values = DSLTranslator.parameterize(
+        '$.price>99.5&&$.status=="new"'
+    )
+
+    assert shape == other_shape
+    assert values == [10, 'paid']
+    assert other_values == [99.5, 'new']
+
+
+def test_query_plan_cache_shares_plans_between_literals():
+    compiled = DSLTranslator.compile_schema(
+        {'price': {'path': '$.price', 'type': 'long'}, 'status': '$.status'},
+        version=1,
+    )
+    cache = QueryPlanCache(maxsize=2)
+
+    for price, status in ((10, 'paid'), (20, 'new')):
+        expr = f'$.price > {price} && $.status == "{status}"'
+        assert cache.build_query('ns', compiled, expr) == (
+            DSLTranslator.build_query_from_expression(expr, compiled.types)
+        )
+    assert len(cache) == 1
+
+    # значение проверяется при подстановке, а не только при сборке плана
+    with pytest.raises(ValueError):
+        cache.build_query('ns', compiled, '$.price > 1.5 && $.status == "paid"')
+
+    cache.build_query('ns', compiled, '$.status == "paid"')
+    cache.build_query('ns', compiled, '$.price < 5')
+    assert len(cache) == 2
+
+    # новая версия схемы — новый план: price стал double
+    retyped = DSLTranslator.compile_schema(
+        {'price': {'path': '$.price', 'type': 'double'}, 'status': '$.status'},
+        version=2,
+    )
+    assert cache.build_query('ns', retyped, '$.price < 1.5') == {
+        'query': {'bool': {'filter': [{'range': {'price': {'lt': 1.5}}}]}}
+    }
+
+
+def test_tokenize_token_stream():
+    tokens = DSLTranslator._tokenize(
+        '($.a>=-1.5e2||!($.b<2))&&$.items[*].c!="x y" && $.d == true && $.e == null'
+    )
+
+    assert tokens == [
+        ('LPAREN', '('),
+        ('PATH', '$.a'),
+        ('OP', '>='),
+        ('NUMBER', -150.0),
+        ('OR', '||'),
+        ('NOT', '!'),
+        ('LPAREN', '('),
+        ('PATH', '$.b'),
+        ('OP', '<'),
+        ('NUMBER', 2),
+        ('RPAREN', ')'),
+        ('RPAREN', ')'),
+        ('AND', '&&'),
+        ('PATH', '$.items[*].c'),
+        ('OP', '!='),
+        ('STRING', 'x y'),
+        ('AND', '&&'),
+        ('PATH', '$.d'),
+        ('OP', '=='),
+        ('BOOL', True),
+        ('AND', '&&'),
+        ('PATH', '$.e'),
+        ('OP', '=='),
+        ('NULL', None),
+    ]
+
+
+@pytest.mark.parametrize(
+    'expr, message',
+    [
+        ('$.a == 1e+-3', "Invalid number literal '1e+-3' at position 7"),
+        ('$.a == 007', "Invalid number literal '007' at position 7"),
+        ('$.a == 1.', "Invalid number literal '1.' at position 7"),
+        ('$.a == "x', 'Unterminated string literal at position 7'),
+        ('$.a == foo', "Unexpected identifier 'foo' at position 7"),
+        ('$.a == 1 # 2', "Unexpected character '#' at position 9"),
+    ],
+)
+def test_tokenize_reports_error_position(expr, message):
+    with pytest.raises(ValueError) as exc_info:
+        DSLTranslator._tokenize(expr)
+    assert str(exc_info.value) == message
+
+
+def test_build_query_in_and_not_in():
+    query = DSLTranslator.build_query_from_expression(
+        '$.id in ["a", "b", "c"] && $.items[*].qty not in [1, 2] && $.tag in []'
+    )
+
+    assert query == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'terms': {'id': ['a', 'b', 'c']}},
+                    {'terms': {'tag': []}},
+                ],
+                'must_not': [
+                    {
+                        'nested': {
+                            'path': 'items',
+                            'query': {'terms': {'items.qty': [1, 2]}},
+                        }
+                    }
                 ],
-                'minimum_should_match': 1,
             }
         }
     }
+
+
+def test_build_query_rewrites_equality_chains_into_terms():
+    query = DSLTranslator.build_query_from_expression(
+        '$.id == "a" || $.status == "new" || $.id in ["b", "c"] || $.id == "d"'
+    )
+    assert query['query']['bool']['filter'][0]['bool']['should'] == [
+        {'terms': {'id': ['a', 'b', 'c', 'd']}},
+        {'term': {'status': 'new'}},
+    ]
+
+    ids = ' || '.join(f'$.id == "id{i}"' for i in range(5000))
+    query = DSLTranslator.build_query_from_expression(ids)
+    assert query == {
+        'query': {
+            'bool': {'filter': [{'terms': {'id': [f'id{i}' for i in range(5000)]}}]}
+        }
+    }
+
+    query = DSLTranslator.build_query_from_expression('$.id != "a" && $.id != "b"')
+    assert query == {'query': {'bool': {'must_not': [{'terms': {'id': ['a', 'b']}}]}}}
+
+
+def test_in_lists_share_plan_and_are_typed():
+    compiled = DSLTranslator.compile_schema(
+        {
+            'qty': {'path': '$.qty', 'type': 'long'},
+            'title': {'path': '$.title', 'type': 'text'},
+        }
+    )
+    cache = QueryPlanCache()
+    assert cache.build_query('ns', compiled, '$.qty in [1, 2]') == {
+        'query': {'bool': {'filter': [{'terms': {'qty': [1, 2]}}]}}
+    }
+    cache.build_query('ns', compiled, '$.qty in [1, 2, 3, 4, 5]')
+    assert len(cache) == 1
+
+    with pytest.raises(ValueError):
+        cache.build_query('ns', compiled, '$.qty in [1, "2"]')
+    with pytest.raises(ValueError):
+        cache.build_query('ns', compiled, '$.title in ["a"]')
+    # равенства по text не сводятся в terms: для text это match
+    query = cache.build_query('ns', compiled, '$.title == "a" || $.title == "b"')
+    assert query['query']['bool']['filter'][0]['bool']['should'] == [
+        {'match': {'title': 'a'}},
+        {'match': {'title': 'b'}},
+    ]
+
+
+@pytest.mark.parametrize(
+    'expr',
+    [
+        '$.id in ["a",]',
+        '$.id in [, "a"]',
+        '$.id in ["a" "b"]',
+        '$.id in ["a"',
+        '$.id in "a"',
+        '$.id == ["a"]',
+        '$.id in [["a"]]',
+        '$.id == "a", "b"',
+    ],
+)
+def test_build_query_rejects_malformed_lists(expr):
+    with pytest.raises(ValueError):
+        DSLTranslator.build_query_from_expression(expr)
+
+
+def test_build_sort_keys():
+    types = DSLTranslator.compile_schema(
+        {
+            'price': {'path': '$.price', 'type': 'double'},
+            'qty': {'path': '$.items[*].qty', 'type': 'long'},
+            'title': {'path': '$.title', 'type': 'text'},
+        }
+    ).types
+
+    assert DSLTranslator.build_sort(None, types) == ['_shard_doc']
+    assert DSLTranslator.build_sort('$.price:desc, $.items[*].qty', types) == [
+        {'price': {'order': 'desc'}},
+        {'items.qty': {'order': 'asc', 'nested': {'path': 'items'}}},
+    ]
+    for sort in ('$.title', '$.missing', '$.price:up', 'price'):
+        with pytest.raises(ValueError):
+            DSLTranslator.build_sort(sort, types)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from json_storage.services.json_projection import JsonProjector
+
+DOCUMENT = {
+    'user': {
+        'status': 'active',
+        'name': 'Ann \\"Quote\\" юзер',
+        'bio': 'a\nb}]{["',
+    },
+    'items': [
+        {'productId': 1, 'price': 10.5, 'tags': ['x', {'deep': [1, 2]}]},
+        {'price': 3},
+        {'productId': 2},
+    ],
+    'meta': {'version': 3, 'flags': [True, False, None]},
+    'skipped': [[[{'k': '\\\\'}]], -1.5e10, 'tail\\'],
+}
+
+
+async def _chunks(raw: bytes, size: int):
+    for i in range(0, len(raw), size):
+        yield raw[i : i + size]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.asyncio
+async def test_projection_keeps_only_schema_fields(size, indent):
+    projector = JsonProjector.from_paths(
+        ['$.user.status', '$.items[*].productId', '$.meta', '$.missing.field']
+    )
+    raw = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+
+    assert await projector.project(_chunks(raw, size)) == {
+        'user': {'status': 'active'},
+        # элементы массива проецируются по отдельности, пустые отбрасываются
+        'items': [{'productId': 1}, {'productId': 2}],
+        'meta': {'version': 3, 'flags': [True, False, None]},
+    }
+
+
+@pytest.mark.asyncio
+async def test_projection_of_whole_document_and_escaped_values():
+    raw = json.dumps(DOCUMENT).encode()
+    assert await JsonProjector.from_paths(['$']).project(_chunks(raw, 5)) == DOCUMENT
+
+    projector = JsonProjector.from_paths(['$.user.name', '$.user.bio'])
+    assert await projector.project(_chunks(raw, 3)) == {
+        'user': {'name': DOCUMENT['user']['name'], 'bio': DOCUMENT['user']['bio']}
+    }
+
+
+@pytest.mark.parametrize('raw', [b'[1, 2]', b'"str"', b'  '])
+@pytest.mark.asyncio
+async def test_projection_rejects_non_objects(raw):
+    with pytest.raises(TypeError):
+        await JsonProjector.from_paths(['$.a']).project(_chunks(raw, 4))
+
+
+@pytest.mark.parametrize(
+    'raw',
+    [
+        b'{"a": 1',
+        b'{"a": 1,}',
+        b'{"b": [1, 2}',
+        b'{"b": "unterminated}',
+        b'{"a": 1} 1',
+        b'{a: 1}',
+    ],
+)
+@pytest.mark.asyncio
+async def test_projection_rejects_invalid_json(raw):
+    with pytest.raises(ValueError):
+        await JsonProjector.from_paths(['$.a']).project(_chunks(raw, 2))